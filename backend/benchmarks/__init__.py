@@ -0,0 +1 @@
+"""Benchmarks of the storage and the hot paths of the wine app."""
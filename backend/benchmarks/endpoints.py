@@ -0,0 +1,221 @@
+"""
+Benchmark of the api endpoints on a seeded catalogue.
+
+The endpoints are requested through the test client against the configured
+database, which is filled with `manage.py seed_catalogue` first. For every
+endpoint the p50 and p99 latency, the SQL queries per request and the peak
+memory of a request are written into a JSON report. The report of an earlier
+run can be passed with --compare to print the changes.
+
+Run from the backend directory:
+`python manage.py seed_catalogue --scale 100k`
+`python -m benchmarks.endpoints --output report.json --compare baseline.json`
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+from collections import Counter
+
+import django
+import numpy as np
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wineraise.settings")
+# Keep the throttling, but do not reject the requests of the benchmark
+os.environ.setdefault("USER_THROTTLE_RATE", "1000000/sec")
+django.setup()
+
+# pylint: disable=wrong-import-position
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    CaptureQueriesContext,
+    setup_test_environment,
+)
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from wine.models import Library, Review, Tag, Wine  # noqa: E402
+
+# Number of requests per endpoint whose queries and memory are recorded,
+# tracing the memory slows the requests down
+PROFILED_REQUESTS = 10
+# Metrics of the report which are compared, lower is better
+METRICS = ("p50_ms", "p99_ms", "queries", "peak_kib")
+# Page size of the lists, which are only paginated on request
+PAGE_SIZE = 50
+
+
+def request_wines(client, wine_ids):
+    """Request the first page of the wines."""
+    return client.get(reverse("wine:wine-list"), {"page_size": PAGE_SIZE})
+
+
+def request_wine(client, wine_ids):
+    """Request a random wine."""
+    return client.get(
+        reverse("wine:wine-detail", args=[random.choice(wine_ids)])
+    )
+
+
+def request_libraries(client, wine_ids):
+    """Request the first page of the visible libraries."""
+    return client.get(reverse("wine:library-list"), {"page_size": PAGE_SIZE})
+
+
+def request_tags(client, wine_ids):
+    """Request the first page of the tags."""
+    return client.get(reverse("wine:tag-list"), {"page_size": PAGE_SIZE})
+
+
+def request_add_review(client, wine_ids):
+    """Review a random wine, the review is rolled back."""
+    with transaction.atomic():
+        response = client.post(
+            reverse("wine:wine-add-review", args=[random.choice(wine_ids)]),
+            {"points": random.randint(80, 100), "comment": "Benchmark."},
+            format="json",
+        )
+        # Keep the catalogue unchanged for the next runs
+        transaction.set_rollback(True)
+    return response
+
+
+# Endpoints by name with the function requesting them
+ENDPOINTS = {
+    "wines": request_wines,
+    "wine-detail": request_wine,
+    "libraries": request_libraries,
+    "tags": request_tags,
+    "add-review": request_add_review,
+}
+
+
+def measure(client, request, wine_ids, requests, warmup):
+    """Return the metrics of the requests of an endpoint."""
+    for __ in range(warmup):
+        request(client, wine_ids)
+    statuses = Counter()
+    latencies = []
+    for __ in range(requests):
+        started_at = time.perf_counter()
+        response = request(client, wine_ids)
+        latencies.append(time.perf_counter() - started_at)
+        statuses[response.status_code] += 1
+    # Record the queries and the memory in a separate pass, so they do not
+    # distort the latencies
+    queries = []
+    peaks = []
+    tracemalloc.start()
+    for __ in range(min(PROFILED_REQUESTS, requests)):
+        tracemalloc.reset_peak()
+        with CaptureQueriesContext(connection) as context:
+            request(client, wine_ids)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        queries.append(len(context.captured_queries))
+    tracemalloc.stop()
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {
+        "requests": requests,
+        "status": {str(code): count for code, count in statuses.items()},
+        "p50_ms": round(float(p50), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(np.mean(latencies)) * 1000, 3),
+        "queries": max(queries),
+        "peak_kib": round(max(peaks) / 1024, 1),
+    }
+
+
+def get_user(email):
+    """Return the given user or the owner of the first library."""
+    if email:
+        return get_user_model().objects.get(email=email)
+    library = Library.objects.order_by("id").first()
+    if library is None:
+        raise SystemExit("Seed the catalogue with seed_catalogue first.")
+    return library.user
+
+
+def compare(report, baseline):
+    """Print the relative changes of the metrics against the baseline."""
+    print(
+        f"\n{'endpoint':<14}{'metric':<10}{'baseline':>12}{'now':>12}"
+        f"{'change':>9}"
+    )
+    for name, metrics in report["endpoints"].items():
+        previous = baseline["endpoints"].get(name)
+        if previous is None:
+            continue
+        for metric in METRICS:
+            before, after = previous[metric], metrics[metric]
+            change = (after - before) / before * 100 if before else 0.0
+            print(
+                f"{name:<14}{metric:<10}{before:>12}{after:>12}"
+                f"{change:>+8.1f}%"
+            )
+
+
+def main():
+    """Request the endpoints and write the report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=None
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--user", help="Email of the requesting user.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark-endpoints.json")
+    parser.add_argument("--compare", help="Path of an earlier report.")
+    options = parser.parse_args()
+
+    # Allow the host of the test client
+    setup_test_environment()
+    random.seed(options.seed)
+    client = APIClient()
+    client.force_authenticate(get_user(options.user))
+    wine_ids = list(Wine.objects.values_list("id", flat=True))
+    report = {
+        "created_at": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "catalogue": {
+            "wines": len(wine_ids),
+            "reviews": Review.objects.count(),
+            "libraries": Library.objects.count(),
+            "tags": Tag.objects.count(),
+            "users": get_user_model().objects.count(),
+        },
+        "endpoints": {},
+    }
+    print(
+        f"{'endpoint':<14}{'p50 (ms)':>10}{'p99 (ms)':>10}"
+        f"{'queries':>9}{'peak (KiB)':>12}"
+    )
+    for name in options.endpoints or ENDPOINTS:
+        metrics = measure(
+            client,
+            ENDPOINTS[name],
+            wine_ids,
+            options.requests,
+            options.warmup,
+        )
+        report["endpoints"][name] = metrics
+        print(
+            f"{name:<14}{metrics['p50_ms']:>10.2f}{metrics['p99_ms']:>10.2f}"
+            f"{metrics['queries']:>9}{metrics['peak_kib']:>12.1f}"
+        )
+    with open(options.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as file:
+            compare(report, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
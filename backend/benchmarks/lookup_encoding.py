@@ -0,0 +1,227 @@
+"""
+Benchmark of the lookup tables of the wine attributes.
+
+Two SQLite databases with the same synthetic wines are built: one stores the
+country, province, regions, variety, winery and designation as text columns
+(schema before the lookup tables), the other one as foreign keys of lookup
+tables. The size of both files and the time of the wine filters are
+reported.
+
+Run from the backend directory:
+`python -m benchmarks.lookup_encoding --rows 200000`
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+# Lookup fields with the lookup table and the number of distinct names,
+# roughly the cardinality of the wine reviews dataset
+LOOKUP_FIELDS = {
+    "designation": ("designation", 38000),
+    "variety": ("variety", 700),
+    "region_1": ("region", 1200),
+    "region_2": ("region", 20),
+    "province": ("province", 420),
+    "country": ("country", 43),
+    "winery": ("winery", 16000),
+}
+# Indexes of the text schema, the lookup fields are indexed by name
+TEXT_INDEXES = (
+    ("country", "province"),
+    ("province",),
+    ("region_1",),
+    ("region_2",),
+    ("variety", "price"),
+    ("winery",),
+    ("designation",),
+)
+# Indexes of the encoded schema, the foreign keys are indexed
+ENCODED_INDEXES = (
+    ("country_id", "province_id"),
+    ("province_id",),
+    ("region_1_id",),
+    ("region_2_id",),
+    ("variety_id", "price"),
+    ("winery_id",),
+    ("designation_id",),
+)
+# Filters with the condition of the text and the encoded schema
+FILTERS = {
+    "country": (
+        "country = :country",
+        "country_id IN (SELECT id FROM country WHERE name = :country)",
+    ),
+    "country and province": (
+        "country = :country AND province = :province",
+        "country_id IN (SELECT id FROM country WHERE name = :country) "
+        "AND province_id IN (SELECT id FROM province WHERE name = :province)",
+    ),
+    "variety and price": (
+        "variety = :variety AND price <= 20",
+        "variety_id IN (SELECT id FROM variety WHERE name = :variety) "
+        "AND price <= 20",
+    ),
+    "winery": (
+        "winery = :winery",
+        "winery_id IN (SELECT id FROM winery WHERE name = :winery)",
+    ),
+}
+
+
+def get_name(field, number):
+    """Return a name of the field, padded like the names of the dataset."""
+    return f"{field.replace('_', ' ').title()} {number:05d} of the dataset"
+
+
+def generate_wines(rows, seed):
+    """Yield the wines with the numbers of their lookup names."""
+    generator = random.Random(seed)
+    for index in range(rows):
+        # Skewed distribution, a few names are used by most wines
+        numbers = {
+            field: int(generator.paretovariate(1.2)) % cardinality
+            for field, (__, cardinality) in LOOKUP_FIELDS.items()
+        }
+        price = round(generator.uniform(4, 200), 2)
+        yield index, f"Wine {index}", price, numbers
+
+
+def create_text_database(path, rows, seed):
+    """Create the database with the text columns."""
+    connection = sqlite3.connect(path)
+    columns = ", ".join(f"{field} varchar(255)" for field in LOOKUP_FIELDS)
+    connection.execute(
+        "CREATE TABLE wine (id integer PRIMARY KEY, name varchar(100), "
+        f"price decimal, {columns})"
+    )
+    placeholders = ", ".join(["?"] * (len(LOOKUP_FIELDS) + 3))
+    connection.executemany(
+        f"INSERT INTO wine VALUES ({placeholders})",
+        (
+            [index, name, price]
+            + [get_name(field, numbers[field]) for field in LOOKUP_FIELDS]
+            for index, name, price, numbers in generate_wines(rows, seed)
+        ),
+    )
+    create_indexes(connection, TEXT_INDEXES)
+    return connection
+
+
+def create_encoded_database(path, rows, seed):
+    """Create the database with the lookup tables."""
+    connection = sqlite3.connect(path)
+    for table, cardinality in dict(LOOKUP_FIELDS.values()).items():
+        connection.execute(
+            f"CREATE TABLE {table} "
+            "(id integer PRIMARY KEY, name varchar(255) UNIQUE)"
+        )
+        connection.executemany(
+            f"INSERT INTO {table} VALUES (?, ?)",
+            (
+                (number, get_name(table, number))
+                for number in range(cardinality)
+            ),
+        )
+    columns = ", ".join(
+        f"{field}_id integer REFERENCES {table} (id)"
+        for field, (table, __) in LOOKUP_FIELDS.items()
+    )
+    connection.execute(
+        "CREATE TABLE wine (id integer PRIMARY KEY, name varchar(100), "
+        f"price decimal, {columns})"
+    )
+    placeholders = ", ".join(["?"] * (len(LOOKUP_FIELDS) + 3))
+    connection.executemany(
+        f"INSERT INTO wine VALUES ({placeholders})",
+        (
+            [index, name, price] + [numbers[field] for field in LOOKUP_FIELDS]
+            for index, name, price, numbers in generate_wines(rows, seed)
+        ),
+    )
+    create_indexes(connection, ENCODED_INDEXES)
+    return connection
+
+
+def create_indexes(connection, indexes):
+    """Create the indexes of the wine table and analyze the database."""
+    for number, columns in enumerate(indexes):
+        connection.execute(
+            f"CREATE INDEX wine_{number} ON wine ({', '.join(columns)})"
+        )
+    connection.execute("ANALYZE")
+    connection.commit()
+
+
+def get_params(seed):
+    """Return the names of the filters."""
+    generator = random.Random(seed)
+    return {
+        "country": get_name("country", 1),
+        "province": get_name("province", 1),
+        "variety": get_name("variety", generator.randrange(1, 10)),
+        "winery": get_name("winery", generator.randrange(1, 100)),
+    }
+
+
+def time_filter(connection, condition, params, repeat):
+    """Return the median time of the filter in milliseconds."""
+    timings = []
+    for __ in range(repeat):
+        started_at = time.perf_counter()
+        connection.execute(
+            f"SELECT id, name, price FROM wine WHERE {condition} "
+            "ORDER BY id LIMIT 50",
+            params,
+        ).fetchall()
+        connection.execute(
+            f"SELECT COUNT(*) FROM wine WHERE {condition}", params
+        ).fetchone()
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    """Build both databases and print the comparison."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = os.path.join(directory, "text.sqlite3")
+        encoded_path = os.path.join(directory, "encoded.sqlite3")
+        text = create_text_database(text_path, options.rows, options.seed)
+        encoded = create_encoded_database(
+            encoded_path, options.rows, options.seed
+        )
+        text_size = os.path.getsize(text_path)
+        encoded_size = os.path.getsize(encoded_path)
+        print(f"{options.rows} wines")
+        print(f"{'':24}{'text':>12}{'encoded':>12}{'ratio':>8}")
+        print(
+            f"{'file size (MiB)':24}{text_size / 2**20:12.1f}"
+            f"{encoded_size / 2**20:12.1f}{encoded_size / text_size:8.2f}"
+        )
+        params = get_params(options.seed)
+        for name, (text_condition, encoded_condition) in FILTERS.items():
+            text_time = time_filter(
+                text, text_condition, params, options.repeat
+            )
+            encoded_time = time_filter(
+                encoded, encoded_condition, params, options.repeat
+            )
+            print(
+                f"{name + ' (ms)':24}{text_time:12.2f}{encoded_time:12.2f}"
+                f"{encoded_time / text_time:8.2f}"
+            )
+        text.close()
+        encoded.close()
+
+
+if __name__ == "__main__":
+    main()
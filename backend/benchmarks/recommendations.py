@@ -0,0 +1,115 @@
+"""
+Benchmark of the training time of the wine recommendations.
+
+Synthetic reviews with a low-rank structure are factorized with the
+alternating least squares of wine.factorization for growing numbers of
+reviews. The training time, the time of the top wines of all users, the
+error of the predicted points and the peak memory of the NumPy arrays are
+reported.
+
+Run from the backend directory:
+`python -m benchmarks.recommendations --reviews 25000 50000 100000 200000`
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from wine import factorization
+
+# Reviews per user and per wine, roughly the ratio of the wine reviews
+# dataset
+REVIEWS_PER_USER = 20
+REVIEWS_PER_WINE = 8
+# Rank of the synthetic tastes
+TASTE_FACTORS = 4
+
+
+def generate_reviews(reviews, seed):
+    """Return the users, wines, points and the numbers of users and wines."""
+    generator = np.random.default_rng(seed)
+    user_count = max(reviews // REVIEWS_PER_USER, 1)
+    wine_count = max(reviews // REVIEWS_PER_WINE, 1)
+    tastes = generator.normal(size=(user_count, TASTE_FACTORS))
+    styles = generator.normal(size=(wine_count, TASTE_FACTORS))
+    # Skewed distribution, a few wines are reviewed by many users
+    users = generator.integers(0, user_count, reviews)
+    wines = (generator.zipf(1.3, reviews) - 1) % wine_count
+    points = np.clip(
+        np.rint(
+            88
+            + np.einsum("ij,ij->i", tastes[users], styles[wines])
+            + generator.normal(size=reviews)
+        ),
+        80,
+        100,
+    )
+    return users, wines, points, user_count, wine_count
+
+
+def main():
+    """Factorize the synthetic reviews and print the timings."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--reviews",
+        type=int,
+        nargs="+",
+        default=[25000, 50000, 100000, 200000],
+    )
+    parser.add_argument(
+        "--factors", type=int, default=factorization.DEFAULT_FACTORS
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=factorization.DEFAULT_ITERATIONS
+    )
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    options = parser.parse_args()
+
+    print(
+        f"{'reviews':>10}{'users':>10}{'wines':>10}{'train (s)':>12}"
+        f"{'top (s)':>10}{'rmse':>8}{'peak (MiB)':>12}"
+    )
+    for reviews in options.reviews:
+        users, wines, points, user_count, wine_count = generate_reviews(
+            reviews, options.seed
+        )
+        tracemalloc.start()
+        started_at = time.perf_counter()
+        mean, user_factors, wine_factors = factorization.factorize(
+            users,
+            wines,
+            points,
+            user_count,
+            wine_count,
+            factors=options.factors,
+            iterations=options.iterations,
+        )
+        train_time = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        by_user = np.argsort(users, kind="stable")
+        for __ in factorization.iter_top_wines(
+            users[by_user],
+            wines[by_user],
+            mean,
+            user_factors,
+            wine_factors,
+            options.count,
+        ):
+            pass
+        top_time = time.perf_counter() - started_at
+        __, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rmse = factorization.get_rmse(
+            users, wines, points, mean, user_factors, wine_factors
+        )
+        print(
+            f"{reviews:>10}{user_count:>10}{wine_count:>10}"
+            f"{train_time:>12.2f}{top_time:>10.2f}{rmse:>8.2f}"
+            f"{peak / 2**20:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
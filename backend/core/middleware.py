@@ -0,0 +1,151 @@
+"""
+Instrumentation of the requests with Server-Timing headers.
+
+The ServerTimingMiddleware is only used if the SERVER_TIMING setting is
+enabled. Otherwise Django removes it from the middleware chain at startup and
+nothing is instrumented. If enabled, every request reports the following
+phases in its Server-Timing header and in a JSON log line:
+
+- db: the number and the duration of the SQL queries of all connections,
+- serialize: the time building the data of the DRF serializers, including
+  the queries which are evaluated lazily while serializing,
+- render: the time rendering the response,
+- total: the time of the request in the middleware.
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Phases of a request which are timed
+PHASES = ("db", "serialize", "render")
+# Timings of the current request, None outside of instrumented requests
+current_timings = contextvars.ContextVar("current_timings", default=None)
+
+
+class RequestTimings:
+    """Number of queries and durations of the phases of a request."""
+
+    def __init__(self):
+        """Start without queries and durations."""
+        self.queries = 0
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        # Nested serializers are timed as part of the outermost one
+        self.serializing = False
+
+    def add(self, phase, started_at):
+        """Add the time since started_at to the duration of the phase."""
+        self.durations[phase] += time.perf_counter() - started_at
+
+    def execute(self, execute, sql, params, many, context):
+        """Count and time a query, used as execute wrapper."""
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add("db", started_at)
+
+    def get_header(self, total):
+        """Return the value of the Server-Timing header."""
+        metrics = [
+            f'db;desc="{self.queries} queries";'
+            f"dur={self.durations['db'] * 1000:.2f}"
+        ]
+        metrics += [
+            f"{phase};dur={self.durations[phase] * 1000:.2f}"
+            for phase in PHASES[1:]
+        ]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def get_record(self, request, response, total):
+        """Return the fields of the log line of the request."""
+        return {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": self.queries,
+            **{
+                f"{phase}_ms": round(duration * 1000, 3)
+                for phase, duration in self.durations.items()
+            },
+            "total_ms": round(total * 1000, 3),
+        }
+
+
+def time_serializer_data():
+    """
+    Time the data property of the DRF serializers.
+
+    The data property of all serializers, including the list serializers,
+    ends in BaseSerializer.data, which is wrapped once.
+    """
+    get_data = serializers.BaseSerializer.data.fget
+    if getattr(get_data, "timed", False):
+        return
+
+    @wraps(get_data)
+    def get_timed_data(serializer):
+        timings = current_timings.get()
+        if timings is None or timings.serializing:
+            return get_data(serializer)
+        timings.serializing = True
+        started_at = time.perf_counter()
+        try:
+            return get_data(serializer)
+        finally:
+            timings.serializing = False
+            timings.add("serialize", started_at)
+
+    get_timed_data.timed = True
+    serializers.BaseSerializer.data = property(get_timed_data)
+
+
+class ServerTimingMiddleware:
+    """Report the SQL, serializer and render time of every request."""
+
+    def __init__(self, get_response):
+        """Remove the middleware from the chain, unless it is enabled."""
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        time_serializer_data()
+
+    def __call__(self, request):
+        """Time the request and add the Server-Timing header."""
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started_at = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                # Time the queries of all databases
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - started_at
+        response["Server-Timing"] = timings.get_header(total)
+        logger.info(json.dumps(timings.get_record(request, response, total)))
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the rendering of DRF and template responses."""
+        timings = current_timings.get()
+        started_at = time.perf_counter()
+        response.add_post_render_callback(
+            lambda response: timings.add("render", started_at)
+        )
+        return response
@@ -4,7 +4,10 @@ well as helper functions for further test cases.
 """
 import uuid
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
 
@@ -37,12 +40,22 @@ def create_user(**kwargs):
     return user
 
 
+# The tests run in one process and count only the queries of the app
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+)
 class APIBaseTestCase(TestCase):
     """API Base Test Class."""
 
     def setUp(self) -> None:
         """Setup class with API Client."""
         self.client = APIClient()
+        # Do not share cached data between the tests
+        cache.clear()
 
 
 class PublicAPITestCase(APIBaseTestCase):
@@ -69,3 +82,56 @@ class PrivateAPITestCase(APIBaseTestCase):
         )
         # Log in with the user
         self.client.force_authenticate(self.user)
+
+
+class QueryBudgetTestCase(PrivateAPITestCase):
+    """
+    Base Test class for the query budgets of the api endpoints.
+
+    query_budgets maps the name of an endpoint to its maximum number of
+    queries. For every name, the method setup_<name>(rows) creates the given
+    number of related rows and returns the method, the url and the data of
+    the request. Every endpoint is requested with each of row_counts, and the
+    test fails if the request exceeds its budget or if its number of queries
+    changes with the number of rows, which points to queries per row.
+    """
+
+    # Numbers of related rows every endpoint is requested with
+    row_counts = (1, 10, 100)
+    # Maximum number of queries by endpoint name
+    query_budgets = {}
+
+    def count_queries(self, name, rows):
+        """
+        Create the rows, request the endpoint and return the queries.
+
+        The rows and the cached data are discarded afterwards.
+        """
+        with transaction.atomic():
+            method, url, data = getattr(self, f"setup_{name}")(rows)
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                res = getattr(self.client, method)(url, data, format="json")
+            self.assertLess(res.status_code, 400, res.content)
+            # Discard the rows for the next count
+            transaction.set_rollback(True)
+        return len(context.captured_queries)
+
+    def test_query_budgets(self):
+        """Test that no endpoint exceeds its budget or grows with rows."""
+        for name, budget in self.query_budgets.items():
+            with self.subTest(endpoint=name):
+                counts = {
+                    rows: self.count_queries(name, rows)
+                    for rows in self.row_counts
+                }
+                self.assertLessEqual(
+                    max(counts.values()),
+                    budget,
+                    f"Queries of {name} by rows: {counts}",
+                )
+                self.assertEqual(
+                    len(set(counts.values())),
+                    1,
+                    f"Queries of {name} grow with the rows: {counts}",
+                )
@@ -0,0 +1,60 @@
+"""Test the Server-Timing middleware of the core app."""
+import json
+import re
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.basetestclasses import PrivateAPITestCase
+from wine.tests.test_wine_api import create_sample_wine
+
+# Store the wine list url as constant value
+WINES_LIST_URL = reverse("wine:wine-list")
+
+
+def parse_server_timing(header):
+    """Return the durations and descriptions of the header by name."""
+    metrics = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+class TestServerTiming(PrivateAPITestCase):
+    """Test the instrumentation of the requests."""
+
+    def setUp(self):
+        """Create a wine, so the list has to be serialized."""
+        super().setUp()
+        create_sample_wine(points=90)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        """Test that the phases of the request are reported."""
+        with self.assertLogs("core.middleware", "INFO") as logs:
+            res = self.client.get(WINES_LIST_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        metrics = parse_server_timing(res["Server-Timing"])
+        self.assertEqual(list(metrics), ["db", "serialize", "render", "total"])
+        for metric in metrics.values():
+            self.assertRegex(metric["dur"], r"^\d+\.\d{2}$")
+        queries = int(re.match(r'"(\d+) queries"', metrics["db"]["desc"])[1])
+        self.assertGreater(queries, 0)
+        # Assert the structured log line
+        self.assertEqual(len(logs.output), 1)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], WINES_LIST_URL)
+        self.assertEqual(record["status"], status.HTTP_200_OK)
+        self.assertEqual(record["queries"], queries)
+        self.assertGreater(record["serialize_ms"], 0)
+        self.assertGreater(record["render_ms"], 0)
+        self.assertGreaterEqual(record["total_ms"], record["db_ms"])
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        """Test that requests are not instrumented by default."""
+        res = self.client.get(WINES_LIST_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", res)
@@ -17,4 +17,10 @@ urlpatterns = [
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     # Me url to view user information
     path("me/", user_views.ManageUserView.as_view(), name="me"),
+    # Recommendations url to list the recommended wines of the user
+    path(
+        "me/recommendations/",
+        user_views.RecommendationsView.as_view(),
+        name="recommendations",
+    ),
 ]
@@ -1,8 +1,13 @@
 """Views for the user module."""
+from django.db.models import Exists, OuterRef
 from rest_framework import generics, authentication, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
 from user.serializers import UserSerializer, AuthTokenSerializer
+from wine.models import Review, Wine, WineRecommendation
+from wine.serializers import WineRecommendationSerializer
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -28,3 +33,33 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         """Get the authenticated user as object."""
         return self.request.user
+
+
+class RecommendationsView(generics.ListAPIView):
+    """
+    View to list the recommended wines of the authenticated user.
+
+    The recommendations are precomputed by the compute_wine_recommendations
+    command. Wines which the user has reviewed since are left out.
+    """
+
+    serializer_class = WineRecommendationSerializer
+    authentication_classes = (JWTAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+    # The recommendations are not filtered
+    filter_backends = ()
+
+    def get_queryset(self):
+        """Get the recommendations of the user in their order."""
+        user = self.request.user
+        return (
+            WineRecommendation.objects.filter(user=user)
+            .exclude(
+                Exists(Review.objects.filter(user=user, wine=OuterRef("wine")))
+            )
+            .order_by("rank")
+            .select_related(
+                *[f"wine__{field}" for field in Wine.LOOKUP_FIELDS]
+            )
+            .prefetch_related("wine__libraries", "wine__tags", "wine__reviews")
+        )
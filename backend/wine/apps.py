@@ -6,3 +6,8 @@ class WineConfig(AppConfig):
     """App Configuration class."""
 
     name = "wine"
+
+    def ready(self):
+        """Connect the signal receivers of the app."""
+        # pylint: disable=import-outside-toplevel,unused-import
+        from wine import signals  # noqa: F401
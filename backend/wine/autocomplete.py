@@ -0,0 +1,162 @@
+"""
+In-process prefix index for the autocompletion of the search box.
+
+The names of wines, wineries, varieties and tags are kept in sorted lists
+in the memory of every process. A prefix is looked up with a binary search,
+so suggestions are found without querying the database.
+
+The index is built with one query per kind when it is used first. Changes
+of single objects are applied by the signal receivers of the wine app after
+their transaction has been committed. Bulk writes, which do not send
+signals, invalidate the index or add their names themselves. Every process
+rebuilds its index after REFRESH_INTERVAL seconds, so changes made by other
+processes are picked up.
+"""
+import bisect
+import heapq
+import itertools
+import threading
+import time
+
+from wine.models import Tag, Variety, Wine, Winery
+
+# Models of the suggested names by their kind
+SOURCES = {
+    "wine": Wine,
+    "winery": Winery,
+    "variety": Variety,
+    "tag": Tag,
+}
+# Default and maximum number of suggestions
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Seconds after which the index of a process is rebuilt
+REFRESH_INTERVAL = 5 * 60
+
+
+def normalize(name):
+    """Return the key of a name, which is compared case-insensitively."""
+    return " ".join(name.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Sorted lists of the names of every kind.
+
+    Every list contains tuples of the normalized key and the name. Names
+    which are used by several objects, i.e. tags of different users, are
+    stored once and counted.
+    """
+
+    def __init__(self, sources=None, refresh_interval=REFRESH_INTERVAL):
+        """Create an empty index, which is built when it is used."""
+        self.sources = sources or SOURCES
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.entries = None
+        self.counts = None
+        self.built_at = None
+
+    def build(self):
+        """Load all names from the database. The lock has to be held."""
+        self.entries = {}
+        self.counts = {}
+        for kind, model in self.sources.items():
+            counts = {}
+            for name in model.objects.values_list("name", flat=True):
+                counts[name] = counts.get(name, 0) + 1
+            self.counts[kind] = counts
+            self.entries[kind] = sorted(
+                (normalize(name), name) for name in counts
+            )
+        self.built_at = time.monotonic()
+
+    def ensure_built(self):
+        """Build the index if it is missing or expired."""
+        if (
+            self.entries is None
+            or time.monotonic() - self.built_at > self.refresh_interval
+        ):
+            self.build()
+
+    def invalidate(self):
+        """Drop the index, it is built again when it is used next."""
+        with self.lock:
+            self.entries = None
+            self.counts = None
+
+    def add(self, kind, name):
+        """Add a name of the kind to the index."""
+        with self.lock:
+            if self.entries is None or not name:
+                # The name is loaded when the index is built
+                return
+            counts = self.counts[kind]
+            counts[name] = counts.get(name, 0) + 1
+            if counts[name] == 1:
+                bisect.insort(self.entries[kind], (normalize(name), name))
+
+    def add_names(self, kind, names):
+        """Add the names of the kind to the index."""
+        for name in names:
+            self.add(kind, name)
+
+    def remove(self, kind, name):
+        """Remove a name of the kind from the index."""
+        with self.lock:
+            if self.entries is None or name not in self.counts[kind]:
+                return
+            counts = self.counts[kind]
+            counts[name] -= 1
+            if counts[name] > 0:
+                # Other objects still have the name
+                return
+            del counts[name]
+            entries = self.entries[kind]
+            entry = (normalize(name), name)
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def search(self, prefix, limit=DEFAULT_LIMIT, kinds=None):
+        """
+        Return the suggestions starting with the prefix.
+
+        A suggestion is a tuple of the kind and the name. At most limit
+        suggestions of the given kinds (or all kinds) are returned, ordered
+        by their normalized name.
+        """
+        key = normalize(prefix)
+        kinds = [kind for kind in self.sources if not kinds or kind in kinds]
+        matches = []
+        with self.lock:
+            self.ensure_built()
+            for kind in kinds:
+                entries = self.entries[kind]
+                start = bisect.bisect_left(entries, (key,))
+                # Collect the first matches of every kind
+                kind_matches = []
+                stop = start + limit
+                for entry_key, name in entries[start:stop]:
+                    if not entry_key.startswith(key):
+                        break
+                    kind_matches.append((entry_key, kind, name))
+                matches.append(kind_matches)
+        return [
+            (kind, name)
+            for __, kind, name in itertools.islice(
+                heapq.merge(*matches), limit
+            )
+        ]
+
+
+# Index of the current process
+index = PrefixIndex()
+
+
+def get_kind(model):
+    """Return the kind of the names of the model, or None."""
+    for kind, source in SOURCES.items():
+        if source is model:
+            return kind
+    return None
@@ -0,0 +1,277 @@
+"""
+Batch writes of wines and reviews.
+
+All items of a batch are validated together: the related objects and the
+unique names are checked with one query each, instead of one query per item.
+The valid items are written with bulk inserts and updates.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from wine import autocomplete, search
+from wine.cache import bump_catalogue_version, bump_public_libraries_version
+from wine.models import Library, Review, Tag, Wine
+from wine.rankings import refresh_rankings
+from wine.ratings import apply_review_deltas
+from wine.serializers import ReviewBulkItemSerializer, WineBatchItemSerializer
+from wine.tag_counts import recount_tags
+
+# Maximum number of wines or reviews per batch
+MAX_BATCH_SIZE = 1000
+# Many to many fields which are written with the through tables
+RELATION_FIELDS = ("libraries", "tags")
+
+
+def get_invalid_result(index, errors):
+    """Return the result of an invalid item."""
+    return {"index": index, "status": "invalid", "errors": errors}
+
+
+def validate_items(items):
+    """
+    Validate the fields of every item.
+
+    Return the results of the invalid items and the validated data of the
+    valid items by their index.
+    """
+    results = {}
+    valid = {}
+    for index, item in enumerate(items):
+        # Items with an id are partial updates
+        partial = isinstance(item, dict) and "id" in item
+        serializer = WineBatchItemSerializer(data=item, partial=partial)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            results[index] = get_invalid_result(index, serializer.errors)
+    return results, valid
+
+
+def check_items(valid, user):
+    """
+    Check the ids, names and relations of the valid items.
+
+    Return the results of the rejected items, the accepted items by their
+    index and the wines which are updated by their id.
+    """
+    # Load everything which is referenced by the batch at once
+    wines = Wine.objects.in_bulk(
+        {data["id"] for data in valid.values() if "id" in data}
+    )
+    existing_names = dict(
+        Wine.objects.filter(
+            name__in={
+                data["name"] for data in valid.values() if "name" in data
+            }
+        ).values_list("name", "id")
+    )
+    tag_ids = set(
+        Tag.objects.filter(
+            pk__in={
+                pk for data in valid.values() for pk in data.get("tags", [])
+            }
+        ).values_list("id", flat=True)
+    )
+    library_users = dict(
+        Library.objects.filter(
+            pk__in={
+                pk
+                for data in valid.values()
+                for pk in data.get("libraries", [])
+            }
+        ).values_list("id", "user_id")
+    )
+
+    results = {}
+    accepted = {}
+    seen_ids = set()
+    seen_names = set()
+    for index, data in valid.items():
+        errors = {}
+        wine_id = data.get("id")
+        if wine_id is not None and wine_id not in wines:
+            errors["id"] = ["Wine does not exist."]
+        elif wine_id is not None and wine_id in seen_ids:
+            errors["id"] = ["Wine is updated more than once."]
+        name = data.get("name")
+        if name is not None and (
+            name in seen_names or existing_names.get(name, wine_id) != wine_id
+        ):
+            errors["name"] = ["wine with this name already exists."]
+        missing_tags = [pk for pk in data.get("tags", []) if pk not in tag_ids]
+        if missing_tags:
+            errors["tags"] = [
+                f'Invalid pk "{pk}" - object does not exist.'
+                for pk in missing_tags
+            ]
+        # Libraries need to have the same user as the wine
+        owner_id = wines[wine_id].user_id if wine_id in wines else user.id
+        libraries = data.get("libraries", [])
+        if any(pk not in library_users for pk in libraries):
+            errors["libraries"] = ["Library does not exist."]
+        elif any(library_users[pk] != owner_id for pk in libraries):
+            errors["libraries"] = ["Can not add library."]
+        if errors:
+            results[index] = get_invalid_result(index, errors)
+            continue
+        seen_ids.add(wine_id)
+        seen_names.add(name)
+        accepted[index] = data
+    return results, accepted, wines
+
+
+def write_relations(items):
+    """
+    Replace the related objects of the wines.
+
+    items is a list of the wine and its validated data. Only the relations
+    which are part of the data are replaced.
+    """
+    for field in RELATION_FIELDS:
+        relation = getattr(Wine, field)
+        through = relation.through
+        target_column = f"{relation.field.m2m_reverse_field_name()}_id"
+        related_ids = {
+            wine.id: set(data[field]) for wine, data in items if field in data
+        }
+        if not related_ids:
+            continue
+        current = through.objects.filter(wine_id__in=related_ids)
+        # The previously and the newly related objects are affected
+        affected_ids = set(
+            current.values_list(target_column, flat=True)
+        ).union(*related_ids.values())
+        if field == "libraries":
+            # Touch the libraries, the bulk writes do not send the signals
+            # of the relations
+            Library.touch(affected_ids)
+            if Library.objects.filter(
+                pk__in=affected_ids, public__in=[True]
+            ).exists():
+                bump_public_libraries_version()
+        # Remove the current rows and insert the new ones
+        current.delete()
+        through.objects.bulk_create(
+            [
+                through(wine_id=wine_id, **{target_column: pk})
+                for wine_id, pks in related_ids.items()
+                for pk in pks
+            ]
+        )
+        if field == "tags":
+            # Count the wines of the tags after the rows have been replaced
+            recount_tags(affected_ids)
+
+
+def write_wine_batch(items, user):
+    """
+    Create and update the wines of the batch.
+
+    New wines are linked to the given user. Return a list with the result
+    of every item in the order of the items.
+    """
+    results, valid = validate_items(items)
+    rejected, accepted, wines = check_items(valid, user)
+    results.update(rejected)
+
+    created = []
+    updated = []
+    update_fields = {"updated_at"}
+    now = timezone.now()
+    # Resolve the lookup names of all items at once
+    lookup_ids = Wine.get_lookup_ids(accepted.values())
+    for index, data in accepted.items():
+        fields = {
+            field: value
+            for field, value in data.items()
+            if field not in RELATION_FIELDS
+            and field not in Wine.LOOKUP_FIELDS
+            and field != "id"
+        }
+        fields.update(
+            {
+                f"{field}_id": lookup_ids[field].get(data[field])
+                for field in Wine.LOOKUP_FIELDS
+                if field in data
+            }
+        )
+        if "id" in data:
+            wine = wines[data["id"]]
+            for field, value in fields.items():
+                setattr(wine, field, value)
+            wine.updated_at = now
+            if wine.has_changed_features():
+                wine.features_updated_at = now
+                update_fields.add("features_updated_at")
+            update_fields.update(fields)
+            updated.append((index, wine, data))
+        else:
+            created.append((index, Wine(user=user, **fields), data))
+
+    with transaction.atomic():
+        Wine.bulk_insert([wine for __, wine, __ in created])
+        Wine.objects.bulk_update(
+            [wine for __, wine, __ in updated], sorted(update_fields)
+        )
+        write_relations([(wine, data) for __, wine, data in created + updated])
+        search.index_wines([wine for __, wine, __ in created + updated])
+        # The segment fields of the rankings may have changed
+        refresh_rankings([wine.id for __, wine, __ in updated])
+    if accepted:
+        bump_catalogue_version()
+        # The bulk writes do not send signals, load all names again
+        transaction.on_commit(autocomplete.index.invalidate)
+
+    for status, written in [("created", created), ("updated", updated)]:
+        for index, wine, __ in written:
+            results[index] = {"index": index, "status": status, "id": wine.id}
+    return [results[index] for index in range(len(items))]
+
+
+def create_review_batch(items, user):
+    """
+    Create the reviews of the batch in one transaction.
+
+    Either all reviews are created or none. Return a tuple of the created
+    reviews and None, or None and the list of errors of every item.
+    """
+    item_serializers = [ReviewBulkItemSerializer(data=item) for item in items]
+    errors = [
+        {} if serializer.is_valid() else serializer.errors
+        for serializer in item_serializers
+    ]
+    # Look up all wines with one query
+    wine_ids = set(
+        Wine.objects.filter(
+            pk__in={
+                serializer.validated_data["wine"]
+                for serializer, item_errors in zip(item_serializers, errors)
+                if not item_errors
+            }
+        ).values_list("id", flat=True)
+    )
+    for serializer, item_errors in zip(item_serializers, errors):
+        if (
+            not item_errors
+            and serializer.validated_data["wine"] not in wine_ids
+        ):
+            item_errors["wine"] = ["Wine does not exist."]
+    if any(errors):
+        return None, errors
+
+    reviews = []
+    deltas = defaultdict(lambda: (0, 0))
+    for serializer in item_serializers:
+        data = dict(serializer.validated_data)
+        wine_id = data.pop("wine")
+        reviews.append(Review(wine_id=wine_id, user=user, **data))
+        count, points = deltas[wine_id]
+        deltas[wine_id] = (count + 1, points + data["points"])
+    with transaction.atomic():
+        Review.objects.bulk_create(reviews)
+        # Bulk inserts do not send signals, update the aggregates directly
+        apply_review_deltas(dict(deltas))
+    bump_catalogue_version()
+    return reviews, None
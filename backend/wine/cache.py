@@ -0,0 +1,110 @@
+"""
+Caching of data derived from the wine catalogue.
+
+Cached values are stored under keys containing the version of the
+catalogue. The version is bumped whenever wines or reviews change, which
+invalidates all derived values at once without deleting any keys.
+
+The public libraries have a version of their own, which is only bumped if a
+public library, its wines or the wine ids of a public library change.
+
+The versions only reach the other server processes and the management
+commands through a shared cache, see CACHES in the settings.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+# Key of the current catalogue version
+CATALOGUE_VERSION_KEY = "wine:catalogue-version"
+# Key of the current version of the public libraries
+PUBLIC_LIBRARIES_VERSION_KEY = "wine:public-libraries-version"
+# Key of the prior points of the wine rankings
+RANKING_PRIOR_KEY = "wine:ranking-prior"
+# Seconds a derived value is cached at most
+CATALOGUE_CACHE_TIMEOUT = 60 * 60
+# Seconds a public library response may be reused by proxies and clients
+PUBLIC_LIBRARIES_MAX_AGE = 60
+
+
+def new_version():
+    """
+    Return a new initial version.
+
+    The current time is used, so an evicted version never starts again at a
+    value which has already been used.
+    """
+    return time.time_ns()
+
+
+def get_version(key=CATALOGUE_VERSION_KEY):
+    """Return the current version stored under the key."""
+    version = cache.get(key)
+    if version is None:
+        # Initialize the version, another process may be faster
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key=CATALOGUE_VERSION_KEY):
+    """Invalidate all cached values of the version stored under the key."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The version does not exist (anymore)
+        cache.set(key, new_version(), timeout=None)
+
+
+def get_catalogue_version():
+    """Return the current version of the catalogue."""
+    return get_version(CATALOGUE_VERSION_KEY)
+
+
+def bump_catalogue_version():
+    """Invalidate all cached values derived from the catalogue."""
+    bump_version(CATALOGUE_VERSION_KEY)
+
+
+def bump_public_libraries_version():
+    """Invalidate all cached responses of the public libraries."""
+    bump_version(PUBLIC_LIBRARIES_VERSION_KEY)
+
+
+def normalize_params(query_params, names):
+    """
+    Normalize the given query parameters for the use in a cache key.
+
+    Only the parameters with the given names and a value are kept, sorted
+    by name and value.
+    """
+    return sorted(
+        (name, sorted(value for value in query_params.getlist(name) if value))
+        for name in names
+        if any(query_params.getlist(name))
+    )
+
+
+def get_catalogue_cache_key(prefix, params, version_key=CATALOGUE_VERSION_KEY):
+    """Return the cache key of a value derived for the given params."""
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True).encode()
+    ).hexdigest()
+    return f"wine:{prefix}:{get_version(version_key)}:{digest}"
+
+
+def get_or_compute(prefix, params, compute, version_key=CATALOGUE_VERSION_KEY):
+    """
+    Return the cached value for the params or compute and cache it.
+
+    compute is called without arguments if the value is not cached. The
+    value is invalidated with the version stored under version_key.
+    """
+    key = get_catalogue_cache_key(prefix, params, version_key)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, CATALOGUE_CACHE_TIMEOUT)
+    return value
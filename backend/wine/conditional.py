@@ -0,0 +1,167 @@
+"""
+Conditional GET requests of the wine app viewsets.
+
+Lists and details get cheap validators, which are computed with one query
+before anything is serialized. Clients sending a matching If-None-Match or
+If-Modified-Since header receive 304 Not Modified without a body.
+
+The validators rely on the update time of the objects. Changes of the
+relations of wines and of the reviews touch the update time of the affected
+objects (see wine.signals and wine.ratings).
+"""
+import hashlib
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+# Clients have to revalidate the responses before they are reused
+CACHE_CONTROL = "private, no-cache"
+
+
+def get_latest_update_subquery(model, name):
+    """
+    Return the subquery of the latest update of the related objects.
+
+    name is the name of a relation of the model, which is compared with the
+    primary key of the outer query.
+    """
+    field = model._meta.get_field(name)
+    if field.auto_created and not field.concrete:
+        # Reverse relation, i.e. the reviews of a wine
+        query_name = field.field.name
+    else:
+        query_name = field.related_query_name()
+    return Subquery(
+        field.related_model.objects.filter(**{query_name: OuterRef("pk")})
+        .order_by("-updated_at")
+        .values("updated_at")[:1]
+    )
+
+
+class ConditionalGetMixin:
+    """
+    Answer list and retrieve requests conditionally.
+
+    The validator of a list is the latest update time and the number of the
+    filtered objects, the validator of a detail is the latest update time
+    of the object and of the related objects which are part of its
+    representation.
+    """
+
+    # Relations whose update times are part of the detail validator
+    conditional_related_fields = ()
+
+    def get_list_validator(self):
+        """
+        Return the latest update time and the count of the list.
+
+        Paginated lists are validated by the items of the requested page,
+        so the validator uses the same index as the page.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        get_page_queryset = getattr(self.paginator, "get_page_queryset", None)
+        page = None
+        if get_page_queryset is not None:
+            page = get_page_queryset(queryset, self.request, view=self)
+        if page is None:
+            # Ordering is not needed to aggregate the whole list
+            page = queryset.order_by()
+        result = page.aggregate(
+            last_modified=Max("updated_at"), count=Count("pk")
+        )
+        return result["last_modified"], result["count"]
+
+    def get_detail_validator(self):
+        """
+        Return the latest update time of the object and its relations.
+
+        None is returned if the object is not visible, so the request is
+        answered as usual.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        names = [f"related_{name}" for name in self.conditional_related_fields]
+        values = (
+            queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+            .order_by()
+            .annotate(
+                **{
+                    f"related_{name}": get_latest_update_subquery(
+                        queryset.model, name
+                    )
+                    for name in self.conditional_related_fields
+                }
+            )
+            .values_list("updated_at", *names)
+            .first()
+        )
+        if values is None:
+            return None
+        return max(value for value in values if value is not None)
+
+    def get_etag(self, request, *values):
+        """Return the entity tag of the response for the given values."""
+        key = "|".join(
+            [
+                request.get_full_path(),
+                str(request.user.pk),
+                request.META.get("HTTP_ACCEPT", ""),
+                *[str(value) for value in values],
+            ]
+        )
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def get_conditional_response(self, request, etag, last_modified=None):
+        """
+        Return the response to a conditional request.
+
+        If the validators match the headers of the request, the 304 response
+        is returned, otherwise None.
+        """
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            return None
+        return self.set_validator_headers(response, etag, last_modified)
+
+    @staticmethod
+    def set_validator_headers(response, etag, last_modified=None):
+        """Set the validators and the cache control of the response."""
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        response["Cache-Control"] = CACHE_CONTROL
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """
+        List the objects, if they have been modified.
+
+        The list has no Last-Modified header, since deleted objects do not
+        change the latest update time.
+        """
+        last_modified, count = self.get_list_validator()
+        etag = self.get_etag(request, last_modified, count)
+        response = self.get_conditional_response(request, etag)
+        if response is not None:
+            return response
+        response = super().list(request, *args, **kwargs)
+        return self.set_validator_headers(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve the object, if it has been modified."""
+        last_modified = self.get_detail_validator()
+        if last_modified is None:
+            # Let the default retrieval answer with not found
+            return super().retrieve(request, *args, **kwargs)
+        etag = self.get_etag(request, last_modified)
+        response = self.get_conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+        response = super().retrieve(request, *args, **kwargs)
+        return self.set_validator_headers(response, etag, last_modified)
@@ -0,0 +1,94 @@
+"""Streaming export of wines as CSV or newline delimited JSON."""
+import csv
+import itertools
+import json
+
+from wine.models import Wine
+
+# Exported fields of the wine
+EXPORT_FIELDS = (
+    "id",
+    "name",
+    "description",
+    "price",
+    "designation",
+    "variety",
+    "region_1",
+    "region_2",
+    "province",
+    "country",
+    "winery",
+    "review_count",
+    "points_avg",
+)
+# Columns of an exported row
+EXPORT_COLUMNS = EXPORT_FIELDS + ("tags",)
+# Number of wines fetched per query
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Pseudo buffer which returns the written value instead of storing."""
+
+    def write(self, value):
+        """Return the value."""
+        return value
+
+
+def iter_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the wines of the queryset as dictionaries.
+
+    The wines are fetched in chunks from a server side iterator, the tag
+    names are loaded with one query per chunk.
+    """
+    # The lookup fields are exported with their names
+    paths = [
+        f"{field}__name" if field in Wine.LOOKUP_FIELDS else field
+        for field in EXPORT_FIELDS
+    ]
+    rows = (
+        queryset.order_by("pk")
+        .values_list(*paths)
+        .iterator(chunk_size=chunk_size)
+    )
+    through = Wine.tags.through
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        # Load the tag names of all wines of the chunk
+        tags = {}
+        for wine_id, name in (
+            through.objects.filter(wine_id__in=[row[0] for row in chunk])
+            .order_by("tag__name")
+            .values_list("wine_id", "tag__name")
+        ):
+            tags.setdefault(wine_id, []).append(name)
+        for row in chunk:
+            item = dict(zip(EXPORT_FIELDS, row))
+            item["tags"] = tags.get(item["id"], [])
+            yield item
+
+
+def iter_csv(rows):
+    """Yield the lines of a CSV file of the rows."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        row["tags"] = ";".join(row["tags"])
+        yield writer.writerow([row[column] for column in EXPORT_COLUMNS])
+
+
+def iter_ndjson(rows):
+    """Yield the lines of a newline delimited JSON file of the rows."""
+    for row in rows:
+        # Decimals are exported as strings to keep their precision
+        yield json.dumps(row, default=str) + "\n"
+
+
+# Export formats with the content type and the generator of the lines
+EXPORT_FORMATS = {
+    "csv": ("text/csv", iter_csv),
+    "ndjson": ("application/x-ndjson", iter_ndjson),
+}
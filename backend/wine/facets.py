@@ -0,0 +1,70 @@
+"""Facet counts over a selection of wines."""
+from django.db.models import Count, F, Q
+
+# Fields which are counted per value
+FACET_FIELDS = ("country", "province", "variety", "winery")
+# Price buckets as label, lower bound (inclusive) and upper bound (exclusive)
+PRICE_BUCKETS = (
+    ("<10", None, 10),
+    ("10-20", 10, 20),
+    ("20-50", 20, 50),
+    ("50-100", 50, 100),
+    (">=100", 100, None),
+)
+# Number of values returned per facet by default and at most
+DEFAULT_FACET_LIMIT = 20
+MAX_FACET_LIMIT = 100
+
+
+def get_bucket_condition(field, lower, upper):
+    """Return the condition of rows whose field is in the bucket."""
+    condition = Q(**{f"{field}__isnull": False})
+    if lower is not None:
+        condition &= Q(**{f"{field}__gte": lower})
+    if upper is not None:
+        condition &= Q(**{f"{field}__lt": upper})
+    return condition
+
+
+def get_price_bucket_condition(lower, upper):
+    """Return the condition of wines in the price bucket."""
+    return get_bucket_condition("price", lower, upper)
+
+
+def get_facet_counts(queryset, limit=DEFAULT_FACET_LIMIT):
+    """
+    Count the wines of the queryset per facet.
+
+    Every field facet is a list of the most frequent values with their
+    count, computed with one grouped query. The price buckets are counted
+    together with the total in a single query.
+    """
+    # Ordering and annotations of the selection are not needed for counting
+    queryset = queryset.order_by()
+    facets = {}
+    for field in FACET_FIELDS:
+        # Group by the foreign key and join the name of the lookup
+        rows = (
+            queryset.filter(**{f"{field}__isnull": False})
+            .values(field, value=F(f"{field}__name"))
+            .annotate(count=Count("id"))
+            .order_by("-count", "value")[:limit]
+        )
+        facets[field] = [
+            {"value": row["value"], "count": row["count"]} for row in rows
+        ]
+    # Count the total and all price buckets with one query
+    totals = queryset.aggregate(
+        total=Count("id"),
+        **{
+            f"price_{index}": Count(
+                "id", filter=get_price_bucket_condition(lower, upper)
+            )
+            for index, (__, lower, upper) in enumerate(PRICE_BUCKETS)
+        },
+    )
+    facets["price"] = [
+        {"value": label, "count": totals[f"price_{index}"]}
+        for index, (label, __, __) in enumerate(PRICE_BUCKETS)
+    ]
+    return {"count": totals["total"], "facets": facets}
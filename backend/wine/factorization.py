@@ -0,0 +1,160 @@
+"""
+Matrix factorization of review points with alternating least squares.
+
+The module only depends on NumPy. The ratings are given as arrays of the
+user row, the wine column and the points of every review, no dense rating
+matrix is built. The memory usage grows with the number of reviews and the
+number of users and wines times the number of factors, the normal equations
+are solved for blocks of rows.
+"""
+import numpy as np
+
+# Number of latent factors of users and wines
+DEFAULT_FACTORS = 16
+# Number of alternating updates of the user and the wine factors
+DEFAULT_ITERATIONS = 10
+# Weight of the squared factors, per rating of a row
+DEFAULT_REGULARIZATION = 0.1
+# Number of rows whose normal equations are solved at once
+BLOCK_SIZE = 1024
+# Number of ratings whose outer products are summed at once
+CHUNK_SIZE = 65536
+# Number of predicted points which are ranked at once, a block of users is
+# scored against all wines
+SCORE_BUDGET = 2**22
+
+
+def solve_factors(rows, columns, values, fixed, count, regularization):
+    """
+    Return the factors of the rows for the fixed factors of the columns.
+
+    rows must be sorted. Every row minimizes the squared error of its
+    values plus the regularization weighted by its number of values, rows
+    without values get zero factors.
+    """
+    factors = fixed.shape[1]
+    solved = np.zeros((count, factors))
+    identity = np.eye(factors)
+    counts = np.bincount(rows, minlength=count)
+    for first in range(0, count, BLOCK_SIZE):
+        last = min(first + BLOCK_SIZE, count)
+        start, stop = np.searchsorted(rows, [first, last])
+        gram = np.zeros((last - first, factors, factors))
+        targets = np.zeros((last - first, factors))
+        for chunk_start in range(start, stop, CHUNK_SIZE):
+            chunk = slice(chunk_start, min(chunk_start + CHUNK_SIZE, stop))
+            chunk_rows = rows[chunk] - first
+            vectors = fixed[columns[chunk]]
+            # Sum the consecutive ratings of every row, a row can continue
+            # in the next chunk
+            starts = np.flatnonzero(np.diff(chunk_rows, prepend=-1))
+            summed_rows = chunk_rows[starts]
+            gram[summed_rows] += np.add.reduceat(
+                vectors[:, :, None] * vectors[:, None, :], starts
+            )
+            targets[summed_rows] += np.add.reduceat(
+                vectors * values[chunk, None], starts
+            )
+        weights = regularization * np.maximum(counts[first:last], 1)
+        gram += weights[:, None, None] * identity
+        solved[first:last] = np.linalg.solve(gram, targets[:, :, None])[
+            :, :, 0
+        ]
+    return solved
+
+
+def factorize(
+    users,
+    wines,
+    points,
+    user_count,
+    wine_count,
+    factors=DEFAULT_FACTORS,
+    iterations=DEFAULT_ITERATIONS,
+    regularization=DEFAULT_REGULARIZATION,
+    seed=0,
+):
+    """
+    Factorize the ratings into the factors of the users and the wines.
+
+    users and wines are the rows and columns of the ratings, starting at
+    zero. Return the mean points, the user and the wine factors. The points
+    of a user and a wine are predicted by the mean plus the dot product of
+    their factors.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    mean = float(points.mean()) if len(points) else 0.0
+    centered = points - mean
+    # Sort the ratings by user and by wine once
+    by_user = np.argsort(users, kind="stable")
+    by_wine = np.argsort(wines, kind="stable")
+    user_ratings = (users[by_user], wines[by_user], centered[by_user])
+    wine_ratings = (wines[by_wine], users[by_wine], centered[by_wine])
+    generator = np.random.default_rng(seed)
+    wine_factors = generator.normal(scale=0.1, size=(wine_count, factors))
+    user_factors = np.zeros((user_count, factors))
+    for __ in range(iterations):
+        user_factors = solve_factors(
+            *user_ratings, wine_factors, user_count, regularization
+        )
+        wine_factors = solve_factors(
+            *wine_ratings, user_factors, wine_count, regularization
+        )
+    return mean, user_factors, wine_factors
+
+
+def get_rmse(users, wines, points, mean, user_factors, wine_factors):
+    """Return the root mean squared error of the predicted points."""
+    predicted = mean + np.einsum(
+        "ij,ij->i", user_factors[users], wine_factors[wines]
+    )
+    return float(np.sqrt(np.mean((predicted - points) ** 2)))
+
+
+def get_block_size(columns, budget=SCORE_BUDGET):
+    """Return the number of rows whose scores of the columns fit the budget."""
+    return max(1, budget // max(columns, 1))
+
+
+def iter_top_wines(
+    users,
+    wines,
+    mean,
+    user_factors,
+    wine_factors,
+    count,
+    block_size=None,
+):
+    """
+    Yield the wines with the highest predicted points of every user.
+
+    users and wines are the rated rows and columns, sorted by user. The
+    rated wines of a user are not recommended. For every block of users, a
+    tuple of the users, the columns of their wines and the predicted points
+    is yielded, ordered by descending points. Already rated wines which
+    fill up the top columns have the points -inf.
+
+    The points are predicted in single precision. Without a block_size, the
+    blocks hold about SCORE_BUDGET points, however many wines there are.
+    """
+    count = min(count, len(wine_factors))
+    if count <= 0:
+        return
+    if block_size is None:
+        block_size = get_block_size(len(wine_factors))
+    wine_factors = wine_factors.astype(np.float32)
+    for first in range(0, len(user_factors), block_size):
+        last = min(first + block_size, len(user_factors))
+        scores = user_factors[first:last].astype(np.float32) @ wine_factors.T
+        scores += np.float32(mean)
+        start, stop = np.searchsorted(users, [first, last])
+        scores[users[start:stop] - first, wines[start:stop]] = -np.inf
+        # Select the best scores without sorting all of them
+        top = np.argpartition(scores, -count, axis=1)[:, -count:]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        yield (
+            np.arange(first, last),
+            np.take_along_axis(top, order, axis=1),
+            np.take_along_axis(top_scores, order, axis=1),
+        )
@@ -1,19 +1,36 @@
 """File for defining multiple filters for the views."""
-from django.db.models import Avg
 from django_filters import rest_framework as filters
 from wine.models import Wine
+from wine.search import search_wines
 
 
 class WineFilter(filters.FilterSet):
     """Filterset for wines.."""
 
+    # full-text search over name, description, variety and winery, the
+    # description is only searched with it
+    q = filters.CharFilter(method="filter_search")
+
+    # lookup filters by name, the wines are found with the foreign key index
+    designation = filters.CharFilter(method="filter_lookup")
+    variety = filters.CharFilter(method="filter_lookup")
+    region_1 = filters.CharFilter(method="filter_lookup")
+    region_2 = filters.CharFilter(method="filter_lookup")
+    province = filters.CharFilter(method="filter_lookup")
+    country = filters.CharFilter(method="filter_lookup")
+    winery = filters.CharFilter(method="filter_lookup")
+
     # price filters
     min_price = filters.NumberFilter(field_name="price", lookup_expr="gte")
     max_price = filters.NumberFilter(field_name="price", lookup_expr="lte")
 
-    # point_average filters
-    min_point_average = filters.NumberFilter(method="filter_min_point_average")
-    max_point_average = filters.NumberFilter(method="filter_max_point_average")
+    # point_average filters, using the stored average of the reviews
+    min_point_average = filters.NumberFilter(
+        field_name="points_avg", lookup_expr="gte"
+    )
+    max_point_average = filters.NumberFilter(
+        field_name="points_avg", lookup_expr="lte"
+    )
 
     class Meta:
         """
@@ -24,8 +41,8 @@ class WineFilter(filters.FilterSet):
 
         model = Wine
         fields = [
+            "q",
             "name",
-            "description",
             "price",
             "designation",
             "variety",
@@ -40,24 +57,13 @@ class WineFilter(filters.FilterSet):
             "max_point_average",
         ]
 
-    @staticmethod
-    def annotate_point_average(queryset):
-        """
-        Annotate the queryset for point average.
+    def filter_search(self, queryset, name, value):
+        """Filter for the full-text search, ordered by relevance."""
+        return search_wines(queryset, value)
 
-        field has the name annotation_point_average, since point_average
-        already taken by property field.
-        """
-        return queryset.annotate(
-            annotation_point_average=Avg("reviews__points")
+    def filter_lookup(self, queryset, name, value):
+        """Filter for the name of a lookup field."""
+        model = Wine._meta.get_field(name).related_model
+        return queryset.filter(
+            **{f"{name}__in": model.objects.filter(name=value).values("id")}
         )
-
-    def filter_min_point_average(self, queryset, name, value):
-        """Filter for minimum point average."""
-        queryset = self.annotate_point_average(queryset)
-        return queryset.filter(annotation_point_average__gte=value)
-
-    def filter_max_point_average(self, queryset, name, value):
-        """Filter for maximum point average."""
-        queryset = self.annotate_point_average(queryset)
-        return queryset.filter(annotation_point_average__lte=value)
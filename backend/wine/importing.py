@@ -0,0 +1,199 @@
+"""
+Streaming readers and row validation for the import of wine datasets.
+
+The readers understand the format of the public wine reviews dataset
+(winemag) as CSV, JSON array or newline delimited JSON. The validation does
+not touch the database, so it can run in worker processes.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+# Size of the blocks read from JSON files
+READ_BLOCK_SIZE = 1 << 16
+# Optional text fields of the wine with their maximum length
+TEXT_FIELDS = {
+    "description": 1000,
+    "designation": 255,
+    "variety": 255,
+    "region_1": 255,
+    "region_2": 255,
+    "province": 255,
+    "country": 255,
+    "winery": 255,
+}
+# Maximum lengths of the name of a wine and a tag
+NAME_MAX_LENGTH = 100
+TAG_MAX_LENGTH = 125
+
+
+def detect_format(path):
+    """Detect the format of the dataset from the file extension."""
+    if path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if path.endswith(".json"):
+        return "json"
+    return "csv"
+
+
+def read_csv(file):
+    """Yield the rows of a CSV file as dictionaries."""
+    yield from csv.DictReader(file)
+
+
+def read_ndjson(file):
+    """Yield the objects of a newline delimited JSON file."""
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_json_array(file):
+    """
+    Yield the objects of a JSON array without loading the whole file.
+
+    The file is read in blocks and every complete object is decoded as soon
+    as it is available.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    end_of_file = False
+    while True:
+        # Skip whitespace and the separators between the objects
+        buffer = buffer.lstrip()
+        if not started and buffer.startswith("["):
+            started = True
+            buffer = buffer[1:].lstrip()
+        if started and buffer.startswith(","):
+            buffer = buffer[1:].lstrip()
+        if started and buffer.startswith("]"):
+            return
+        if buffer and started:
+            try:
+                item, position = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # The object is incomplete, read more data
+                if end_of_file:
+                    raise
+            else:
+                buffer = buffer[position:]
+                yield item
+                continue
+        elif buffer and not started:
+            raise ValueError("The JSON file does not contain an array.")
+        if end_of_file:
+            if started:
+                raise ValueError("The JSON array is not terminated.")
+            return
+        block = file.read(READ_BLOCK_SIZE)
+        end_of_file = not block
+        buffer += block
+
+
+READERS = {
+    "csv": read_csv,
+    "json": read_json_array,
+    "ndjson": read_ndjson,
+}
+
+
+def clean_text(value, max_length):
+    """Return the stripped text or None, raise ValueError if too long."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    if len(value) > max_length:
+        raise ValueError(f"must have at most {max_length} characters")
+    return value
+
+
+def clean_number(value, minimum, maximum):
+    """Return the number as decimal or None, raise ValueError if invalid."""
+    value = clean_text(value, 32)
+    if value is None:
+        return None
+    try:
+        number = Decimal(value).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError("must be a number")
+    if not minimum <= number <= maximum:
+        raise ValueError(f"must be between {minimum} and {maximum}")
+    return number
+
+
+def clean_tags(value):
+    """Return the list of tag names of a list or a ";" separated string."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(";")
+    tags = []
+    for tag in value:
+        tag = clean_text(tag, TAG_MAX_LENGTH)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def clean_row(row):
+    """
+    Validate a row of the dataset.
+
+    Return a dictionary with the cleaned wine fields, the points of the
+    review and the tag names. ValueError is raised for invalid rows.
+    """
+    errors = {}
+    cleaned = {}
+    # The dataset calls the name of the wine title
+    try:
+        cleaned["name"] = clean_text(
+            row.get("title", row.get("name")), NAME_MAX_LENGTH
+        )
+        if not cleaned["name"]:
+            raise ValueError("is required")
+    except ValueError as error:
+        errors["name"] = str(error)
+    for field, max_length in TEXT_FIELDS.items():
+        try:
+            cleaned[field] = clean_text(row.get(field), max_length)
+        except ValueError as error:
+            errors[field] = str(error)
+    try:
+        cleaned["price"] = clean_number(row.get("price"), 1, 1000000)
+    except ValueError as error:
+        errors["price"] = str(error)
+    try:
+        cleaned["points"] = clean_number(row.get("points"), 0, 100)
+        if cleaned["points"] is not None:
+            cleaned["points"] = int(cleaned["points"])
+    except ValueError as error:
+        errors["points"] = str(error)
+    try:
+        cleaned["tags"] = clean_tags(row.get("tags"))
+    except ValueError as error:
+        errors["tags"] = str(error)
+    if errors:
+        raise ValueError(
+            ", ".join(f"{field} {error}" for field, error in errors.items())
+        )
+    return cleaned
+
+
+def clean_rows(numbered_rows):
+    """
+    Validate a chunk of numbered rows.
+
+    Return the list of the row number with either the cleaned row and None
+    or None and the error message.
+    """
+    results = []
+    for number, row in numbered_rows:
+        try:
+            results.append((number, clean_row(row), None))
+        except (AttributeError, ValueError) as error:
+            results.append((number, None, str(error)))
+    return results
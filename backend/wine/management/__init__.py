@@ -0,0 +1 @@
+"""Management module of the wine app."""
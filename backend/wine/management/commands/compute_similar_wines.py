@@ -0,0 +1,54 @@
+"""Command to compute the similar wines of the catalogue."""
+from django.core.management.base import BaseCommand
+
+from wine import similarity
+
+
+class Command(BaseCommand):
+    """Compute the nearest neighbours of the wines and store them."""
+
+    help = (
+        "Compute the most similar wines by description, variety, region and "
+        "price. By default only the wines whose features have changed "
+        "since the last run and the wines they affect are computed."
+    )
+
+    def add_arguments(self, parser):
+        """Add the arguments of the command."""
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Compute the neighbours of all wines again.",
+        )
+        parser.add_argument(
+            "--neighbours",
+            type=int,
+            default=similarity.DEFAULT_NEIGHBOURS,
+            help="Number of similar wines stored per wine.",
+        )
+        parser.add_argument(
+            "--dimensions",
+            type=int,
+            default=similarity.DEFAULT_DIMENSIONS,
+            help="Number of hashed columns of the description words.",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=similarity.DEFAULT_BLOCK_SIZE,
+            help="Number of wines whose neighbours are computed at once.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        computed = similarity.compute_similar_wines(
+            only_stale=not options["all"],
+            neighbours=options["neighbours"],
+            dimensions=options["dimensions"],
+            block_size=options["block_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Computed the similar wines of {computed} wines."
+            )
+        )
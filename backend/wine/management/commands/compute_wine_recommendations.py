@@ -0,0 +1,54 @@
+"""Command to compute the wine recommendations of the users."""
+from django.core.management.base import BaseCommand
+
+from wine import factorization, recommendations
+
+
+class Command(BaseCommand):
+    """Factorize the review points and store the recommendations."""
+
+    help = (
+        "Factorize the points of all reviews with alternating least squares "
+        "and store the wines with the highest predicted points per user."
+    )
+
+    def add_arguments(self, parser):
+        """Add the arguments of the command."""
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=recommendations.DEFAULT_RECOMMENDATIONS,
+            help="Number of recommendations stored per user.",
+        )
+        parser.add_argument(
+            "--factors",
+            type=int,
+            default=factorization.DEFAULT_FACTORS,
+            help="Number of latent factors of users and wines.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=factorization.DEFAULT_ITERATIONS,
+            help="Number of alternating least squares iterations.",
+        )
+        parser.add_argument(
+            "--regularization",
+            type=float,
+            default=factorization.DEFAULT_REGULARIZATION,
+            help="Weight of the squared factors per review.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        users = recommendations.compute_recommendations(
+            count=options["count"],
+            factors=options["factors"],
+            iterations=options["iterations"],
+            regularization=options["regularization"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Computed the recommendations of {users} users."
+            )
+        )
@@ -0,0 +1,283 @@
+"""Command to import wines from winemag-style CSV or JSON datasets."""
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from wine import search
+from wine.cache import bump_catalogue_version
+from wine.importing import READERS, clean_rows, detect_format
+from wine.models import Review, Tag, Wine
+from wine.rankings import add_to_totals, refresh_rankings
+from wine.ratings import rating_average
+from wine.tag_counts import recount_tags
+
+
+def iter_chunks(iterable, size):
+    """Yield lists of at most size items of the iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_validated_chunks(chunks, workers):
+    """
+    Validate the chunks of numbered rows and yield them in order.
+
+    With workers the chunks are validated in a process pool. Only a few
+    chunks per worker are in flight, so the file is still streamed.
+    """
+    if not workers:
+        for chunk in chunks:
+            yield clean_rows(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(clean_rows, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class Command(BaseCommand):
+    """Import wines, reviews and tags from a dataset file."""
+
+    help = (
+        "Stream a winemag-style CSV, JSON or NDJSON file into the database. "
+        "Rows are validated in a process pool and inserted in chunks. "
+        "An interrupted import continues from its checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        """Add the arguments of the command."""
+        parser.add_argument("path", help="Path of the dataset file.")
+        parser.add_argument(
+            "--user",
+            required=True,
+            help="Email of the user who owns the imported data.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="Format of the file, detected from the extension if unset.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows inserted per transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of validation processes, 0 validates in-process.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Path of the checkpoint file, defaults to PATH.checkpoint.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and start from the first row.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        self.verbosity = options["verbosity"]
+        path = options["path"]
+        file_format = options["format"] or detect_format(path)
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+        try:
+            self.user = get_user_model().objects.get(email=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist.")
+        # Continue after the rows of a previous run
+        skip = 0
+        if not options["restart"]:
+            skip = self.read_checkpoint(checkpoint_path, path)
+        if skip:
+            self.stdout.write(f"Continuing after row {skip}.")
+
+        self.counts = dict.fromkeys(
+            ["rows", "wines", "reviews", "tags", "duplicates", "invalid"], 0
+        )
+        started_at = time.monotonic()
+        with open(path, newline="", encoding="utf-8") as file:
+            rows = enumerate(READERS[file_format](file), start=1)
+            rows = itertools.islice(rows, skip, None)
+            chunks = iter_chunks(rows, options["chunk_size"])
+            for results in iter_validated_chunks(chunks, options["workers"]):
+                self.import_chunk(results)
+                # Store the progress after the chunk has been committed
+                last_row = results[-1][0]
+                self.write_checkpoint(checkpoint_path, path, last_row)
+                self.counts["rows"] += len(results)
+                self.report_progress(started_at, last_row)
+        if os.path.exists(checkpoint_path):
+            # The import is complete
+            os.remove(checkpoint_path)
+        bump_catalogue_version()
+
+        duration = time.monotonic() - started_at
+        rate = self.counts["rows"] / duration if duration else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Imported {wines} wines, {reviews} reviews and {tags} tags "
+                "from {rows} rows ({duplicates} duplicates, {invalid} "
+                "invalid) ".format(**self.counts)
+                + f"in {duration:.1f}s, {rate:.0f} rows/s."
+            )
+        )
+
+    def report_progress(self, started_at, last_row):
+        """Report the progress of the import."""
+        if self.verbosity < 2:
+            return
+        duration = time.monotonic() - started_at
+        rate = self.counts["rows"] / duration if duration else 0
+        self.stdout.write(f"Row {last_row}: {rate:.0f} rows/s")
+
+    @staticmethod
+    def read_checkpoint(checkpoint_path, path):
+        """Return the number of rows imported by a previous run."""
+        if not os.path.exists(checkpoint_path):
+            return 0
+        with open(checkpoint_path, encoding="utf-8") as file:
+            checkpoint = json.load(file)
+        if checkpoint["path"] != os.path.abspath(path):
+            raise CommandError(
+                f"The checkpoint {checkpoint_path} belongs to "
+                f"{checkpoint['path']}, use --restart to ignore it."
+            )
+        return checkpoint["rows"]
+
+    @staticmethod
+    def write_checkpoint(checkpoint_path, path, rows):
+        """Store the number of imported rows atomically."""
+        temporary_path = f"{checkpoint_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump({"path": os.path.abspath(path), "rows": rows}, file)
+        os.replace(temporary_path, checkpoint_path)
+
+    def import_chunk(self, results):
+        """Insert the valid rows of a chunk in one transaction."""
+        rows = []
+        for number, row, error in results:
+            if error:
+                self.counts["invalid"] += 1
+                if self.verbosity >= 2:
+                    self.stderr.write(f"Row {number}: {error}")
+            else:
+                rows.append(row)
+        # Skip duplicate names within the chunk and in the database
+        names = {row["name"] for row in rows}
+        existing = set(
+            Wine.objects.filter(name__in=names).values_list("name", flat=True)
+        )
+        unique_rows = {}
+        for row in rows:
+            if row["name"] in existing or row["name"] in unique_rows:
+                self.counts["duplicates"] += 1
+            else:
+                unique_rows[row["name"]] = row
+        if not unique_rows:
+            return
+
+        with transaction.atomic():
+            wines = self.create_wines(unique_rows.values())
+            self.create_reviews(wines, unique_rows)
+            self.create_tags(wines, unique_rows)
+            search.index_wines(wines)
+            # Rank the wines with the review of the dataset
+            add_to_totals(
+                sum(wine.review_count for wine in wines),
+                sum(wine.points_sum for wine in wines),
+            )
+            refresh_rankings([wine.id for wine in wines if wine.review_count])
+
+    def create_wines(self, rows):
+        """Insert the wines of the rows and return them with their ids."""
+        rows = list(rows)
+        # Resolve the lookup names of the chunk at once
+        lookup_ids = Wine.get_lookup_ids(rows)
+        wines = []
+        for row in rows:
+            points = row["points"]
+            wine = Wine(
+                user=self.user,
+                name=row["name"],
+                price=row["price"],
+                description=row["description"],
+                **{
+                    f"{field}_id": lookup_ids[field].get(row[field])
+                    for field in Wine.LOOKUP_FIELDS
+                },
+            )
+            if points is not None:
+                # The review of the dataset is the only one of the wine
+                wine.review_count = 1
+                wine.points_sum = points
+                wine.points_avg = rating_average(points, 1)
+            wines.append(wine)
+        Wine.bulk_insert(wines)
+        self.counts["wines"] += len(wines)
+        return wines
+
+    def create_reviews(self, wines, rows):
+        """Insert the reviews with the points of the rows."""
+        reviews = [
+            Review(wine=wine, user=self.user, points=rows[wine.name]["points"])
+            for wine in wines
+            if rows[wine.name]["points"] is not None
+        ]
+        Review.objects.bulk_create(reviews)
+        self.counts["reviews"] += len(reviews)
+
+    def create_tags(self, wines, rows):
+        """Create the missing tags and link them to the wines."""
+        names = {name for row in rows.values() for name in row["tags"]}
+        if not names:
+            return
+        # Reuse the tags of the user
+        tags = dict(
+            Tag.objects.filter(user=self.user, name__in=names).values_list(
+                "name", "id"
+            )
+        )
+        missing = [
+            Tag(user=self.user, name=name)
+            for name in sorted(names)
+            if name not in tags
+        ]
+        Tag.objects.bulk_create(missing)
+        self.counts["tags"] += len(missing)
+        if missing:
+            tags = dict(
+                Tag.objects.filter(user=self.user, name__in=names).values_list(
+                    "name", "id"
+                )
+            )
+        # Link the tags with the through table
+        through = Wine.tags.through
+        through.objects.bulk_create(
+            [
+                through(wine_id=wine.id, tag_id=tags[name])
+                for wine in wines
+                for name in rows[wine.name]["tags"]
+            ]
+        )
+        # Bulk inserts do not send signals, count the wines of the tags
+        recount_tags(tags.values())
@@ -0,0 +1,33 @@
+"""Command to rebuild the rankings of the top wines."""
+from django.core.management.base import BaseCommand
+
+from wine.rankings import get_prior, rebuild_rankings
+
+
+class Command(BaseCommand):
+    """Rebuild the Bayesian scores of all reviewed wines."""
+
+    help = (
+        "Recalculate the prior points from the catalogue and the Bayesian "
+        "scores of all reviewed wines."
+    )
+
+    def add_arguments(self, parser):
+        """Add the arguments of the command."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of wines which are ranked per query.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        ranked = rebuild_rankings(batch_size=options["batch_size"])
+        prior_points, prior_count = get_prior()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ranked {ranked} wines with {prior_points:.2f} points of "
+                f"{prior_count} prior reviews."
+            )
+        )
@@ -0,0 +1,40 @@
+"""Command to rebuild the denormalized rating aggregates of wines."""
+from django.core.management.base import BaseCommand
+
+from wine.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    """Rebuild the rating aggregates of all wines and report the drift."""
+
+    help = (
+        "Recalculate review_count, points_sum and points_avg of all wines "
+        "from the reviews and report the wines which had drifted."
+    )
+
+    def add_arguments(self, parser):
+        """Add the arguments of the command."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of wines which are checked per query.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the drift, without fixing it.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        checked, drifted = rebuild_rating_aggregates(
+            batch_size=options["batch_size"], fix=not options["dry_run"]
+        )
+        # Report the result
+        action = "found" if options["dry_run"] else "fixed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {checked} wines, {action} {drifted} drifted."
+            )
+        )
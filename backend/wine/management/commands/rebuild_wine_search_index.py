@@ -0,0 +1,17 @@
+"""Command to rebuild the full-text search index of wines."""
+from django.core.management.base import BaseCommand, CommandError
+
+from wine import search
+
+
+class Command(BaseCommand):
+    """Rebuild the full-text search index of all wines from scratch."""
+
+    help = "Rebuild the FTS5 search index of the wines from scratch."
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        if not search.is_supported():
+            raise CommandError("The search index is only supported on SQLite.")
+        indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} wines."))
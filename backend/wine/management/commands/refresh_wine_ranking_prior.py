@@ -0,0 +1,36 @@
+"""Command to rescore the rankings once the catalogue average has moved."""
+from django.core.management.base import BaseCommand
+
+from wine.rankings import PRIOR_TOLERANCE, refresh_prior
+
+
+class Command(BaseCommand):
+    """Rescore the rankings with the current average of the catalogue."""
+
+    help = (
+        "Recompute the Bayesian scores of all reviewed wines if the average "
+        "points of the catalogue have moved away from their prior. Meant to "
+        "be run periodically."
+    )
+
+    def add_arguments(self, parser):
+        """Add the arguments of the command."""
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=PRIOR_TOLERANCE,
+            help="Change of the average points which rescores the wines.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        (prior_points, prior_count), rescored = refresh_prior(
+            tolerance=options["tolerance"]
+        )
+        action = "Rescored" if rescored else "Kept"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} the rankings with {prior_points:.2f} points of "
+                f"{prior_count} prior reviews."
+            )
+        )
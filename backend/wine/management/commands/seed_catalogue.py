@@ -0,0 +1,64 @@
+"""Command to generate a synthetic wine catalogue."""
+from django.core.management.base import BaseCommand, CommandError
+
+from wine.seeding import SCALES, seed_catalogue
+
+
+class Command(BaseCommand):
+    """Generate wines, users, libraries, tags and reviews."""
+
+    help = (
+        "Insert a synthetic catalogue of realistic wines with their users, "
+        "libraries, tags and reviews, i.e. for benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        """Add the arguments of the command."""
+        parser.add_argument(
+            "--scale",
+            choices=sorted(SCALES),
+            default="10k",
+            help="Number of wines of the catalogue.",
+        )
+        parser.add_argument(
+            "--wines",
+            type=int,
+            help="Number of wines, overrides the scale.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the random generator.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of wines inserted per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command."""
+        wines = options["wines"] or SCALES[options["scale"]]
+        if wines < 1:
+            raise CommandError("At least one wine is required.")
+        self.wines = wines
+        counts = seed_catalogue(
+            wines,
+            seed=options["seed"],
+            chunk_size=options["chunk_size"],
+            progress=(
+                self.report_progress if options["verbosity"] >= 2 else None
+            ),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Created {wines} wines, {reviews} reviews, {users} users, "
+                "{tags} tags and {libraries} libraries.".format(**counts)
+            )
+        )
+
+    def report_progress(self, count):
+        """Report the number of inserted wines."""
+        self.stdout.write(f"{count} of {self.wines} wines")
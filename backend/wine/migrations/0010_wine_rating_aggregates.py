@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:24
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    """Calculate the rating aggregates of the existing wines."""
+    Wine = apps.get_model("wine", "Wine")
+    Review = apps.get_model("wine", "Review")
+    rows = (
+        Review.objects.values("wine_id")
+        .annotate(review_count=Count("id"), points_sum=Sum("points"))
+        .values_list("wine_id", "review_count", "points_sum")
+        .order_by()
+    )
+    wines = [
+        Wine(
+            id=wine_id,
+            review_count=count,
+            points_sum=points,
+            points_avg=(Decimal(points) / Decimal(count)).quantize(
+                Decimal("0.01")
+            ),
+        )
+        for wine_id, count, points in rows
+    ]
+    Wine.objects.bulk_update(
+        wines, ["review_count", "points_sum", "points_avg"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wine', '0009_alter_library_id_alter_review_id_alter_tag_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wine',
+            name='points_avg',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='wine',
+            name='points_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wine',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='wine',
+            index=models.Index(fields=['points_avg'], name='wine_wine_points__f89943_idx'),
+        ),
+        migrations.RunPython(
+            populate_rating_aggregates, migrations.RunPython.noop
+        ),
+    ]
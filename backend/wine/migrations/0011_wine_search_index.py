@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Fields of the wine which are indexed
+INDEXED_FIELDS = ("name", "description", "variety", "winery")
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 index of the wines on SQLite."""
+    if schema_editor.connection.vendor != "sqlite":
+        # The index is only supported on SQLite
+        return
+    columns = ", ".join(INDEXED_FIELDS)
+    values = ", ".join(f"COALESCE({field}, '')" for field in INDEXED_FIELDS)
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS wine_wine_fts USING fts5("
+        f"{columns}, tokenize='unicode61 remove_diacritics 2', "
+        f"prefix='2 3')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO wine_wine_fts (rowid, {columns}) "
+        f"SELECT id, {values} FROM wine_wine"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the FTS5 index of the wines."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS wine_wine_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0010_wine_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0011_wine_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="library",
+            index=models.Index(
+                fields=["user", "created_at"], name="wine_librar_user_id_99e38a_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="library",
+            index=models.Index(
+                fields=["public", "created_at"], name="wine_librar_public_9d8dce_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="library",
+            index=models.Index(fields=["name"], name="wine_librar_name_546716_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(fields=["name"], name="wine_tag_name_ffe5a5_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(fields=["price"], name="wine_wine_price_46c32d_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["country", "province"], name="wine_wine_country_d4743e_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["province"], name="wine_wine_provinc_92873e_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["region_1"], name="wine_wine_region__1232b2_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["region_2"], name="wine_wine_region__09aaa7_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["variety", "price"], name="wine_wine_variety_4443ba_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(fields=["winery"], name="wine_wine_winery_fb631e_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["designation"], name="wine_wine_designa_375137_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["created_at", "id"], name="wine_wine_created_969eef_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["updated_at", "id"], name="wine_wine_updated_9023d2_idx"
+            ),
+        ),
+    ]
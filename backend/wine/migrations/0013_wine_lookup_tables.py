@@ -0,0 +1,195 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Lookup fields of the wine with the name of their lookup model
+LOOKUP_FIELDS = {
+    "designation": "Designation",
+    "variety": "Variety",
+    "region_1": "Region",
+    "region_2": "Region",
+    "province": "Province",
+    "country": "Country",
+    "winery": "Winery",
+}
+# Related names of the lookup fields
+RELATED_NAMES = {
+    "region_1": "wines_region_1",
+    "region_2": "wines_region_2",
+}
+# Number of wines converted per query
+BATCH_SIZE = 1000
+
+
+def encode_lookup_fields(apps, schema_editor):
+    """
+    Move the text values of the wines into the lookup tables.
+
+    The wines are converted in batches of primary keys, so the memory usage
+    does not depend on the number of wines.
+    """
+    Wine = apps.get_model("wine", "Wine")
+    # Create the lookup rows of all distinct names
+    ids = {}
+    for field, model_name in LOOKUP_FIELDS.items():
+        model = apps.get_model("wine", model_name)
+        names = set(
+            Wine.objects.exclude(**{f"{field}__isnull": True})
+            .exclude(**{field: ""})
+            .values_list(field, flat=True)
+            .distinct()
+        )
+        model.objects.bulk_create(
+            [model(name=name) for name in names],
+            ignore_conflicts=True,
+            batch_size=BATCH_SIZE,
+        )
+        ids[field] = dict(model.objects.values_list("name", "id"))
+    # Set the foreign keys of the wines
+    last_id = 0
+    while True:
+        wines = list(
+            Wine.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .only("id", *LOOKUP_FIELDS)[:BATCH_SIZE]
+        )
+        if not wines:
+            break
+        last_id = wines[-1].id
+        for wine in wines:
+            for field in LOOKUP_FIELDS:
+                setattr(
+                    wine,
+                    f"{field}_ref_id",
+                    ids[field].get(getattr(wine, field)),
+                )
+        Wine.objects.bulk_update(
+            wines, [f"{field}_ref" for field in LOOKUP_FIELDS]
+        )
+
+
+def decode_lookup_fields(apps, schema_editor):
+    """Copy the names of the lookup tables back into the wines."""
+    Wine = apps.get_model("wine", "Wine")
+    last_id = 0
+    while True:
+        wines = list(
+            Wine.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .select_related(*[f"{field}_ref" for field in LOOKUP_FIELDS])[
+                :BATCH_SIZE
+            ]
+        )
+        if not wines:
+            break
+        last_id = wines[-1].id
+        for wine in wines:
+            for field in LOOKUP_FIELDS:
+                reference = getattr(wine, f"{field}_ref")
+                setattr(wine, field, reference.name if reference else None)
+        Wine.objects.bulk_update(wines, list(LOOKUP_FIELDS))
+
+
+def create_lookup_model(name, **options):
+    """Return the operation creating a lookup model."""
+    return migrations.CreateModel(
+        name=name,
+        fields=[
+            (
+                "id",
+                models.BigAutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name="ID",
+                ),
+            ),
+            ("name", models.CharField(max_length=255, unique=True)),
+        ],
+        options={"abstract": False, **options},
+    )
+
+
+def add_reference_field(field, model_name, related_name):
+    """Return the operation adding the temporary foreign key of a field."""
+    return migrations.AddField(
+        model_name="wine",
+        name=f"{field}_ref",
+        field=models.ForeignKey(
+            blank=True,
+            null=True,
+            on_delete=django.db.models.deletion.PROTECT,
+            related_name=related_name,
+            to=f"wine.{model_name.lower()}",
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0012_filter_indexes"),
+    ]
+
+    operations = [
+        create_lookup_model("Country", verbose_name_plural="countries"),
+        create_lookup_model("Designation"),
+        create_lookup_model("Province"),
+        create_lookup_model("Region"),
+        create_lookup_model("Variety", verbose_name_plural="varieties"),
+        create_lookup_model("Winery", verbose_name_plural="wineries"),
+        # Add the foreign keys next to the text fields
+        *[
+            add_reference_field(
+                field, model_name, RELATED_NAMES.get(field, "wines")
+            )
+            for field, model_name in LOOKUP_FIELDS.items()
+        ],
+        migrations.RunPython(encode_lookup_fields, decode_lookup_fields),
+        # Remove the indexes and the text fields
+        migrations.RemoveIndex(
+            model_name="wine", name="wine_wine_country_d4743e_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="wine", name="wine_wine_provinc_92873e_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="wine", name="wine_wine_region__1232b2_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="wine", name="wine_wine_region__09aaa7_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="wine", name="wine_wine_variety_4443ba_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="wine", name="wine_wine_winery_fb631e_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="wine", name="wine_wine_designa_375137_idx"
+        ),
+        *[
+            migrations.RemoveField(model_name="wine", name=field)
+            for field in LOOKUP_FIELDS
+        ],
+        # Give the foreign keys the names of the text fields
+        *[
+            migrations.RenameField(
+                model_name="wine", old_name=f"{field}_ref", new_name=field
+            )
+            for field in LOOKUP_FIELDS
+        ],
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["country", "province"],
+                name="wine_wine_country_e22005_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(
+                fields=["variety", "price"],
+                name="wine_wine_variety_879852_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_wine_counts(apps, schema_editor):
+    """Count the wines of the existing tags with one query."""
+    Tag = apps.get_model("wine", "Tag")
+    Wine = apps.get_model("wine", "Wine")
+    through = Wine.tags.through
+    Tag.objects.update(
+        wine_count=Coalesce(
+            Subquery(
+                through.objects.filter(tag_id=OuterRef("pk"))
+                .order_by()
+                .values("tag_id")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0013_wine_lookup_tables"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tag",
+            name="wine_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(
+                fields=["wine_count", "id"], name="wine_tag_wine_co_8ed020_idx"
+            ),
+        ),
+        migrations.RunPython(populate_wine_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0014_tag_wine_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarWine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="wine.wine",
+                    ),
+                ),
+                (
+                    "wine",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_wines",
+                        to="wine.wine",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="similarwine",
+            constraint=models.UniqueConstraint(
+                fields=("wine", "rank"), name="wine_similar_wine_rank"
+            ),
+        ),
+    ]
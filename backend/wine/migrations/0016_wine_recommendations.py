@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("wine", "0015_similar_wines"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WineRecommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="wine_recommendations",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "wine",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="wine.wine",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["computed_at"], name="wine_winere_compute_b7b822_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="winerecommendation",
+            constraint=models.UniqueConstraint(
+                fields=("user", "rank"), name="wine_recommendation_rank"
+            ),
+        ),
+    ]
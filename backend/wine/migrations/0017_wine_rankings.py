@@ -0,0 +1,147 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+# Price buckets of wine.facets as lower and upper bound
+PRICE_BUCKETS = ((None, 10), (10, 20), (20, 50), (50, 100), (100, None))
+# Number of wines ranked per query
+BATCH_SIZE = 1000
+
+
+def get_price_band(price):
+    """Return the index of the price bucket of the price, or None."""
+    if price is None:
+        return None
+    for index, (lower, upper) in enumerate(PRICE_BUCKETS):
+        if (lower is None or price >= lower) and (
+            upper is None or price < upper
+        ):
+            return index
+    return None
+
+
+def populate_rankings(apps, schema_editor):
+    """Rank the reviewed wines with the average points as prior."""
+    Wine = apps.get_model("wine", "Wine")
+    WineRanking = apps.get_model("wine", "WineRanking")
+    prior_count = settings.WINE_RANKING_PRIOR_COUNT
+    prior_points = settings.WINE_RANKING_PRIOR_POINTS
+    if prior_points is None:
+        totals = Wine.objects.aggregate(
+            review_count=Sum("review_count"), points_sum=Sum("points_sum")
+        )
+        if not totals["review_count"]:
+            return
+        prior_points = totals["points_sum"] / totals["review_count"]
+    prior_points = float(prior_points)
+    last_id = 0
+    while True:
+        wines = list(
+            Wine.objects.filter(pk__gt=last_id, review_count__gt=0)
+            .order_by("pk")
+            .values_list(
+                "id",
+                "review_count",
+                "points_sum",
+                "country_id",
+                "variety_id",
+                "price",
+            )[:BATCH_SIZE]
+        )
+        if not wines:
+            break
+        last_id = wines[-1][0]
+        WineRanking.objects.bulk_create(
+            [
+                WineRanking(
+                    wine_id=wine_id,
+                    score=(prior_count * prior_points + points_sum)
+                    / (prior_count + review_count),
+                    country_id=country_id,
+                    variety_id=variety_id,
+                    price_band=get_price_band(price),
+                )
+                for (
+                    wine_id,
+                    review_count,
+                    points_sum,
+                    country_id,
+                    variety_id,
+                    price,
+                ) in wines
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0016_wine_recommendations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WineRanking",
+            fields=[
+                (
+                    "wine",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ranking",
+                        serialize=False,
+                        to="wine.wine",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                (
+                    "price_band",
+                    models.PositiveSmallIntegerField(blank=True, null=True),
+                ),
+                (
+                    "country",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="wine.country",
+                    ),
+                ),
+                (
+                    "variety",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="wine.variety",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["score", "wine"],
+                        name="wine_winera_score_64bcde_idx",
+                    ),
+                    models.Index(
+                        fields=["country", "score", "wine"],
+                        name="wine_winera_country_1ee902_idx",
+                    ),
+                    models.Index(
+                        fields=["variety", "score", "wine"],
+                        name="wine_winera_variety_e502a4_idx",
+                    ),
+                    models.Index(
+                        fields=["price_band", "score", "wine"],
+                        name="wine_winera_price_b_bd73d6_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:57
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_updated_at(apps, schema_editor):
+    """Assume that the features have changed with the last update."""
+    Wine = apps.get_model("wine", "Wine")
+    Wine.objects.update(features_updated_at=F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0017_wine_rankings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wine",
+            name="features_updated_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:21
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def count_totals(apps, schema_editor):
+    """Count the totals of the reviews of all wines."""
+    Wine = apps.get_model("wine", "Wine")
+    RankingTotals = apps.get_model("wine", "RankingTotals")
+    totals = Wine.objects.aggregate(
+        review_count=Sum("review_count"), points_sum=Sum("points_sum")
+    )
+    review_count = totals["review_count"] or 0
+    points_sum = totals["points_sum"] or 0
+    RankingTotals.objects.create(
+        pk=1,
+        review_count=review_count,
+        points_sum=points_sum,
+        # The stored scores have been computed with the current average
+        prior_points=points_sum / review_count if review_count else None,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0018_wine_features_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RankingTotals",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("review_count", models.BigIntegerField(default=0)),
+                ("points_sum", models.BigIntegerField(default=0)),
+                ("prior_points", models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "ranking totals",
+            },
+        ),
+        migrations.RunPython(count_totals, migrations.RunPython.noop),
+    ]
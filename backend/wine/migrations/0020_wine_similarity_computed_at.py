@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:29
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def copy_computed_at(apps, schema_editor):
+    """Take the time of the stored similar wines of every wine."""
+    Wine = apps.get_model("wine", "Wine")
+    SimilarWine = apps.get_model("wine", "SimilarWine")
+    Wine.objects.update(
+        similarity_computed_at=Subquery(
+            SimilarWine.objects.filter(wine_id=OuterRef("pk"))
+            .values("wine_id")
+            .annotate(computed_at=Max("computed_at"))
+            .values("computed_at")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wine", "0019_ranking_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wine",
+            name="similarity_computed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_computed_at, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,10 @@
 """Models for wine app."""
 from django.core import validators
-from django.db import models
+from django.db import connection, models, transaction
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 
-from django.db.models import Avg
-
 
 class BaseModelWineAppModel(models.Model):
     """
@@ -31,6 +30,18 @@ class BaseModelWineAppModel(models.Model):
 
         abstract = True
 
+    @classmethod
+    def touch(cls, ids):
+        """
+        Set the update time of the objects with the given ids to now.
+
+        It is used if the representation of the objects changes without
+        saving them, i.e. when related objects are added or removed.
+        """
+        ids = set(ids)
+        if ids:
+            cls.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+
 
 class Library(BaseModelWineAppModel):
     """Model for Wine Library to collect multiple wines."""
@@ -39,6 +50,31 @@ class Library(BaseModelWineAppModel):
     description = models.CharField(max_length=1000, null=True)
     public = models.BooleanField(default=False)
 
+    class Meta:
+        """
+        Meta Data.
+
+        Index the visibility of the libraries and their pagination order.
+        """
+
+        indexes = [
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["public", "created_at"]),
+            models.Index(fields=["name"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Load the instance from the database.
+
+        The loaded visibility is remembered, so the cached public libraries
+        are only invalidated if a public library changes.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_public = instance.__dict__.get("public")
+        return instance
+
     def __str__(self):
         """Represent as string."""
         return self.name
@@ -50,6 +86,33 @@ class Tag(BaseModelWineAppModel):
     """
 
     name = models.CharField(max_length=125)
+    # Denormalized number of wines, maintained by wine.tag_counts
+    wine_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """
+        Meta Data.
+
+        Index the name for filtering and the default ordering, and the
+        number of wines for the popular tags.
+        """
+
+        indexes = [
+            models.Index(fields=["name"]),
+            models.Index(fields=["wine_count", "id"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Load the instance from the database.
+
+        The loaded name is remembered, so a renamed tag can be replaced in
+        the autocomplete index.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_name = instance.__dict__.get("name")
+        return instance
 
     def __str__(self):
         """Represent as string."""
@@ -71,6 +134,21 @@ class Review(BaseModelWineAppModel):
     )
     comment = models.CharField(max_length=1000, null=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Load the instance from the database.
+
+        The loaded wine and points are remembered, so the rating aggregates
+        of the wine can be updated incrementally when the review changes.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_rating = (
+            instance.__dict__.get("wine_id"),
+            instance.__dict__.get("points"),
+        )
+        return instance
+
     def __str__(self):
         """Represent string."""
         if self.comment:
@@ -82,9 +160,125 @@ class Review(BaseModelWineAppModel):
         )
 
 
+class LookupModel(models.Model):
+    """
+    Abstract lookup table for the repeated text attributes of wines.
+
+    Every distinct name is stored once, wines refer to it with an integer
+    foreign key.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        """Meta data.
+
+        Defines that this model is abstract and just used as a template at
+        other models.
+        """
+
+        abstract = True
+
+    def __str__(self):
+        """Represent as string."""
+        return self.name
+
+    @classmethod
+    def get_ids(cls, names):
+        """
+        Return a dictionary of the given names and their ids.
+
+        Missing names are created with one bulk insert. The bulk insert
+        sends no signals, so the names are added to the autocomplete index
+        after the transaction has been committed.
+        """
+        # pylint: disable=import-outside-toplevel
+        from wine import autocomplete
+
+        names = set(names)
+        ids = dict(
+            cls.objects.filter(name__in=names).values_list("name", "id")
+        )
+        missing = names - set(ids)
+        if missing:
+            # Concurrent imports may have created the names meanwhile
+            cls.objects.bulk_create(
+                [cls(name=name) for name in missing], ignore_conflicts=True
+            )
+            ids.update(
+                cls.objects.filter(name__in=missing).values_list("name", "id")
+            )
+            kind = autocomplete.get_kind(cls)
+            if kind:
+                transaction.on_commit(
+                    lambda: autocomplete.index.add_names(kind, missing)
+                )
+        return ids
+
+
+class Country(LookupModel):
+    """Country of a wine."""
+
+    class Meta(LookupModel.Meta):
+        """Meta data."""
+
+        verbose_name_plural = "countries"
+
+
+class Province(LookupModel):
+    """Province of a wine."""
+
+
+class Region(LookupModel):
+    """Region of a wine, used for region_1 and region_2."""
+
+
+class Variety(LookupModel):
+    """Grape variety of a wine."""
+
+    class Meta(LookupModel.Meta):
+        """Meta data."""
+
+        verbose_name_plural = "varieties"
+
+
+class Winery(LookupModel):
+    """Winery which produced a wine."""
+
+    class Meta(LookupModel.Meta):
+        """Meta data."""
+
+        verbose_name_plural = "wineries"
+
+
+class Designation(LookupModel):
+    """Designation of a wine, i.e. the vineyard."""
+
+
 class Wine(BaseModelWineAppModel):
     """Model for Wine."""
 
+    # Fields which refer to a lookup table by name
+    LOOKUP_FIELDS = (
+        "designation",
+        "variety",
+        "region_1",
+        "region_2",
+        "province",
+        "country",
+        "winery",
+    )
+    # Fields the features of wine.similarity are built from
+    FEATURE_FIELDS = (
+        "description",
+        "price",
+        "variety_id",
+        "region_1_id",
+        "region_2_id",
+        "province_id",
+        "country_id",
+    )
+
     libraries = models.ManyToManyField("Library", related_name="wines")
     tags = models.ManyToManyField("Tag", related_name="wines")
 
@@ -100,23 +294,336 @@ class Wine(BaseModelWineAppModel):
         null=True,
         blank=True,
     )
-    designation = models.CharField(max_length=255, null=True, blank=True)
-    variety = models.CharField(max_length=255, null=True, blank=True)
-    region_1 = models.CharField(max_length=255, null=True, blank=True)
-    region_2 = models.CharField(max_length=255, null=True, blank=True)
-    province = models.CharField(max_length=255, null=True, blank=True)
-    country = models.CharField(max_length=255, null=True, blank=True)
-    winery = models.CharField(max_length=255, null=True, blank=True)
+    designation = models.ForeignKey(
+        "Designation",
+        on_delete=models.PROTECT,
+        related_name="wines",
+        null=True,
+        blank=True,
+    )
+    variety = models.ForeignKey(
+        "Variety",
+        on_delete=models.PROTECT,
+        related_name="wines",
+        null=True,
+        blank=True,
+    )
+    region_1 = models.ForeignKey(
+        "Region",
+        on_delete=models.PROTECT,
+        related_name="wines_region_1",
+        null=True,
+        blank=True,
+    )
+    region_2 = models.ForeignKey(
+        "Region",
+        on_delete=models.PROTECT,
+        related_name="wines_region_2",
+        null=True,
+        blank=True,
+    )
+    province = models.ForeignKey(
+        "Province",
+        on_delete=models.PROTECT,
+        related_name="wines",
+        null=True,
+        blank=True,
+    )
+    country = models.ForeignKey(
+        "Country",
+        on_delete=models.PROTECT,
+        related_name="wines",
+        null=True,
+        blank=True,
+    )
+    winery = models.ForeignKey(
+        "Winery",
+        on_delete=models.PROTECT,
+        related_name="wines",
+        null=True,
+        blank=True,
+    )
+
+    # Denormalized rating aggregates, maintained by wine.ratings
+    review_count = models.PositiveIntegerField(default=0)
+    points_sum = models.PositiveIntegerField(default=0)
+    points_avg = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True, blank=True
+    )
+    # Time the feature fields have been changed, other than updated_at it
+    # is not touched by reviews, tags or libraries
+    features_updated_at = models.DateTimeField(default=timezone.now)
+    # Time the similar wines have been computed, maintained by
+    # wine.similarity, also for wines without any similar wine
+    similarity_computed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """
+        Meta Data.
+
+        Index the stored point average for range filtering, the fields of
+        the wine filter and the pagination orders. The lookup fields are
+        indexed as foreign keys.
+        """
+
+        indexes = [
+            models.Index(fields=["points_avg"]),
+            models.Index(fields=["price"]),
+            models.Index(fields=["country", "province"]),
+            models.Index(fields=["variety", "price"]),
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["updated_at", "id"]),
+        ]
 
     @property
     def point_average(self) -> Decimal:
         """Return average of points."""
-        if self.reviews.exists():
-            return Decimal(
-                self.reviews.aggregate(average=Avg("points"))["average"]
+        if self.points_avg is None:
+            # The wine has no reviews
+            return Decimal("0")
+        return self.points_avg
+
+    @classmethod
+    def get_lookup_ids(cls, items):
+        """
+        Return the ids of the lookup names of the items by field and name.
+
+        items are dictionaries of the lookup fields and their names. The
+        names of all items are resolved with at most two queries per lookup
+        table, missing names are created.
+        """
+        names = {}
+        for field in cls.LOOKUP_FIELDS:
+            model = cls._meta.get_field(field).related_model
+            names.setdefault(model, set()).update(
+                item[field] for item in items if item.get(field)
             )
-        return Decimal("0")
+        ids = {model: model.get_ids(values) for model, values in names.items()}
+        return {
+            field: ids[cls._meta.get_field(field).related_model]
+            for field in cls.LOOKUP_FIELDS
+        }
+
+    @classmethod
+    def bulk_insert(cls, wines, chunk_size=500):
+        """
+        Insert the wines in bulk and set their ids.
+
+        Backends which do not return the ids of inserted rows find the wines
+        by their unique names, in chunks which stay below the limit of SQL
+        variables of older SQLite builds.
+        """
+        cls.objects.bulk_create(wines)
+        if connection.features.can_return_rows_from_bulk_insert:
+            return wines
+        for start in range(0, len(wines), chunk_size):
+            stop = start + chunk_size
+            chunk = wines[start:stop]
+            ids = dict(
+                cls.objects.filter(
+                    name__in=[wine.name for wine in chunk]
+                ).values_list("name", "id")
+            )
+            for wine in chunk:
+                wine.id = ids[wine.name]
+        return wines
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Load the instance from the database.
+
+        The loaded name is remembered, so a renamed wine can be replaced in
+        the autocomplete index. The loaded feature fields are remembered to
+        detect changes of the similarity features.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_name = instance.__dict__.get("name")
+        instance.loaded_features = instance.get_features()
+        return instance
+
+    def get_features(self):
+        """Return the loaded values of the feature fields."""
+        return [self.__dict__.get(field) for field in self.FEATURE_FIELDS]
+
+    def has_changed_features(self):
+        """Return whether a feature field has changed since loading."""
+        loaded_features = getattr(self, "loaded_features", None)
+        return loaded_features != self.get_features()
+
+    def save(self, *args, **kwargs):
+        """Save the wine and note the time its features have changed."""
+        if not self._state.adding and self.has_changed_features():
+            self.features_updated_at = timezone.now()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {
+                    *kwargs["update_fields"],
+                    "features_updated_at",
+                }
+        super().save(*args, **kwargs)
+        self.loaded_features = self.get_features()
 
     def __str__(self):
         """Represent as string."""
         return self.name
+
+
+class SimilarWine(models.Model):
+    """
+    Precomputed neighbour of a wine, maintained by wine.similarity.
+
+    Every wine has a ranked list of the wines with the most similar
+    description, variety, region and price.
+    """
+
+    wine = models.ForeignKey(
+        "Wine", on_delete=models.CASCADE, related_name="similar_wines"
+    )
+    similar = models.ForeignKey(
+        "Wine", on_delete=models.CASCADE, related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    # Time the neighbours of the wine have been computed
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        """
+        Meta Data.
+
+        The neighbours of a wine are read in the order of the unique index.
+        """
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wine", "rank"], name="wine_similar_wine_rank"
+            )
+        ]
+
+    def __str__(self):
+        """Represent as string."""
+        return f"{self.wine_id} - {self.rank}. {self.similar_id}"
+
+
+class WineRecommendation(models.Model):
+    """
+    Precomputed recommendation of a wine for a user.
+
+    The recommendations are maintained by wine.recommendations from the
+    points of the reviews of all users.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="wine_recommendations",
+    )
+    wine = models.ForeignKey(
+        "Wine", on_delete=models.CASCADE, related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()
+    # Predicted points of the user for the wine
+    score = models.FloatField()
+    # Time the recommendations of the user have been computed
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        """
+        Meta Data.
+
+        The recommendations of a user are read in the order of the unique
+        index, outdated recommendations are found by their computation time.
+        """
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "rank"], name="wine_recommendation_rank"
+            )
+        ]
+        indexes = [models.Index(fields=["computed_at"])]
+
+    def __str__(self):
+        """Represent as string."""
+        return f"{self.user_id} - {self.rank}. {self.wine_id}"
+
+
+class WineRanking(models.Model):
+    """
+    Bayesian score of a reviewed wine, maintained by wine.rankings.
+
+    The segment fields are copied from the wine, so the leaderboards of a
+    segment are read from one index without joining the wines.
+    """
+
+    wine = models.OneToOneField(
+        "Wine",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ranking",
+    )
+    score = models.FloatField()
+    country = models.ForeignKey(
+        "Country",
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+        blank=True,
+    )
+    variety = models.ForeignKey(
+        "Variety",
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+        blank=True,
+    )
+    # Index of the price bucket of wine.facets.PRICE_BUCKETS
+    price_band = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        """
+        Meta Data.
+
+        Index the score for the whole leaderboard and for every segment.
+        """
+
+        indexes = [
+            models.Index(fields=["score", "wine"]),
+            models.Index(fields=["country", "score", "wine"]),
+            models.Index(fields=["variety", "score", "wine"]),
+            models.Index(fields=["price_band", "score", "wine"]),
+        ]
+
+    def __str__(self):
+        """Represent as string."""
+        return f"{self.wine_id}: {self.score:.2f}"
+
+
+class RankingTotals(models.Model):
+    """
+    Totals of the reviews of the catalogue, maintained by wine.rankings.
+
+    The table has a single row. Its totals are updated by the changes of
+    every review write, so the average points of the catalogue are known
+    without aggregating all wines. prior_points are the prior of the stored
+    ranking scores, which only changes when all scores are recomputed.
+    """
+
+    review_count = models.BigIntegerField(default=0)
+    points_sum = models.BigIntegerField(default=0)
+    prior_points = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        """Meta data."""
+
+        verbose_name_plural = "ranking totals"
+
+    def __str__(self):
+        """Represent as string."""
+        return f"{self.review_count} reviews, {self.points_sum} points"
+
+    @property
+    def average_points(self):
+        """Return the average points of the catalogue."""
+        if not self.review_count:
+            return 0.0
+        return self.points_sum / self.review_count
@@ -0,0 +1,259 @@
+"""Pagination classes for the views of the wine app."""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination keyed on an ordering field and the primary key.
+
+    Every page continues after the (field, id) position of the last item of
+    the previous page, so neither OFFSET nor COUNT(*) are needed and deep
+    pages are as cheap as the first one. Pagination is only applied if the
+    client asks for it with the cursor or the page size parameter.
+
+    The view can define the orderings which are supported with the
+    attribute cursor_ordering_fields and the default with
+    cursor_default_ordering. Ordering fields must not be nullable.
+
+    If the queryset is annotated with the field cursor_relevance_field of
+    the view, i.e. the rank of a search, it is ordered and keyed by the
+    relevance and other orderings are rejected.
+    """
+
+    cursor_query_param = "cursor"
+    # Paginate every request, even without cursor and page size
+    always_paginate = False
+    page_size_query_param = "page_size"
+    ordering_query_param = "ordering"
+    # Number of items if the cursor is given without page size
+    page_size = 50
+    max_page_size = 1000
+    invalid_cursor_message = "Invalid cursor."
+
+    def get_page_size(self, request):
+        """
+        Return the requested page size.
+
+        None is returned if the client has not asked for pagination.
+        """
+        params = request.query_params
+        if self.page_size_query_param not in params:
+            if (
+                self.cursor_query_param not in params
+                and not self.always_paginate
+            ):
+                # Pagination is not requested
+                return None
+            return self.page_size
+        try:
+            page_size = int(params[self.page_size_query_param])
+        except ValueError:
+            raise ValidationError(
+                {self.page_size_query_param: "A valid integer is required."}
+            )
+        if page_size < 1:
+            raise ValidationError(
+                {self.page_size_query_param: "Must be at least 1."}
+            )
+        return min(page_size, self.max_page_size)
+
+    @staticmethod
+    def get_ordering_fields(view):
+        """Return the supported ordering fields of the view."""
+        return getattr(view, "cursor_ordering_fields", ("created_at",))
+
+    @staticmethod
+    def get_relevance_field(queryset, view):
+        """Return the relevance annotation of the queryset or None."""
+        field = getattr(view, "cursor_relevance_field", None)
+        if field in queryset.query.annotations:
+            return field
+        return None
+
+    def get_ordering(self, request, view, queryset):
+        """Return the requested ordering, i.e. "-created_at"."""
+        relevance_field = self.get_relevance_field(queryset, view)
+        if relevance_field:
+            # A lower value is a better match
+            ordering = request.query_params.get(
+                self.ordering_query_param, relevance_field
+            )
+            if ordering != relevance_field:
+                raise ValidationError(
+                    {
+                        self.ordering_query_param: (
+                            "Search results are ordered by relevance."
+                        )
+                    }
+                )
+            return ordering
+        ordering = request.query_params.get(
+            self.ordering_query_param,
+            getattr(view, "cursor_default_ordering", "-created_at"),
+        )
+        if ordering.lstrip("-") not in self.get_ordering_fields(view):
+            raise ValidationError(
+                {self.ordering_query_param: "Unsupported ordering."}
+            )
+        return ordering
+
+    def encode_cursor(self, ordering, instance):
+        """Encode the position after the given instance as cursor."""
+        value = getattr(instance, ordering.lstrip("-"))
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        elif not isinstance(value, (int, str)):
+            value = str(value)
+        payload = json.dumps([ordering, value, instance.pk])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor, ordering, queryset):
+        """Decode the cursor into the value of the field and the id."""
+        name = ordering.lstrip("-")
+        try:
+            payload = base64.urlsafe_b64decode(cursor.encode()).decode()
+            cursor_ordering, value, pk = json.loads(payload)
+            if isinstance(value, bool) or not isinstance(
+                value, (int, float, str)
+            ):
+                # The ordering fields are not nullable
+                raise ValueError("Invalid cursor value.")
+            if name in queryset.query.annotations:
+                # The relevance is a float
+                value = float(value)
+            else:
+                field = queryset.model._meta.get_field(name)
+                value = field.to_python(value)
+            pk = int(pk)
+        except (
+            binascii.Error,
+            DjangoValidationError,
+            TypeError,
+            ValueError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor_ordering != ordering:
+            # The cursor has been created for another ordering
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Return the queryset of the requested page or None.
+
+        The queryset contains one more item than the page, to know if there
+        is a next page.
+        """
+        page_size = self.get_page_size(request)
+        if page_size is None:
+            return None
+        self.current_page_size = page_size
+        self.request = request
+        self.ordering = self.get_ordering(request, view, queryset)
+        field = self.ordering.lstrip("-")
+        descending = self.ordering.startswith("-")
+        # Order by the field and use the primary key as tie breaker
+        prefix = "-" if descending else ""
+        queryset = queryset.order_by(self.ordering, f"{prefix}pk")
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor, self.ordering, queryset)
+            lookup = "lt" if descending else "gt"
+            # The first condition is a range on the index of the field, the
+            # second one skips the already returned items with equal values
+            queryset = queryset.filter(
+                Q(**{f"{field}__{lookup}e": value})
+                & (
+                    Q(**{f"{field}__{lookup}": value})
+                    | Q(**{f"pk__{lookup}": pk})
+                )
+            )
+        # Fetch one more item to know if there is a next page
+        return queryset[: page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return a single page of the queryset or None."""
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        page = list(queryset)
+        self.has_next = len(page) > self.current_page_size
+        page = page[: self.current_page_size]
+        self.next_cursor = None
+        if self.has_next:
+            self.next_cursor = self.encode_cursor(self.ordering, page[-1])
+        return page
+
+    def get_next_link(self):
+        """Return the link to the next page."""
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(
+            url, self.ordering_query_param, self.ordering
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        """Return the response of the page."""
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        """Return the schema of the paginated response."""
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        """Return the query parameters of the pagination."""
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+            {
+                "name": self.ordering_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Ordering of the paginated results.",
+                "schema": {
+                    "type": "string",
+                    "enum": [
+                        f"{prefix}{field}"
+                        for field in self.get_ordering_fields(view)
+                        for prefix in ("", "-")
+                    ],
+                },
+            },
+        ]
+
+
+class RequiredKeysetPagination(KeysetPagination):
+    """Keyset pagination which is applied to every request."""
+
+    always_paginate = True
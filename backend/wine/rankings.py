@@ -0,0 +1,269 @@
+"""
+Maintenance of the materialized leaderboard of the wines.
+
+Every reviewed wine has a row in the WineRanking table with its Bayesian
+score
+
+    (prior count * prior points + points sum) / (prior count + review count)
+
+so wines with few reviews are pulled towards the prior points and can not
+dominate the leaderboard with a single review. The rows are refreshed
+incrementally with the rating aggregates of the wines and can be rebuilt in
+bulk.
+
+Unless they are configured, the prior points are the average points of the
+catalogue. The totals of the catalogue are kept by the changes of every
+review write in the RankingTotals row, so a write only refreshes the
+rankings of its wines with the prior of the stored scores. The scores of all
+wines are only recomputed by rebuild_rankings and by refresh_prior, which
+is run periodically and rescores the wines once the average has moved away
+from the prior of the stored scores.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from wine.cache import RANKING_PRIOR_KEY
+from wine.facets import PRICE_BUCKETS
+from wine.models import RankingTotals, Wine, WineRanking
+
+# Fields of the wines which are copied into the ranking
+RANKING_FIELDS = (
+    "id",
+    "review_count",
+    "points_sum",
+    "country_id",
+    "variety_id",
+    "price",
+)
+# Change of the average points which recomputes the scores of all wines
+PRIOR_TOLERANCE = 0.01
+# Primary key of the single row of the totals
+TOTALS_ID = 1
+
+
+def count_totals():
+    """Return the totals of the reviews of all wines."""
+    return Wine.objects.aggregate(
+        review_count=Coalesce(Sum("review_count"), 0),
+        points_sum=Coalesce(Sum("points_sum"), 0),
+    )
+
+
+def get_totals(lock=False):
+    """
+    Return the totals of the catalogue.
+
+    The row is counted from the wines if it does not exist yet.
+    """
+    queryset = RankingTotals.objects.all()
+    if lock:
+        queryset = queryset.select_for_update()
+    totals = queryset.filter(pk=TOTALS_ID).first()
+    if totals is None:
+        totals, __ = RankingTotals.objects.get_or_create(
+            pk=TOTALS_ID, defaults=count_totals()
+        )
+    return totals
+
+
+def add_to_totals(count_delta, points_delta):
+    """
+    Add the changes of reviews to the totals of the catalogue.
+
+    The changes have to be written to the wines already.
+    """
+    if not count_delta and not points_delta:
+        return
+    updated = RankingTotals.objects.filter(pk=TOTALS_ID).update(
+        review_count=F("review_count") + count_delta,
+        points_sum=F("points_sum") + points_delta,
+    )
+    if not updated:
+        # The totals are counted from the wines, including the changes
+        get_totals()
+
+
+def get_configured_prior():
+    """Return the configured prior or None."""
+    if settings.WINE_RANKING_PRIOR_POINTS is None:
+        return None
+    return (
+        float(settings.WINE_RANKING_PRIOR_POINTS),
+        settings.WINE_RANKING_PRIOR_COUNT,
+    )
+
+
+def get_prior():
+    """
+    Return the prior points and the prior count of the stored scores.
+
+    The prior points can be configured with WINE_RANKING_PRIOR_POINTS,
+    otherwise the average of the catalogue at the last rescoring is used.
+    """
+    prior = get_configured_prior()
+    if prior is not None:
+        return prior
+    prior_points = cache.get(RANKING_PRIOR_KEY)
+    if prior_points is None:
+        totals = get_totals()
+        if totals.prior_points is None:
+            # Nothing has been scored yet, start with the current average
+            totals.prior_points = totals.average_points
+            RankingTotals.objects.filter(
+                pk=TOTALS_ID, prior_points__isnull=True
+            ).update(prior_points=totals.prior_points)
+        prior_points = totals.prior_points
+        store_prior_points(prior_points)
+    return prior_points, settings.WINE_RANKING_PRIOR_COUNT
+
+
+def refresh_prior(tolerance=PRIOR_TOLERANCE):
+    """
+    Rescore all rankings if the average of the catalogue has moved.
+
+    The scores are recomputed with one query if the average points differ
+    from the prior of the stored scores by more than the tolerance. Return
+    the prior of the scores and if they have been recomputed.
+    """
+    prior = get_configured_prior()
+    if prior is not None:
+        return prior, False
+    prior_count = settings.WINE_RANKING_PRIOR_COUNT
+    with transaction.atomic():
+        totals = get_totals(lock=True)
+        average_points = totals.average_points
+        if (
+            totals.prior_points is not None
+            and abs(average_points - totals.prior_points) <= tolerance
+        ):
+            store_prior_points(totals.prior_points)
+            return (totals.prior_points, prior_count), False
+        rescore_rankings((average_points, prior_count))
+        totals.prior_points = average_points
+        totals.save(update_fields=["prior_points"])
+        store_prior_points(average_points)
+    return (average_points, prior_count), True
+
+
+def store_prior_points(prior_points):
+    """Cache the prior points of the scores once they are committed."""
+    transaction.on_commit(
+        lambda: cache.set(RANKING_PRIOR_KEY, prior_points, timeout=None)
+    )
+
+
+def rescore_rankings(prior):
+    """Recompute the scores of all rankings with the prior in one query."""
+    prior_points, prior_count = prior
+    wines = Wine.objects.filter(pk=OuterRef("wine_id"))
+    WineRanking.objects.update(
+        score=(
+            prior_count * prior_points
+            + Subquery(wines.values("points_sum"), output_field=FloatField())
+        )
+        / (prior_count + Subquery(wines.values("review_count")))
+    )
+
+
+def get_price_band(price):
+    """Return the index of the price bucket of the price, or None."""
+    if price is None:
+        return None
+    for index, (__, lower, upper) in enumerate(PRICE_BUCKETS):
+        if (lower is None or price >= lower) and (
+            upper is None or price < upper
+        ):
+            return index
+    return None
+
+
+def get_rankings(rows, prior):
+    """Return the unsaved rankings of the wine rows with reviews."""
+    prior_points, prior_count = prior
+    return [
+        WineRanking(
+            wine_id=wine_id,
+            score=(prior_count * prior_points + points_sum)
+            / (prior_count + review_count),
+            country_id=country_id,
+            variety_id=variety_id,
+            price_band=get_price_band(price),
+        )
+        for (
+            wine_id,
+            review_count,
+            points_sum,
+            country_id,
+            variety_id,
+            price,
+        ) in rows
+        if review_count
+    ]
+
+
+def get_ranking_row(wine):
+    """Return the row of the ranking fields of a loaded wine."""
+    return tuple(getattr(wine, field) for field in RANKING_FIELDS)
+
+
+def replace_rankings(wine_ids, rows):
+    """
+    Replace the rankings of the wines with the rankings of the rows.
+
+    The rows are replaced in one transaction, which joins the transaction
+    of the caller without a savepoint. Wines without reviews are removed
+    from the ranking.
+    """
+    rankings = get_rankings(rows, get_prior())
+    with transaction.atomic(savepoint=False):
+        WineRanking.objects.filter(wine_id__in=wine_ids).delete()
+        WineRanking.objects.bulk_create(rankings)
+
+
+def refresh_rankings(wine_ids):
+    """Refresh the rankings of the given wines."""
+    wine_ids = set(wine_ids)
+    if not wine_ids:
+        return
+    rows = Wine.objects.filter(pk__in=wine_ids).values_list(*RANKING_FIELDS)
+    replace_rankings(wine_ids, rows)
+
+
+def rebuild_rankings(batch_size=1000):
+    """
+    Rebuild the rankings of all wines with the current prior points.
+
+    The totals of the catalogue are counted again from the wines. Return the
+    number of ranked wines.
+    """
+    queryset = (
+        Wine.objects.filter(review_count__gt=0)
+        .order_by("id")
+        .values_list(*RANKING_FIELDS)
+    )
+    ranked = 0
+    last_id = 0
+    with transaction.atomic():
+        totals = get_totals(lock=True)
+        for field, value in count_totals().items():
+            setattr(totals, field, value)
+        prior = get_configured_prior()
+        if prior is None:
+            prior = (totals.average_points, settings.WINE_RANKING_PRIOR_COUNT)
+            totals.prior_points = prior[0]
+            store_prior_points(prior[0])
+        totals.save()
+        WineRanking.objects.all().delete()
+        while True:
+            # Walk through the wines by primary key, without using offsets
+            rows = list(queryset.filter(pk__gt=last_id)[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ranked += len(
+                WineRanking.objects.bulk_create(get_rankings(rows, prior))
+            )
+    return ranked
@@ -0,0 +1,143 @@
+"""
+Maintenance of the denormalized rating aggregates of wines.
+
+Every wine stores the number of its reviews, the sum of their points and the
+resulting average. The values are updated incrementally whenever reviews are
+written and can be rebuilt in bulk from the reviews table. The rankings of
+the changed wines are refreshed with them.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from wine.models import Review, Wine
+from wine.rankings import (
+    RANKING_FIELDS,
+    add_to_totals,
+    get_ranking_row,
+    refresh_rankings,
+    replace_rankings,
+)
+
+# Fields holding the rating aggregates of a wine
+AGGREGATE_FIELDS = ("review_count", "points_sum", "points_avg")
+
+
+def rating_average(points_sum, review_count):
+    """
+    Return the average stored for the given sum and count.
+
+    Wines without reviews have no average.
+    """
+    if not review_count:
+        return None
+    return (Decimal(points_sum) / Decimal(review_count)).quantize(
+        Decimal("0.01")
+    )
+
+
+def apply_review_deltas(deltas):
+    """
+    Apply changes of reviews to the rating aggregates of the wines.
+
+    deltas maps a wine id to a tuple of the change of the review count and
+    the change of the points sum. The wines are locked and updated in one
+    transaction, which joins the transaction of the caller.
+    """
+    if not deltas:
+        return
+    # The reviews are part of the wine, update its modification time
+    now = timezone.now()
+    with transaction.atomic():
+        # Lock the affected wines to serialize concurrent updates
+        wines = list(
+            Wine.objects.select_for_update()
+            .filter(pk__in=deltas)
+            .only(*AGGREGATE_FIELDS, *RANKING_FIELDS)
+        )
+        for wine in wines:
+            count_delta, points_delta = deltas[wine.id]
+            wine.review_count += count_delta
+            wine.points_sum += points_delta
+            wine.points_avg = rating_average(
+                wine.points_sum, wine.review_count
+            )
+            wine.updated_at = now
+        # Write all wines with one query
+        Wine.objects.bulk_update(wines, AGGREGATE_FIELDS + ("updated_at",))
+        add_to_totals(
+            sum(deltas[wine.id][0] for wine in wines),
+            sum(deltas[wine.id][1] for wine in wines),
+        )
+        # Rank the wines with the loaded fields
+        replace_rankings(deltas, [get_ranking_row(wine) for wine in wines])
+
+
+def compute_rating_aggregates(wine_ids):
+    """
+    Compute the rating aggregates of the given wines from the reviews.
+
+    Return a dictionary mapping the wine id to the tuple of review count,
+    points sum and average. Wines without reviews are missing.
+    """
+    rows = (
+        Review.objects.filter(wine_id__in=wine_ids)
+        .values("wine_id")
+        .annotate(review_count=Count("id"), points_sum=Sum("points"))
+        .values_list("wine_id", "review_count", "points_sum")
+        .order_by()
+    )
+    return {
+        wine_id: (count, points, rating_average(points, count))
+        for wine_id, count, points in rows
+    }
+
+
+def rebuild_rating_aggregates(wine_ids=None, batch_size=1000, fix=True):
+    """
+    Rebuild the rating aggregates in batches.
+
+    The stored values of every wine (or the given wines) are compared to the
+    values computed from the reviews. Drifted wines are fixed unless fix is
+    False. Return a tuple of the number of checked and drifted wines.
+    """
+    queryset = Wine.objects.order_by("id").only("id", *AGGREGATE_FIELDS)
+    if wine_ids is not None:
+        queryset = queryset.filter(pk__in=wine_ids)
+    checked = drifted = 0
+    last_id = 0
+    while True:
+        # Walk through the wines by primary key, without using offsets
+        wines = list(queryset.filter(pk__gt=last_id)[:batch_size])
+        if not wines:
+            break
+        last_id = wines[-1].id
+        aggregates = compute_rating_aggregates([wine.id for wine in wines])
+        changed = []
+        count_delta = points_delta = 0
+        for wine in wines:
+            expected = aggregates.get(wine.id, (0, 0, None))
+            stored = tuple(getattr(wine, field) for field in AGGREGATE_FIELDS)
+            if stored != expected:
+                # Stored values differ from the reviews
+                count_delta += expected[0] - wine.review_count
+                points_delta += expected[1] - wine.points_sum
+                (
+                    wine.review_count,
+                    wine.points_sum,
+                    wine.points_avg,
+                ) = expected
+                wine.updated_at = timezone.now()
+                changed.append(wine)
+        checked += len(wines)
+        drifted += len(changed)
+        if fix and changed:
+            with transaction.atomic():
+                Wine.objects.bulk_update(
+                    changed, AGGREGATE_FIELDS + ("updated_at",)
+                )
+                add_to_totals(count_delta, points_delta)
+                refresh_rankings([wine.id for wine in changed])
+    return checked, drifted
@@ -0,0 +1,96 @@
+"""
+Collaborative filtering recommendations from the points of the reviews.
+
+The reviews are loaded as NumPy arrays without creating model instances,
+factorized with wine.factorization and the wines with the highest predicted
+points, which the user has not reviewed yet, are stored per user in the
+WineRecommendation table.
+"""
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from wine import factorization
+from wine.models import Review, WineRecommendation
+
+# Number of stored recommendations per user
+DEFAULT_RECOMMENDATIONS = 20
+# Review fields as they are loaded from the database
+REVIEW_DTYPE = [("user", np.int64), ("wine", np.int64), ("points", np.int16)]
+
+
+def load_reviews():
+    """Return the user ids, wine ids and points of all reviews as array."""
+    return np.fromiter(
+        Review.objects.order_by()
+        .values_list("user_id", "wine_id", "points")
+        .iterator(chunk_size=10000),
+        dtype=REVIEW_DTYPE,
+    )
+
+
+def compute_recommendations(
+    count=DEFAULT_RECOMMENDATIONS,
+    factors=factorization.DEFAULT_FACTORS,
+    iterations=factorization.DEFAULT_ITERATIONS,
+    regularization=factorization.DEFAULT_REGULARIZATION,
+):
+    """
+    Compute and store the recommendations of all users with reviews.
+
+    The recommendations of users without reviews are removed. Return the
+    number of users whose recommendations were computed.
+    """
+    started_at = timezone.now()
+    reviews = load_reviews()
+    # Number the users and wines from zero
+    user_ids, users = np.unique(reviews["user"], return_inverse=True)
+    wine_ids, wines = np.unique(reviews["wine"], return_inverse=True)
+    mean, user_factors, wine_factors = factorization.factorize(
+        users,
+        wines,
+        reviews["points"],
+        len(user_ids),
+        len(wine_ids),
+        factors=factors,
+        iterations=iterations,
+        regularization=regularization,
+    )
+    by_user = np.argsort(users, kind="stable")
+    for block, columns, scores in factorization.iter_top_wines(
+        users[by_user],
+        wines[by_user],
+        mean,
+        user_factors,
+        wine_factors,
+        count,
+    ):
+        block_user_ids = user_ids[block].tolist()
+        now = timezone.now()
+        # Replace the recommendations of the block at once
+        with transaction.atomic():
+            WineRecommendation.objects.filter(
+                user_id__in=block_user_ids
+            ).delete()
+            WineRecommendation.objects.bulk_create(
+                [
+                    WineRecommendation(
+                        user_id=user_id,
+                        wine_id=int(wine_ids[column]),
+                        rank=rank,
+                        score=float(np.clip(score, 0, 100)),
+                        computed_at=now,
+                    )
+                    for user_id, user_columns, user_scores in zip(
+                        block_user_ids, columns, scores
+                    )
+                    for rank, (column, score) in enumerate(
+                        zip(user_columns, user_scores), 1
+                    )
+                    # Reviewed wines are not recommended
+                    if np.isfinite(score)
+                ]
+            )
+    # Remove the recommendations of users without reviews
+    WineRecommendation.objects.filter(computed_at__lt=started_at).delete()
+    return len(user_ids)
@@ -0,0 +1,158 @@
+"""
+Full-text search over wines.
+
+The name, description, variety and winery of every wine are stored in an
+SQLite FTS5 index. The index is maintained by the signal receivers of the
+wine app and can be rebuilt with the rebuild_wine_search_index command. On
+other database backends the search falls back to case insensitive lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+# Name of the FTS5 table, the rowid is the id of the wine
+FTS_TABLE = "wine_wine_fts"
+# Indexed columns with the lookup path of their value
+INDEXED_FIELDS = {
+    "name": "name",
+    "description": "description",
+    "variety": "variety__name",
+    "winery": "winery__name",
+}
+# Words of a search query
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def is_supported():
+    """Return if the database supports the FTS5 index."""
+    return connection.vendor == "sqlite"
+
+
+def get_tokens(text):
+    """Return the lower case words of the search text."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def build_match_query(text):
+    """
+    Build the FTS5 query of the search text.
+
+    Every word is quoted, so no FTS5 syntax can be injected, and matched as
+    prefix. All words have to match.
+    """
+    return " ".join(f'"{token}"*' for token in get_tokens(text))
+
+
+def get_documents(queryset):
+    """
+    Return the queryset of the indexed values of the wines.
+
+    The values are the id of the wine, followed by the indexed columns. The
+    names of the lookup fields are joined, missing values are empty.
+    """
+    return (
+        queryset.order_by()
+        .annotate(
+            **{
+                f"document_{column}": Coalesce(path, Value(""))
+                for column, path in INDEXED_FIELDS.items()
+            }
+        )
+        .values_list(
+            "id", *[f"document_{column}" for column in INDEXED_FIELDS]
+        )
+    )
+
+
+def index_wines(wines):
+    """Add or replace the given wines in the index."""
+    # pylint: disable=import-outside-toplevel
+    from wine.models import Wine
+
+    if not is_supported():
+        return
+    wine_ids = [wine.id for wine in wines]
+    if not wine_ids:
+        return
+    remove_wines(wine_ids)
+    # Insert the stored values, so the lookup names are resolved by joins
+    sql, params = get_documents(
+        Wine.objects.filter(pk__in=wine_ids)
+    ).query.sql_with_params()
+    columns = ", ".join(INDEXED_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {columns}) {sql}", params
+        )
+
+
+def remove_wines(wine_ids):
+    """Remove the given wine ids from the index."""
+    if not is_supported() or not wine_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(wine_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+            list(wine_ids),
+        )
+
+
+def rebuild_index():
+    """
+    Rebuild the index from scratch.
+
+    Return the number of indexed wines.
+    """
+    # pylint: disable=import-outside-toplevel
+    from wine.models import Wine
+
+    if not is_supported():
+        return 0
+    sql, params = get_documents(Wine.objects.all()).query.sql_with_params()
+    columns = ", ".join(INDEXED_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {columns}) {sql}", params
+        )
+        return cursor.rowcount
+
+
+def search_wines(queryset, text):
+    """
+    Filter the wine queryset for the search text.
+
+    The wines are ordered by relevance, starting with the best match.
+    """
+    match = build_match_query(text)
+    if not match:
+        # Nothing to search for
+        return queryset
+    if not is_supported():
+        # Fall back to case insensitive lookups for every word
+        for token in get_tokens(text):
+            condition = Q()
+            for path in INDEXED_FIELDS.values():
+                condition |= Q(**{f"{path}__icontains": token})
+            queryset = queryset.filter(condition)
+        return queryset
+    table = queryset.model._meta.db_table
+    # Use the index to find the matching wines...
+    queryset = queryset.filter(
+        pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            (match,),
+        )
+    )
+    # ... and rank them, a lower rank is a better match
+    return queryset.annotate(
+        search_rank=RawSQL(
+            f"SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"AND rowid = {table}.id",
+            (match,),
+        )
+    ).order_by("search_rank", "pk")
@@ -0,0 +1,360 @@
+"""
+Generation of a synthetic wine catalogue for benchmarks.
+
+The catalogue resembles the wine reviews dataset: a few countries and
+varieties cover most of the wines, the wineries and designations have a long
+tail, the descriptions are built from tasting notes and most wines are
+reviewed by a few users. All rows are inserted in bulk and the derived data
+(rating aggregates, search index, tag counts and rankings) is maintained
+directly, like the import does.
+"""
+import math
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+
+from wine import autocomplete, search
+from wine.cache import bump_catalogue_version, bump_public_libraries_version
+from wine.models import Library, Review, Tag, Wine
+from wine.rankings import rebuild_rankings
+from wine.ratings import rating_average
+from wine.tag_counts import recount_tags
+
+# Number of wines of the named scales
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+# Ratios of the generated rows
+WINES_PER_USER = 50
+WINES_PER_WINERY = 8
+LIBRARIES_PER_USER = 2
+WINES_PER_LIBRARY = 20
+TAGS_PER_USER = 8
+# Weights of the number of reviews of a wine, three on average
+REVIEW_COUNT_WEIGHTS = (5, 10, 15, 25, 20, 15, 10)
+# Countries with their share of the wines
+COUNTRIES = (
+    ("US", 42),
+    ("France", 17),
+    ("Italy", 15),
+    ("Spain", 5),
+    ("Portugal", 4),
+    ("Chile", 3),
+    ("Argentina", 3),
+    ("Austria", 3),
+    ("Australia", 2),
+    ("Germany", 2),
+    ("New Zealand", 1),
+    ("South Africa", 1),
+)
+# Varieties by frequency
+VARIETIES = (
+    "Pinot Noir",
+    "Chardonnay",
+    "Cabernet Sauvignon",
+    "Red Blend",
+    "Bordeaux-style Red Blend",
+    "Riesling",
+    "Sauvignon Blanc",
+    "Syrah",
+    "Rosé",
+    "Merlot",
+    "Nebbiolo",
+    "Zinfandel",
+    "Sangiovese",
+    "Malbec",
+    "Portuguese Red",
+    "White Blend",
+    "Sparkling Blend",
+    "Tempranillo",
+    "Rhône-style Red Blend",
+    "Pinot Gris",
+    "Champagne Blend",
+    "Cabernet Franc",
+    "Grüner Veltliner",
+    "Pinot Grigio",
+    "Viognier",
+    "Gamay",
+    "Shiraz",
+    "Petite Sirah",
+    "Chenin Blanc",
+    "Barbera",
+)
+# Words of the descriptions
+STYLES = ("Bright", "Ripe", "Elegant", "Rich", "Fresh", "Dense", "Delicate")
+NOTES = (
+    "cherry",
+    "blackberry",
+    "plum",
+    "cassis",
+    "raspberry",
+    "citrus",
+    "lemon",
+    "green apple",
+    "pear",
+    "peach",
+    "apricot",
+    "vanilla",
+    "oak",
+    "tobacco",
+    "leather",
+    "baking spice",
+    "black pepper",
+    "wet stone",
+    "dried herbs",
+    "violet",
+    "honey",
+    "toast",
+    "dark chocolate",
+    "forest floor",
+)
+STRUCTURES = (
+    "firm tannins",
+    "bright acidity",
+    "a long finish",
+    "a creamy texture",
+    "supple tannins",
+    "a crisp finish",
+    "a touch of sweetness",
+)
+TAG_NAMES = (
+    "Dry",
+    "Fruity",
+    "Oaky",
+    "Sweet",
+    "Organic",
+    "For the cellar",
+    "Gift",
+    "Weekday",
+    "Favourite",
+    "Barbecue",
+    "Seafood",
+    "Party",
+)
+LIBRARY_NAMES = ("Favourites", "Wishlist", "Cellar", "Tasted", "Gifts")
+
+
+def skewed(generator, size, power=3):
+    """Return a random index below size, small indexes are more likely."""
+    return min(int(size * generator.random() ** power), size - 1)
+
+
+def generate_description(generator):
+    """Return a tasting note."""
+    first, second, third = generator.sample(NOTES, 3)
+    structure = " and ".join(generator.sample(STRUCTURES, 2))
+    return (
+        f"{generator.choice(STYLES)} aromas of {first}, {second} and "
+        f"{third} lead to a palate with {structure}."
+    )
+
+
+def generate_price(generator):
+    """Return a log-normal price in whole dollars, or None."""
+    if generator.random() < 0.07:
+        return None
+    return min(max(round(math.exp(generator.gauss(3.3, 0.6))), 4), 3000)
+
+
+def generate_row(generator, number, winery_count):
+    """Return the fields and lookup names of a wine."""
+    (country,) = generator.choices(
+        [name for name, __ in COUNTRIES],
+        weights=[weight for __, weight in COUNTRIES],
+    )
+    province = f"{country} Province {skewed(generator, 30) + 1}"
+    variety = VARIETIES[skewed(generator, len(VARIETIES), power=2)]
+    winery = f"Winery {skewed(generator, winery_count) + 1}"
+    designation = None
+    if generator.random() < 0.7:
+        designation = f"Vineyard {skewed(generator, winery_count) + 1}"
+    vintage = generator.randint(1995, 2020)
+    return {
+        "name": f"{winery} {vintage} {designation or 'Estate'} {variety} "
+        f"#{number}",
+        "description": generate_description(generator),
+        "price": generate_price(generator),
+        "country": country,
+        "province": province,
+        "region_1": f"{province} Region {skewed(generator, 10) + 1}",
+        "region_2": f"{country} Coast" if generator.random() < 0.1 else None,
+        "variety": variety,
+        "winery": winery,
+        "designation": designation,
+    }
+
+
+def get_last_id(model):
+    """Return the highest id of the model, or zero."""
+    return model.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+
+
+def create_users(generator, count, start):
+    """Insert the users with unusable passwords and return their ids."""
+    password = make_password(None)
+    # The new rows are found by their ids, without long lists of params
+    last_id = get_last_id(get_user_model())
+    get_user_model().objects.bulk_create(
+        get_user_model()(
+            email=f"seed-{start + number}@example.com",
+            first_name=generator.choice(("Ned", "Arya", "Sansa", "Jon")),
+            last_name=f"Seed {start + number}",
+            password=password,
+        )
+        for number in range(count)
+    )
+    return list(
+        get_user_model()
+        .objects.filter(pk__gt=last_id)
+        .values_list("id", flat=True)
+    )
+
+
+def create_tags(generator, user_ids):
+    """Insert the tags of the users and return the tag ids per user."""
+    last_id = get_last_id(Tag)
+    Tag.objects.bulk_create(
+        Tag(user_id=user_id, name=name)
+        for user_id in user_ids
+        for name in generator.sample(TAG_NAMES, TAGS_PER_USER)
+    )
+    tags = {}
+    for user_id, tag_id in Tag.objects.filter(pk__gt=last_id).values_list(
+        "user_id", "id"
+    ):
+        tags.setdefault(user_id, []).append(tag_id)
+    return tags
+
+
+def create_wine_chunk(generator, numbers, user_ids, tags, winery_count):
+    """
+    Insert the wines of the numbers with their reviews and tags.
+
+    Return the ids of the wines and the number of reviews.
+    """
+    rows = [
+        generate_row(generator, number, winery_count) for number in numbers
+    ]
+    lookup_ids = Wine.get_lookup_ids(rows)
+    wines = []
+    reviews = []
+    for row in rows:
+        wine = Wine(
+            user_id=user_ids[skewed(generator, len(user_ids), power=2)],
+            name=row["name"],
+            description=row["description"],
+            price=row["price"],
+            **{
+                f"{field}_id": lookup_ids[field].get(row[field])
+                for field in Wine.LOOKUP_FIELDS
+            },
+        )
+        # Every wine has a quality its reviewers roughly agree on
+        quality = generator.gauss(88, 3)
+        (count,) = generator.choices(
+            range(len(REVIEW_COUNT_WEIGHTS)), weights=REVIEW_COUNT_WEIGHTS
+        )
+        # Every user reviews a wine at most once
+        reviewers = generator.sample(user_ids, min(count, len(user_ids)))
+        points = [
+            min(max(round(quality + generator.gauss(0, 1.5)), 80), 100)
+            for __ in reviewers
+        ]
+        wine.review_count = len(points)
+        wine.points_sum = sum(points)
+        wine.points_avg = rating_average(wine.points_sum, wine.review_count)
+        wines.append(wine)
+        reviews.append(zip(reviewers, points))
+    Wine.bulk_insert(wines)
+    created = Review.objects.bulk_create(
+        Review(wine_id=wine.id, user_id=user_id, points=points)
+        for wine, wine_reviews in zip(wines, reviews)
+        for user_id, points in wine_reviews
+    )
+    through = Wine.tags.through
+    through.objects.bulk_create(
+        through(wine_id=wine.id, tag_id=tag_id)
+        for wine in wines
+        for tag_id in generator.sample(
+            tags[wine.user_id], generator.randint(0, 3)
+        )
+    )
+    search.index_wines(wines)
+    return [wine.id for wine in wines], len(created)
+
+
+def create_libraries(generator, user_ids, wine_ids):
+    """Insert the libraries of the users with random wines."""
+    last_id = get_last_id(Library)
+    libraries = Library.objects.bulk_create(
+        Library(
+            user_id=user_id,
+            name=name,
+            public=generator.random() < 0.3,
+        )
+        for user_id in user_ids
+        for name in generator.sample(LIBRARY_NAMES, LIBRARIES_PER_USER)
+    )
+    library_ids = Library.objects.filter(pk__gt=last_id).values_list(
+        "id", flat=True
+    )
+    through = Wine.libraries.through
+    through.objects.bulk_create(
+        (
+            through(library_id=library_id, wine_id=wine_id)
+            for library_id in library_ids
+            for wine_id in generator.sample(
+                wine_ids, min(WINES_PER_LIBRARY, len(wine_ids))
+            )
+        ),
+        batch_size=10000,
+    )
+    return len(libraries)
+
+
+def seed_catalogue(wines, seed=0, chunk_size=2000, progress=None):
+    """
+    Insert a synthetic catalogue with the given number of wines.
+
+    The users, tags and libraries grow with the number of wines. Every chunk
+    of wines is inserted in its own transaction and reported to progress.
+    Return the numbers of the created rows by model.
+    """
+    generator = random.Random(seed)
+    # Continue the numbers of earlier runs, so the names stay unique
+    start = get_last_id(Wine) + 1
+    last_tag_id = get_last_id(Tag)
+    with transaction.atomic():
+        user_ids = create_users(
+            generator, max(wines // WINES_PER_USER, 2), start
+        )
+        tags = create_tags(generator, user_ids)
+    winery_count = max(wines // WINES_PER_WINERY, 1)
+    wine_ids = []
+    reviews = 0
+    for first in range(0, wines, chunk_size):
+        numbers = range(start + first, start + min(first + chunk_size, wines))
+        with transaction.atomic():
+            chunk_ids, chunk_reviews = create_wine_chunk(
+                generator, numbers, user_ids, tags, winery_count
+            )
+        wine_ids += chunk_ids
+        reviews += chunk_reviews
+        if progress:
+            progress(len(wine_ids))
+    with transaction.atomic():
+        libraries = create_libraries(generator, user_ids, wine_ids)
+        # Bulk inserts do not send signals, update the derived data
+        recount_tags(Tag.objects.filter(pk__gt=last_tag_id).values("id"))
+    rebuild_rankings()
+    bump_catalogue_version()
+    bump_public_libraries_version()
+    autocomplete.index.invalidate()
+    return {
+        "users": len(user_ids),
+        "wines": len(wine_ids),
+        "reviews": reviews,
+        "tags": sum(len(user_tags) for user_tags in tags.values()),
+        "libraries": libraries,
+    }
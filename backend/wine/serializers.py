@@ -4,15 +4,67 @@ from collections import OrderedDict
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from wine.models import Wine, Tag, Library, Review
+from wine.models import (
+    Country,
+    Designation,
+    Library,
+    Province,
+    Region,
+    Review,
+    SimilarWine,
+    Tag,
+    Variety,
+    Wine,
+    WineRanking,
+    WineRecommendation,
+    Winery,
+)
+
+
+# Maximum number of wines added to or removed from a library at once
+MAX_LIBRARY_WINES_CHANGE = 1000
+
+
+class LookupField(serializers.SlugRelatedField):
+    """
+    Field for a wine attribute which is stored in a lookup table.
+
+    The attribute is represented by its name. Written names are looked up,
+    unknown names are validated as unsaved lookups, which are created by the
+    serializer when the wine is saved.
+    """
+
+    def __init__(self, **kwargs):
+        """Represent the lookup by name, the attribute is optional."""
+        kwargs.setdefault("slug_field", "name")
+        kwargs.setdefault("required", False)
+        kwargs.setdefault("allow_null", True)
+        super().__init__(**kwargs)
+        self.name_field = serializers.CharField(
+            max_length=255, allow_blank=True
+        )
+
+    def to_internal_value(self, data):
+        """Return the lookup of the name, blank names are None."""
+        name = self.name_field.run_validation(data)
+        if not name:
+            return None
+        queryset = self.get_queryset()
+        return queryset.filter(name=name).first() or queryset.model(name=name)
 
 
 class LibrarySerializer(serializers.ModelSerializer):
-    """Serializer for Library Object."""
+    """
+    Serializer for Library Object.
+
+    The wines are only written, they are listed by the wines action of the
+    library. The number of wines is represented instead.
+    """
 
     wines = serializers.PrimaryKeyRelatedField(
-        many=True, required=False, queryset=Wine.objects.all()
+        many=True, required=False, queryset=Wine.objects.all(), write_only=True
     )
+    wine_count = serializers.SerializerMethodField()
 
     class Meta:
         """Class Meta"""
@@ -24,10 +76,51 @@ class LibrarySerializer(serializers.ModelSerializer):
             "description",
             "public",
             "wines",
+            "wine_count",
             "created_at",
         )
         read_only_fields = ("id",)
 
+    def update(self, instance, validated_data):
+        """Update the library, a changed number of wines is counted again."""
+        if "wines" in validated_data:
+            # The annotated number is outdated
+            instance.__dict__.pop("wine_count", None)
+        return super().update(instance, validated_data)
+
+    def get_wine_count(self, library) -> int:
+        """Return the annotated number of wines or count them."""
+        if hasattr(library, "wine_count"):
+            return library.wine_count
+        return library.wines.count()
+
+
+class LibraryWinesSerializer(serializers.Serializer):
+    """Serializer for the wine ids of a change of a library."""
+
+    wines = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_LIBRARY_WINES_CHANGE,
+    )
+
+
+class PublicLibrarySerializer(LibrarySerializer):
+    """Read only serializer for public libraries."""
+
+    class Meta(LibrarySerializer.Meta):
+        """Class Meta"""
+
+        fields = (
+            "id",
+            "name",
+            "description",
+            "wine_count",
+            "created_at",
+            "updated_at",
+        )
+        read_only_fields = fields
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for Tag Object."""
@@ -37,7 +130,7 @@ class TagSerializer(serializers.ModelSerializer):
 
         model = Tag
         exclude = ("user",)
-        read_only_fields = ("id",)
+        read_only_fields = ("id", "wine_count")
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -57,6 +150,17 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
+class ReviewBulkItemSerializer(ReviewSerializer):
+    """
+    Serializes one review of a bulk submission.
+
+    The wine is validated as plain id, all wines of the submission are
+    looked up at once.
+    """
+
+    wine = serializers.IntegerField()
+
+
 class WineSerializer(serializers.ModelSerializer):
     """Serializer for Wine Object."""
 
@@ -69,6 +173,13 @@ class WineSerializer(serializers.ModelSerializer):
     reviews = serializers.PrimaryKeyRelatedField(
         many=True, queryset=Review.objects.all(), required=False
     )
+    designation = LookupField(queryset=Designation.objects.all())
+    variety = LookupField(queryset=Variety.objects.all())
+    region_1 = LookupField(queryset=Region.objects.all())
+    region_2 = LookupField(queryset=Region.objects.all())
+    province = LookupField(queryset=Province.objects.all())
+    country = LookupField(queryset=Country.objects.all())
+    winery = LookupField(queryset=Winery.objects.all())
 
     def validate(self, attrs):
         """
@@ -85,6 +196,34 @@ class WineSerializer(serializers.ModelSerializer):
 
         return attrs
 
+    @staticmethod
+    def save_lookups(validated_data):
+        """Create the unsaved lookups of the validated data at once."""
+        names = {
+            field: validated_data[field].name
+            for field in Wine.LOOKUP_FIELDS
+            if validated_data.get(field) is not None
+            and validated_data[field].pk is None
+        }
+        if not names:
+            return
+        lookup_ids = Wine.get_lookup_ids([names])
+        for field, name in names.items():
+            model = Wine._meta.get_field(field).related_model
+            validated_data[field] = model(
+                id=lookup_ids[field][name], name=name
+            )
+
+    def create(self, validated_data):
+        """Create the wine with the lookups of new names."""
+        self.save_lookups(validated_data)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        """Update the wine with the lookups of new names."""
+        self.save_lookups(validated_data)
+        return super().update(instance, validated_data)
+
     class Meta:
         """Class Meta."""
 
@@ -120,6 +259,45 @@ class WineSerializer(serializers.ModelSerializer):
         )
 
 
+class SimilarWineSerializer(serializers.ModelSerializer):
+    """Serializer for a similar wine and its score."""
+
+    wine = WineSerializer(source="similar", read_only=True)
+
+    class Meta:
+        """Class Meta."""
+
+        model = SimilarWine
+        fields = ("score", "wine")
+        read_only_fields = fields
+
+
+class WineRankingSerializer(serializers.ModelSerializer):
+    """Serializer for a ranked wine and its Bayesian score."""
+
+    wine = WineSerializer(read_only=True)
+
+    class Meta:
+        """Class Meta."""
+
+        model = WineRanking
+        fields = ("score", "wine")
+        read_only_fields = fields
+
+
+class WineRecommendationSerializer(serializers.ModelSerializer):
+    """Serializer for a recommended wine and its predicted points."""
+
+    wine = WineSerializer(read_only=True)
+
+    class Meta:
+        """Class Meta."""
+
+        model = WineRecommendation
+        fields = ("score", "wine")
+        read_only_fields = fields
+
+
 class WineDetailSerializer(WineSerializer):
     """
     Serializes a Wine object in detail.
@@ -130,3 +308,61 @@ class WineDetailSerializer(WineSerializer):
     libraries = LibrarySerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
+
+
+def get_batch_lookup_field():
+    """Return the field of a lookup name of a batch item."""
+    return serializers.CharField(
+        max_length=255, allow_null=True, allow_blank=True, required=False
+    )
+
+
+class WineBatchItemSerializer(WineSerializer):
+    """
+    Serializes one wine of a batch write.
+
+    Items with an id update the wine, the others create a new one. The
+    related ids and the unique name are not looked up per item, they are
+    validated for the whole batch at once.
+    """
+
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(max_length=100)
+    libraries = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    # The lookup names of the whole batch are resolved at once
+    designation = get_batch_lookup_field()
+    variety = get_batch_lookup_field()
+    region_1 = get_batch_lookup_field()
+    region_2 = get_batch_lookup_field()
+    province = get_batch_lookup_field()
+    country = get_batch_lookup_field()
+    winery = get_batch_lookup_field()
+
+    class Meta(WineSerializer.Meta):
+        """Class Meta."""
+
+        fields = (
+            "id",
+            "libraries",
+            "tags",
+            "name",
+            "description",
+            "price",
+            "designation",
+            "variety",
+            "region_1",
+            "region_2",
+            "province",
+            "country",
+            "winery",
+        )
+        read_only_fields = ()
+
+    def validate(self, attrs):
+        """Skip the per item validation of the libraries."""
+        return attrs
@@ -0,0 +1,247 @@
+"""Signal receivers keeping the derived data of the wine app up to date."""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.db import transaction
+from django.dispatch import receiver
+
+from wine import autocomplete, search
+from wine.cache import bump_catalogue_version, bump_public_libraries_version
+from wine.models import Library, Review, Tag, Variety, Wine, Winery
+from wine.rankings import refresh_rankings
+from wine.ratings import apply_review_deltas, rebuild_rating_aggregates
+from wine.tag_counts import decrement_tags, recount_tags
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, raw, **kwargs):
+    """Update the rating aggregates of the wine of a saved review."""
+    if raw:
+        # Do not touch other tables while loading fixtures
+        return
+    deltas = {instance.wine_id: (1, instance.points)}
+    if not created:
+        # Revert the previously stored values of the review
+        old_wine_id, old_points = getattr(
+            instance, "loaded_rating", (None, None)
+        )
+        if old_wine_id is None or old_points is None:
+            # The previous values are unknown, recalculate the wine
+            rebuild_rating_aggregates(wine_ids=[instance.wine_id])
+            deltas = {}
+        else:
+            count_delta, points_delta = deltas.get(old_wine_id, (0, 0))
+            deltas[old_wine_id] = (
+                count_delta - 1,
+                points_delta - old_points,
+            )
+    apply_review_deltas(
+        {
+            wine_id: delta
+            for wine_id, delta in deltas.items()
+            if delta != (0, 0)
+        }
+    )
+    bump_catalogue_version()
+    # Remember the stored values for further changes
+    instance.loaded_rating = (instance.wine_id, instance.points)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    """Update the rating aggregates of the wine of a deleted review."""
+    apply_review_deltas({instance.wine_id: (-1, -instance.points)})
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Wine)
+def index_wine_on_save(sender, instance, raw, **kwargs):
+    """Update the search index and the cached data for the saved wine."""
+    if raw:
+        return
+    search.index_wines([instance])
+    if instance.review_count:
+        # The segment fields of the ranking may have changed
+        refresh_rankings([instance.pk])
+    bump_catalogue_version()
+
+
+@receiver(post_delete, sender=Wine)
+def remove_wine_on_delete(sender, instance, **kwargs):
+    """Update the search index and the cached data for the deleted wine."""
+    search.remove_wines([instance.id])
+    bump_catalogue_version()
+
+
+@receiver(pre_delete, sender=Wine)
+def expire_similar_wines_on_delete(sender, instance, **kwargs):
+    """Mark the wines with the deleted wine as similar wine as stale."""
+    Wine.objects.filter(similar_wines__similar=instance).update(
+        similarity_computed_at=None
+    )
+
+
+@receiver(m2m_changed, sender=Wine.libraries.through)
+@receiver(m2m_changed, sender=Wine.tags.through)
+def touch_on_relation_change(
+    sender, instance, action, model, pk_set, **kwargs
+):
+    """
+    Touch the objects whose representation contains the changed relation.
+
+    The update time validates conditional requests, so it has to change for
+    the wines and the libraries. The tags are touched when their wine count
+    is updated.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if action == "pre_clear":
+        # The cleared objects are not given, load them before clearing
+        pk_set = sender.objects.filter(
+            **{f"{instance._meta.model_name}_id": instance.pk}
+        ).values_list(f"{model._meta.model_name}_id", flat=True)
+    for touched_model, ids in [
+        (instance.__class__, [instance.pk]),
+        (model, pk_set),
+    ]:
+        if touched_model is not Tag:
+            touched_model.touch(ids)
+
+
+@receiver(pre_delete, sender=Wine)
+@receiver(pre_delete, sender=Library)
+@receiver(pre_delete, sender=Tag)
+def touch_related_on_delete(sender, instance, **kwargs):
+    """Touch the objects whose representation contains the deleted object."""
+    if sender is Wine:
+        model, through = Library, Wine.libraries.through
+    elif sender is Library:
+        model, through = Wine, Wine.libraries.through
+    else:
+        model, through = Wine, Wine.tags.through
+    model.touch(
+        through.objects.filter(
+            **{f"{sender._meta.model_name}_id": instance.pk}
+        ).values_list(f"{model._meta.model_name}_id", flat=True)
+    )
+
+
+def has_public_libraries(library_ids):
+    """Return if any of the libraries is public."""
+    return Library.objects.filter(
+        pk__in=library_ids, public__in=[True]
+    ).exists()
+
+
+@receiver(post_save, sender=Library)
+@receiver(post_delete, sender=Library)
+def invalidate_public_libraries_on_library_change(sender, instance, **kwargs):
+    """Invalidate the public libraries if a public library changes."""
+    if instance.public or getattr(instance, "loaded_public", False):
+        bump_public_libraries_version()
+    # Remember the stored visibility for further changes
+    instance.loaded_public = instance.public
+
+
+@receiver(m2m_changed, sender=Wine.libraries.through)
+def invalidate_public_libraries_on_wines_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Invalidate the public libraries if their wines change."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # The wines of a library changed
+        changed = instance.public
+    elif action == "pre_clear":
+        # All libraries of a wine are removed
+        changed = has_public_libraries(
+            sender.objects.filter(wine_id=instance.pk).values("library_id")
+        )
+    else:
+        changed = has_public_libraries(pk_set)
+    if changed:
+        bump_public_libraries_version()
+
+
+@receiver(pre_delete, sender=Wine)
+def invalidate_public_libraries_on_wine_delete(sender, instance, **kwargs):
+    """Invalidate the public libraries which lose the deleted wine."""
+    if has_public_libraries(
+        Wine.libraries.through.objects.filter(wine_id=instance.pk).values(
+            "library_id"
+        )
+    ):
+        bump_public_libraries_version()
+
+
+@receiver(m2m_changed, sender=Wine.tags.through)
+def update_tag_counts_on_relation_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Update the wine counts of the tags whose wines changed."""
+    if reverse and action in ("post_add", "post_remove", "post_clear"):
+        # The wines of a tag changed
+        recount_tags([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        recount_tags(pk_set)
+    elif action == "pre_clear":
+        # All tags of a wine are removed
+        decrement_tags(
+            sender.objects.filter(wine_id=instance.pk).values("tag_id")
+        )
+
+
+@receiver(pre_delete, sender=Wine)
+def update_tag_counts_on_wine_delete(sender, instance, **kwargs):
+    """Decrement the wine counts of the tags of the deleted wine."""
+    decrement_tags(
+        Wine.tags.through.objects.filter(wine_id=instance.pk).values("tag_id")
+    )
+
+
+@receiver(post_save, sender=Wine)
+@receiver(post_save, sender=Winery)
+@receiver(post_save, sender=Variety)
+@receiver(post_save, sender=Tag)
+def update_autocomplete_on_save(sender, instance, created, raw, **kwargs):
+    """Add the name of the saved object to the autocomplete index."""
+    if raw:
+        return
+    kind = autocomplete.get_kind(sender)
+    index = autocomplete.index
+    if created:
+        old_name = None
+    elif hasattr(instance, "loaded_name"):
+        old_name = instance.loaded_name
+        if old_name == instance.name:
+            return
+    else:
+        # The previous name is unknown, load all names again
+        transaction.on_commit(index.invalidate)
+        return
+    name = instance.name
+
+    def replace_name():
+        if old_name is not None:
+            index.remove(kind, old_name)
+        index.add(kind, name)
+
+    # Rolled back names are not suggested
+    transaction.on_commit(replace_name)
+    # Remember the stored name for further changes
+    instance.loaded_name = name
+
+
+@receiver(post_delete, sender=Wine)
+@receiver(post_delete, sender=Winery)
+@receiver(post_delete, sender=Variety)
+@receiver(post_delete, sender=Tag)
+def update_autocomplete_on_delete(sender, instance, **kwargs):
+    """Remove the name of the deleted object from the autocomplete index."""
+    kind = autocomplete.get_kind(sender)
+    name = getattr(instance, "loaded_name", instance.name)
+    transaction.on_commit(lambda: autocomplete.index.remove(kind, name))
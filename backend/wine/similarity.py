@@ -0,0 +1,295 @@
+"""
+Content-based similarity of wines.
+
+Every wine is described by a feature vector of hashed blocks: the TF-IDF
+weighted words of the description, the variety, the names of the region and
+a price band. Every block is normalized and weighted, so the dot product of
+two vectors is the weighted sum of the cosine similarities of the blocks.
+
+The nearest neighbours are computed with NumPy for blocks of wines at once
+and stored in the SimilarWine table, so the similar wines of a wine are read
+with one indexed query. The feature matrix needs about 3 KB per wine.
+
+Wines which have been added or whose features have changed since their
+similar wines have been computed are stale, also if no wine was similar.
+Their neighbours are searched in the whole catalogue, so the full matrix is
+built for every run which has stale wines. The scores are symmetric, so the
+same scores show the other wines which a stale wine enters or leaves as a
+neighbour.
+"""
+import itertools
+import math
+import re
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from wine.models import SimilarWine, Wine
+
+# Weights of the feature blocks, they sum up to one
+BLOCK_WEIGHTS = {
+    "description": 0.5,
+    "variety": 0.25,
+    "region": 0.15,
+    "price": 0.1,
+}
+# Weights of the names within the region block
+REGION_WEIGHTS = {
+    "country__name": 0.5,
+    "province__name": 1.0,
+    "region_1__name": 1.0,
+    "region_2__name": 0.5,
+}
+# Number of hashed columns of the description words
+DEFAULT_DIMENSIONS = 512
+# Number of hashed columns of the variety and of the region names
+NAME_DIMENSIONS = 128
+# Price bands of powers of two, from below 2 to above 2048
+PRICE_BANDS = 12
+# Number of stored neighbours per wine
+DEFAULT_NEIGHBOURS = 10
+# Number of wines whose neighbours are computed at once
+DEFAULT_BLOCK_SIZE = 256
+# Number of scores a block may have at most, which limits the block size of
+# large catalogues
+SCORE_BUDGET = 2**22
+# Words of the description with at least three letters
+WORD_PATTERN = re.compile(r"[a-z]{3,}")
+
+
+def get_bucket(token, dimensions):
+    """Return the column of a token, which is stable across processes."""
+    return zlib.crc32(token.encode()) % dimensions
+
+
+def normalize_rows(block, weight):
+    """Scale the non-empty rows of the block to the length sqrt(weight)."""
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    np.divide(block, norms, out=block, where=norms > 0)
+    block *= math.sqrt(weight)
+
+
+def build_features(queryset=None, dimensions=DEFAULT_DIMENSIONS):
+    """
+    Return the ids of the wines and their feature matrix.
+
+    The rows of the matrix are in the order of the ids. The wines are
+    streamed from the database, so no model instances are created.
+    """
+    if queryset is None:
+        queryset = Wine.objects.all()
+    count = queryset.count()
+    # Columns of the blocks
+    blocks = {}
+    start = 0
+    for name, size in [
+        ("description", dimensions),
+        ("variety", NAME_DIMENSIONS),
+        ("region", NAME_DIMENSIONS),
+        ("price", PRICE_BANDS),
+    ]:
+        blocks[name] = slice(start, start + size)
+        start += size
+    ids = np.zeros(count, dtype=np.int64)
+    matrix = np.zeros((count, start), dtype=np.float32)
+    bands = np.arange(PRICE_BANDS)
+    # Columns of the description words, most words are repeated
+    word_columns = {}
+
+    rows = (
+        queryset.order_by("pk")
+        .values_list(
+            "id", "description", "price", "variety__name", *REGION_WEIGHTS
+        )
+        .iterator(chunk_size=2000)
+    )
+    # Wines created after counting are left out
+    for row, values in enumerate(itertools.islice(rows, count)):
+        pk, description, price, variety, *regions = values
+        ids[row] = pk
+        features = matrix[row]
+        for word in WORD_PATTERN.findall((description or "").lower()):
+            column = word_columns.get(word)
+            if column is None:
+                column = get_bucket(word, dimensions)
+                word_columns[word] = column
+            features[column] += 1
+        if variety:
+            column = get_bucket(variety, NAME_DIMENSIONS)
+            features[blocks["variety"].start + column] = 1
+        for name, weight in zip(regions, REGION_WEIGHTS.values()):
+            if name:
+                column = get_bucket(name, NAME_DIMENSIONS)
+                features[blocks["region"].start + column] += weight
+        if price:
+            # Neighbouring price bands are similar
+            band = min(max(int(math.log2(price)), 0), PRICE_BANDS - 1)
+            features[blocks["price"]] = np.exp(-((bands - band) ** 2) / 2)
+
+    # Weight the words with their sublinear frequency and the inverse
+    # document frequency
+    words = matrix[:, blocks["description"]]
+    np.log1p(words, out=words)
+    document_frequency = np.count_nonzero(words, axis=0)
+    words *= np.log((1 + count) / (1 + document_frequency)) + 1
+    for name, weight in BLOCK_WEIGHTS.items():
+        normalize_rows(matrix[:, blocks[name]], weight)
+    return ids, matrix
+
+
+def iter_neighbours(matrix, rows, count, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Yield the nearest neighbours of the given rows of the matrix.
+
+    For every block of rows, a tuple of the rows, the rows of their
+    neighbours and their scores is yielded. The neighbours are ordered by
+    descending score, rows without other wines have none. Only a block of
+    scores is held in memory.
+    """
+    count = min(count, len(matrix) - 1)
+    for start in range(0, len(rows), block_size):
+        stop = start + block_size
+        block = rows[start:stop]
+        if count <= 0:
+            # There are no other wines
+            empty = np.zeros((len(block), 0), dtype=np.int64)
+            yield block, empty, empty.astype(np.float32)
+            continue
+        scores = matrix[block] @ matrix.T
+        # A wine is not its own neighbour
+        scores[np.arange(len(block)), block] = -np.inf
+        # Select the best scores without sorting all of them
+        top = np.argpartition(scores, -count, axis=1)[:, -count:]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        yield (
+            block,
+            np.take_along_axis(top, order, axis=1),
+            np.take_along_axis(top_scores, order, axis=1),
+        )
+
+
+def get_stale_wine_ids():
+    """
+    Return the ids of the wines without current neighbours.
+
+    These are the wines which have been added or whose features have changed
+    since their neighbours have been computed. Reviews, tags and libraries
+    do not change the features.
+    """
+    return Wine.objects.filter(
+        Q(similarity_computed_at__isnull=True)
+        | Q(features_updated_at__gt=F("similarity_computed_at"))
+    ).values_list("id", flat=True)
+
+
+def get_affected_rows(
+    ids, matrix, stale_rows, neighbours, block_size=DEFAULT_BLOCK_SIZE
+):
+    """
+    Return the rows of the other wines whose neighbours may change.
+
+    These are the wines with a stale wine among their stored neighbours and
+    the wines to which a stale wine is more similar than
+    their least similar neighbour. Wines with fewer neighbours accept every
+    similar wine.
+    """
+    affected = np.zeros(len(ids), dtype=bool)
+    thresholds = np.zeros(len(ids), dtype=np.float32)
+    lists = np.array(
+        SimilarWine.objects.values("wine_id")
+        .annotate(count=Count("id"), min_score=Min("score"))
+        .values_list("wine_id", "count", "min_score")
+        .order_by(),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    # The ids are sorted, find the rows of the wines with neighbours
+    wine_ids = lists[:, 0].astype(np.int64)
+    rows = np.minimum(np.searchsorted(ids, wine_ids), max(len(ids) - 1, 0))
+    found = ids[rows] == wine_ids
+    rows, lists = rows[found], lists[found]
+    full = lists[:, 1] >= neighbours
+    thresholds[rows[full]] = lists[full, 2]
+    holders = SimilarWine.objects.filter(
+        similar__in=get_stale_wine_ids()
+    ).values_list("wine_id", flat=True)
+    affected[np.isin(ids, list(holders))] = True
+    # Best score of a stale wine per wine
+    best = np.full(len(ids), -np.inf, dtype=np.float32)
+    for start in range(0, len(stale_rows), block_size):
+        stop = start + block_size
+        block = stale_rows[start:stop]
+        scores = matrix[block] @ matrix.T
+        scores[np.arange(len(block)), block] = -np.inf
+        np.maximum(best, scores.max(axis=0), out=best)
+    affected |= best > thresholds
+    affected[stale_rows] = False
+    return np.flatnonzero(affected)
+
+
+def compute_similar_wines(
+    only_stale=False,
+    neighbours=DEFAULT_NEIGHBOURS,
+    dimensions=DEFAULT_DIMENSIONS,
+    block_size=DEFAULT_BLOCK_SIZE,
+):
+    """
+    Compute and store the nearest neighbours of the wines.
+
+    With only_stale, the neighbours of the stale wines and of the wines
+    whose neighbours they may change are computed against the whole
+    catalogue, the neighbours of the other wines are kept. Nothing is built
+    without stale wines. Return the number of wines whose neighbours were
+    computed.
+    """
+    if only_stale:
+        stale_ids = list(get_stale_wine_ids())
+        if not stale_ids:
+            return 0
+    ids, matrix = build_features(dimensions=dimensions)
+    block_size = max(1, min(block_size, SCORE_BUDGET // max(len(ids), 1)))
+    if only_stale:
+        stale_rows = np.flatnonzero(np.isin(ids, stale_ids))
+        rows = np.union1d(
+            stale_rows,
+            get_affected_rows(ids, matrix, stale_rows, neighbours, block_size),
+        )
+    else:
+        rows = np.arange(len(ids))
+    computed = 0
+    for block, neighbour_rows, scores in iter_neighbours(
+        matrix, rows, neighbours, block_size
+    ):
+        wine_ids = ids[block].tolist()
+        now = timezone.now()
+        # Replace the neighbours of the block at once
+        with transaction.atomic():
+            SimilarWine.objects.filter(wine_id__in=wine_ids).delete()
+            SimilarWine.objects.bulk_create(
+                [
+                    SimilarWine(
+                        wine_id=wine_id,
+                        similar_id=int(ids[neighbour]),
+                        rank=rank,
+                        score=float(score),
+                        computed_at=now,
+                    )
+                    for wine_id, wine_neighbours, wine_scores in zip(
+                        wine_ids, neighbour_rows, scores
+                    )
+                    for rank, (neighbour, score) in enumerate(
+                        zip(wine_neighbours, wine_scores), 1
+                    )
+                    # Wines without anything in common are not similar
+                    if score > 0
+                ]
+            )
+            # Wines without similar wines are computed as well
+            Wine.objects.filter(pk__in=wine_ids).update(
+                similarity_computed_at=now
+            )
+        computed += len(block)
+    return computed
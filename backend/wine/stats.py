@@ -0,0 +1,179 @@
+"""
+Distributions of the prices and points of a selection of wines.
+
+The counts, means, extremes and histograms are computed with grouped SQL
+aggregates. The quantiles need the sorted values, so the column is streamed
+into a NumPy array and the quantiles of all groups are interpolated at once,
+without loading any model instances.
+"""
+import numpy as np
+from django.db.models import Avg, Count, F, Max, Min
+
+from wine.facets import PRICE_BUCKETS, get_bucket_condition
+from wine.models import Review
+
+# Fields the distributions can be grouped by
+STATS_GROUPS = ("country", "variety")
+# Points buckets as label, lower bound (inclusive) and upper bound
+# (exclusive), following the categories of the wine reviews
+POINTS_BUCKETS = (
+    ("<80", None, 80),
+    ("80-82", 80, 83),
+    ("83-86", 83, 87),
+    ("87-89", 87, 90),
+    ("90-93", 90, 94),
+    ("94-97", 94, 98),
+    ("98-100", 98, None),
+)
+# Quantiles of every distribution
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# Number of groups returned by default and at most
+DEFAULT_STATS_LIMIT = 20
+MAX_STATS_LIMIT = 100
+# Number of rows fetched per query while streaming a column
+CHUNK_SIZE = 2000
+
+
+def get_quantiles(groups, values, count):
+    """
+    Return the quantiles of the values of every group.
+
+    groups holds the index of the group of every value, from zero to count.
+    The quantiles are interpolated linearly between the closest ranks, like
+    numpy.quantile does. Groups without values get NaN.
+    """
+    quantiles = np.full((count, len(QUANTILES)), np.nan)
+    if not len(values):
+        return quantiles
+    # Sort the values by group and value once
+    order = np.lexsort((values, groups))
+    values = values[order]
+    sizes = np.bincount(groups, minlength=count)
+    starts = np.cumsum(sizes) - sizes
+    filled = sizes > 0
+    starts, lasts = starts[filled], (starts + sizes - 1)[filled]
+    positions = starts[:, None] + np.multiply.outer(lasts - starts, QUANTILES)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, lasts[:, None])
+    quantiles[filled] = values[lower] + (positions - lower) * (
+        values[upper] - values[lower]
+    )
+    return quantiles
+
+
+def load_column(queryset, field, group_field=None):
+    """
+    Stream the values of the field and the ids of their groups.
+
+    Return the group ids and the values as arrays, the group ids are zero
+    without a group field.
+    """
+    if group_field is None:
+        rows = queryset.values_list(field, flat=True)
+        values = np.fromiter(
+            rows.iterator(chunk_size=CHUNK_SIZE), dtype=np.float64
+        )
+        return np.zeros(len(values), dtype=np.int64), values
+    rows = queryset.values_list(group_field, field)
+    column = np.fromiter(
+        rows.iterator(chunk_size=CHUNK_SIZE),
+        dtype=[("group", np.int64), ("value", np.float64)],
+    )
+    return column["group"], column["value"]
+
+
+def get_summary(row, buckets, quantiles):
+    """Return the summary of a distribution from its aggregate row."""
+    return {
+        "count": row["count"],
+        "mean": row["mean"] and float(row["mean"]),
+        "min": row["min"] and float(row["min"]),
+        "max": row["max"] and float(row["max"]),
+        "quantiles": {
+            f"p{round(quantile * 100)}": (
+                None if np.isnan(value) else float(value)
+            )
+            for quantile, value in zip(QUANTILES, quantiles)
+        },
+        "histogram": [
+            {"value": label, "count": row[f"bucket_{index}"]}
+            for index, (label, __, __) in enumerate(buckets)
+        ],
+    }
+
+
+def get_distribution(queryset, field, buckets, group_field, limit):
+    """
+    Return the distribution of the field over all rows and per group.
+
+    Without a group field the list of groups is empty. Otherwise the groups
+    with the most values are returned, named by the lookup of the group.
+    """
+    queryset = queryset.order_by().filter(**{f"{field}__isnull": False})
+    aggregates = {
+        "count": Count(field),
+        "mean": Avg(field),
+        "min": Min(field),
+        "max": Max(field),
+        **{
+            f"bucket_{index}": Count(
+                field, filter=get_bucket_condition(field, lower, upper)
+            )
+            for index, (__, lower, upper) in enumerate(buckets)
+        },
+    }
+    summary = get_summary(
+        queryset.aggregate(**aggregates),
+        buckets,
+        get_quantiles(*load_column(queryset, field), 1)[0],
+    )
+    summary["groups"] = []
+    if group_field is None:
+        return summary
+    # Aggregate the groups with the most values with one grouped query
+    rows = list(
+        queryset.filter(**{f"{group_field}__isnull": False})
+        .values(group_field, value=F(f"{group_field}__name"))
+        .annotate(**aggregates)
+        .order_by("-count", "value")[:limit]
+    )
+    if not rows:
+        return summary
+    # Map the group ids of the streamed values to the rows
+    ids = np.array([row[group_field] for row in rows])
+    sorter = np.argsort(ids)
+    group_ids, values = load_column(
+        queryset.filter(**{f"{group_field}__in": ids.tolist()}),
+        field,
+        group_field,
+    )
+    groups = sorter[np.searchsorted(ids, group_ids, sorter=sorter)]
+    quantiles = get_quantiles(groups, values, len(rows))
+    summary["groups"] = [
+        {"value": row["value"], **get_summary(row, buckets, row_quantiles)}
+        for row, row_quantiles in zip(rows, quantiles)
+    ]
+    return summary
+
+
+def get_catalogue_stats(queryset, group_by=None, limit=DEFAULT_STATS_LIMIT):
+    """
+    Return the price and points distributions of the wines of the queryset.
+
+    The prices are those of the wines, the points those of their reviews.
+    Both can be grouped by one of STATS_GROUPS.
+    """
+    wine_ids = queryset.order_by().values("id")
+    return {
+        "group_by": group_by,
+        "price": get_distribution(
+            queryset, "price", PRICE_BUCKETS, group_by, limit
+        ),
+        "points": get_distribution(
+            Review.objects.filter(wine__in=wine_ids),
+            "points",
+            POINTS_BUCKETS,
+            group_by and f"wine__{group_by}",
+            limit,
+        ),
+    }
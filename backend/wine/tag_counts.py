@@ -0,0 +1,49 @@
+"""
+Maintenance of the denormalized wine counts of tags.
+
+Every tag stores the number of wines it is assigned to, so assigned and
+popular tags are listed without joining the wines. The counts are updated
+by the signal receivers of the wine app and by the bulk writes, which do not
+send signals.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from wine.models import Tag, Wine
+
+
+def get_wine_count_subquery():
+    """Return the subquery counting the wines of the outer tag."""
+    return Coalesce(
+        Subquery(
+            Wine.tags.through.objects.filter(tag_id=OuterRef("pk"))
+            .order_by()
+            .values("tag_id")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def recount_tags(tag_ids=None):
+    """
+    Count the wines of the given tags (or all tags) again.
+
+    The counts are written with one query. Return the number of tags.
+    """
+    queryset = Tag.objects.all()
+    if tag_ids is not None:
+        queryset = queryset.filter(pk__in=tag_ids)
+    # The count is part of the representation of the tag
+    return queryset.update(
+        wine_count=get_wine_count_subquery(), updated_at=timezone.now()
+    )
+
+
+def decrement_tags(tag_ids):
+    """Decrement the wine counts of the given tags by one."""
+    Tag.objects.filter(pk__in=tag_ids, wine_count__gt=0).update(
+        wine_count=F("wine_count") - 1, updated_at=timezone.now()
+    )
@@ -0,0 +1,169 @@
+"""Tests for the autocompletion of wine, winery, variety and tag names."""
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.basetestclasses import PrivateAPITestCase
+from wine import autocomplete
+from wine.models import Tag, Wine
+from wine.tests.test_wine_api import create_sample_tag, create_sample_wine
+
+# Store the autocomplete url as constant value
+AUTOCOMPLETE_URL = reverse("wine:wine-autocomplete")
+# Store the wine batch url as constant value
+WINES_BATCH_URL = reverse("wine:wine-batch")
+# Store the wine list url as constant value
+WINES_LIST_URL = reverse("wine:wine-list")
+
+
+class TestPrefixIndex(PrivateAPITestCase):
+    """Test the in-process prefix index."""
+
+    def test_shared_names(self):
+        """Test that names of several objects are stored once."""
+        create_sample_tag(name="Fruity")
+        create_sample_tag(name="fruity")
+        tag = create_sample_tag(name="Fruity")
+        index = autocomplete.PrefixIndex()
+        self.assertEqual(
+            index.search("FRU"), [("tag", "Fruity"), ("tag", "fruity")]
+        )
+        # The name is suggested until its last object is removed
+        index.remove("tag", tag.name)
+        self.assertEqual(len(index.search("fru")), 2)
+        index.remove("tag", tag.name)
+        self.assertEqual(index.search("fru"), [("tag", "fruity")])
+
+    def test_refresh_interval(self):
+        """Test that an expired index is built again."""
+        index = autocomplete.PrefixIndex(refresh_interval=0)
+        self.assertEqual(index.search("dry"), [])
+        create_sample_tag(name="Dry")
+        self.assertEqual(index.search("dry"), [("tag", "Dry")])
+
+
+class TestAutocompleteApi(PrivateAPITestCase):
+    """Test the autocomplete endpoint of the wines."""
+
+    def setUp(self):
+        """Start every test with an index built from its data."""
+        super().setUp()
+        autocomplete.index.invalidate()
+
+    def get_suggestions(self, params):
+        """Request the suggestions and return them as tuples."""
+        res = self.client.get(AUTOCOMPLETE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(item["type"], item["name"]) for item in res.data]
+
+    def test_suggestions(self):
+        """Test the suggestions of all kinds ordered by name."""
+        create_sample_wine(
+            name="Riesling Kabinett", variety="Riesling", winery="Ridge"
+        )
+        create_sample_wine(name="Pinot Noir", winery="Rippon")
+        create_sample_tag(name="Ripe")
+        self.assertEqual(
+            self.get_suggestions({"q": " ri"}),
+            [
+                ("winery", "Ridge"),
+                ("variety", "Riesling"),
+                ("wine", "Riesling Kabinett"),
+                ("tag", "Ripe"),
+                ("winery", "Rippon"),
+            ],
+        )
+        # Restrict the kinds and the number of suggestions
+        self.assertEqual(
+            self.get_suggestions({"q": "ri", "type": ["wine", "variety"]}),
+            [("variety", "Riesling"), ("wine", "Riesling Kabinett")],
+        )
+        self.assertEqual(
+            self.get_suggestions({"q": "RIP", "limit": 1}), [("tag", "Ripe")]
+        )
+
+    def test_no_queries(self):
+        """Test that the built index is searched without queries."""
+        create_sample_wine(name="Riesling Kabinett")
+        self.get_suggestions({"q": "ries"})
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.get_suggestions({"q": "riesling k"}),
+                [("wine", "Riesling Kabinett")],
+            )
+
+    def test_signal_updates(self):
+        """Test that saved and deleted objects update the built index."""
+        self.get_suggestions({"q": "a"})
+        with self.captureOnCommitCallbacks(execute=True):
+            wine = create_sample_wine(name="Chablis")
+            tag = create_sample_tag(name="Crisp")
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.get_suggestions({"q": "c"}),
+                [("wine", "Chablis"), ("tag", "Crisp")],
+            )
+        # Rename the objects
+        with self.captureOnCommitCallbacks(execute=True):
+            wine = Wine.objects.get(pk=wine.pk)
+            wine.name = "Chablis Premier Cru"
+            wine.save()
+            tag = Tag.objects.get(pk=tag.pk)
+            tag.name = "Steely"
+            tag.save()
+        self.assertEqual(
+            self.get_suggestions({"q": "c"}),
+            [("wine", "Chablis Premier Cru")],
+        )
+        # Delete the wine
+        with self.captureOnCommitCallbacks(execute=True):
+            wine.delete()
+        self.assertEqual(self.get_suggestions({"q": "c"}), [])
+        self.assertEqual(self.get_suggestions({"q": "s"}), [("tag", "Steely")])
+
+    def test_batch_writes(self):
+        """Test that wines written in a batch are suggested."""
+        self.get_suggestions({"q": "a"})
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                WINES_BATCH_URL,
+                [{"name": "Barolo", "variety": "Nebbiolo"}],
+                format="json",
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.get_suggestions({"q": "b"}), [("wine", "Barolo")]
+        )
+        self.assertEqual(
+            self.get_suggestions({"q": "n"}), [("variety", "Nebbiolo")]
+        )
+
+    def test_new_lookup_names(self):
+        """Test that lookup names created in bulk are suggested."""
+        self.get_suggestions({"q": "a"})
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                WINES_LIST_URL,
+                {
+                    "name": "Zweigelt",
+                    "variety": "Zweigelt",
+                    "winery": "Umathum",
+                },
+                format="json",
+            )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        # Assert that the built index contains the new names
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.get_suggestions({"q": "z"}),
+                [("variety", "Zweigelt"), ("wine", "Zweigelt")],
+            )
+            self.assertEqual(
+                self.get_suggestions({"q": "u"}), [("winery", "Umathum")]
+            )
+
+    def test_invalid_params(self):
+        """Test that a prefix and known types are required."""
+        for params in [{}, {"q": " "}, {"q": "a", "type": "region"}]:
+            with self.subTest(params=params):
+                res = self.client.get(AUTOCOMPLETE_URL, params)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,99 @@
+"""Tests for the conditional GET requests of the wine app."""
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.basetestclasses import PrivateAPITestCase, create_user
+from wine.tests.test_wine_api import (
+    create_sample_library,
+    create_sample_tag,
+    create_sample_wine,
+    get_wine_add_review_url,
+    get_wine_details_url,
+)
+
+# Store the list urls as constant values
+WINES_LIST_URL = reverse("wine:wine-list")
+LIBRARY_URL = reverse("wine:library-list")
+TAGS_URL = reverse("wine:tag-list")
+
+
+class TestConditionalRequests(PrivateAPITestCase):
+    """Test the validators of lists and details."""
+
+    def assertNotModified(self, url, params=None, **headers):
+        """Assert that the url answers with 304 for the given headers."""
+        res = self.client.get(url, params, **headers)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+        return res
+
+    def assertModified(self, url, etag, params=None):
+        """Assert that the url answers with a new entity tag."""
+        res = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+        return res
+
+    def test_wine_detail(self):
+        """Test that the wine detail is answered conditionally."""
+        wine = create_sample_wine()
+        url = get_wine_details_url(wine.id)
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res["ETag"]
+        # A matching validator is answered without serializing the wine
+        with self.assertNumQueries(1):
+            not_modified = self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified["ETag"], etag)
+        self.assertNotModified(
+            url, HTTP_IF_MODIFIED_SINCE=res["Last-Modified"]
+        )
+        # A review changes the validator of the wine
+        res = self.client.post(
+            get_wine_add_review_url(wine.id), {"points": 90}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertModified(url, etag)
+
+    def test_wine_detail_relations(self):
+        """Test that renamed and added relations change the validator."""
+        wine = create_sample_wine()
+        tag = create_sample_tag()
+        wine.tags.add(tag)
+        url = get_wine_details_url(wine.id)
+        etag = self.client.get(url)["ETag"]
+        # The tag is part of the detail representation
+        tag.name = "Renamed tag"
+        tag.save()
+        etag = self.assertModified(url, etag)["ETag"]
+        wine.libraries.add(create_sample_library())
+        self.assertModified(url, etag)
+
+    def test_library_list(self):
+        """Test that the library list is answered conditionally."""
+        library = create_sample_library()
+        etag = self.client.get(LIBRARY_URL)["ETag"]
+        self.assertNotModified(LIBRARY_URL, HTTP_IF_NONE_MATCH=etag)
+        # Adding a wine changes the wine ids of the library
+        create_sample_wine().libraries.add(library)
+        etag = self.assertModified(LIBRARY_URL, etag)["ETag"]
+        # Removing a library changes the count
+        create_sample_library().delete()
+        self.assertNotModified(LIBRARY_URL, HTTP_IF_NONE_MATCH=etag)
+        library.delete()
+        self.assertModified(LIBRARY_URL, etag)
+
+    def test_list_params(self):
+        """Test that lists with other params have other validators."""
+        create_sample_tag(name="Dry")
+        etag = self.client.get(TAGS_URL)["ETag"]
+        self.assertModified(TAGS_URL, etag, {"name": "Dry"})
+        # The pages of a paginated list are validated separately
+        create_sample_wine()
+        res = self.client.get(WINES_LIST_URL, {"page_size": 1})
+        self.assertNotModified(
+            WINES_LIST_URL, {"page_size": 1}, HTTP_IF_NONE_MATCH=res["ETag"]
+        )
+        # Other users see other lists
+        self.client.force_authenticate(create_user())
+        self.assertModified(TAGS_URL, etag)
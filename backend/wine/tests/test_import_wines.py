@@ -0,0 +1,140 @@
+"""Tests for the import_wines command."""
+import csv
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.test.basetestclasses import create_user
+from wine import search
+from wine.models import Review, Tag, Wine
+
+# Sample rows in the format of the wine reviews dataset
+SAMPLE_ROWS = [
+    {
+        "title": "Quinta dos Avidagos 2011 Avidagos Red (Douro)",
+        "description": "This is ripe and fruity.",
+        "points": "87",
+        "price": "15.0",
+        "country": "Portugal",
+        "province": "Douro",
+        "variety": "Portuguese Red",
+        "winery": "Quinta dos Avidagos",
+        "tags": "fruity;red",
+    },
+    {
+        "title": "Rainstorm 2013 Pinot Gris (Willamette Valley)",
+        "points": "87",
+        "price": "",
+        "country": "US",
+        "variety": "Pinot Gris",
+        "tags": "fruity",
+    },
+    {
+        # Invalid, the price is not a number
+        "title": "Invalid wine",
+        "price": "cheap",
+    },
+    {
+        # Duplicate of the first row
+        "title": "Quinta dos Avidagos 2011 Avidagos Red (Douro)",
+        "points": "90",
+    },
+    {
+        "title": "St. Julian 2013 Reserve Late Harvest Riesling",
+        "points": "",
+        "price": "13",
+        "variety": "Riesling",
+    },
+]
+
+
+class TestImportWinesCommand(TestCase):
+    """Test the import of wine datasets."""
+
+    def setUp(self):
+        """Create the importing user and a temporary directory."""
+        self.user = create_user()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_csv(self, rows):
+        """Write the rows as CSV file and return its path."""
+        path = os.path.join(self.directory.name, "wines.csv")
+        fields = sorted({field for row in rows for field in row})
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def import_wines(self, path, *args):
+        """Run the import command and return its output."""
+        out = StringIO()
+        call_command(
+            "import_wines", path, "--user", self.user.email, *args, stdout=out
+        )
+        return out.getvalue()
+
+    def assertSampleImported(self):
+        """Assert that the valid sample rows have been imported."""
+        self.assertEqual(Wine.objects.count(), 3)
+        self.assertEqual(Review.objects.count(), 2)
+        wine = Wine.objects.get(name=SAMPLE_ROWS[0]["title"])
+        self.assertEqual(wine.price, Decimal("15.00"))
+        self.assertEqual(wine.country.name, "Portugal")
+        self.assertEqual(wine.point_average, Decimal("87"))
+        self.assertEqual(wine.user, self.user)
+        self.assertEqual(
+            sorted(wine.tags.values_list("name", flat=True)),
+            ["fruity", "red"],
+        )
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(
+            dict(Tag.objects.values_list("name", "wine_count")),
+            {"fruity": 2, "red": 1},
+        )
+        # The imported wines are searchable
+        self.assertEqual(
+            list(search.search_wines(Wine.objects.all(), "riesling")),
+            [Wine.objects.get(variety__name="Riesling")],
+        )
+
+    def test_import_csv(self):
+        """Test to import a CSV file in chunks."""
+        path = self.write_csv(SAMPLE_ROWS)
+        out = self.import_wines(path, "--chunk-size", "2", "--workers", "0")
+        self.assertIn(
+            "Imported 3 wines, 2 reviews and 2 tags from 5 rows "
+            "(1 duplicates, 1 invalid)",
+            out,
+        )
+        self.assertSampleImported()
+        # The checkpoint is removed after a complete import
+        self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+
+    def test_import_json_in_process_pool(self):
+        """Test to import a JSON array with validation in processes."""
+        path = os.path.join(self.directory.name, "wines.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(SAMPLE_ROWS, file, indent=2)
+        self.import_wines(path, "--chunk-size", "2", "--workers", "2")
+        self.assertSampleImported()
+
+    def test_resume_from_checkpoint(self):
+        """Test that an import continues after the checkpoint."""
+        path = self.write_csv(SAMPLE_ROWS)
+        # Pretend that the first two rows have been imported before
+        with open(f"{path}.checkpoint", "w", encoding="utf-8") as file:
+            json.dump({"path": os.path.abspath(path), "rows": 2}, file)
+        out = self.import_wines(path, "--workers", "0")
+        self.assertIn("Continuing after row 2.", out)
+        # Only the last row is new, the fourth one is not a duplicate now
+        self.assertEqual(
+            set(Wine.objects.values_list("name", flat=True)),
+            {SAMPLE_ROWS[3]["title"], SAMPLE_ROWS[4]["title"]},
+        )
@@ -1,4 +1,6 @@
 """Tests for the library endpoint."""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
@@ -21,6 +23,35 @@ def get_library_details_url(library_id=None):
     return reverse("wine:library-detail", args=[library_id])
 
 
+def get_library_wines_url(library_id):
+    """Get the url of the wines of a library."""
+    return reverse("wine:library-wines", args=[library_id])
+
+
+def get_library_add_wines_url(library_id):
+    """Get the url to add wines to a library."""
+    return reverse("wine:library-add-wines", args=[library_id])
+
+
+def get_library_remove_wines_url(library_id):
+    """Get the url to remove wines from a library."""
+    return reverse("wine:library-remove-wines", args=[library_id])
+
+
+# Store the public library list url as a constant value
+PUBLIC_LIBRARY_URL = reverse("wine:public-library-list")
+
+
+def get_public_library_details_url(library_id):
+    """Get the public library details url."""
+    return reverse("wine:public-library-detail", args=[library_id])
+
+
+def get_public_library_wines_url(library_id):
+    """Get the url of the wines of a public library."""
+    return reverse("wine:public-library-wines", args=[library_id])
+
+
 class PublicLibraryApiTests(PublicAPITestCase):
     """Test the publicly available tags API."""
 
@@ -32,6 +63,93 @@ class PublicLibraryApiTests(PublicAPITestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class PublicLibraryListApiTests(PublicAPITestCase):
+    """Test the cached public library endpoint."""
+
+    def setUp(self):
+        """Create a user with a public and a private library."""
+        super().setUp()
+        self.user = create_user()
+        self.library = create_sample_library(public=True, user=self.user)
+        self.private_library = create_sample_library(user=self.user)
+        self.wine = create_sample_wine(user=self.user)
+        self.library.wines.add(self.wine)
+
+    def test_list_public_libraries(self):
+        """Test that only public libraries are listed without login."""
+        res = self.client.get(PUBLIC_LIBRARY_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [library["id"] for library in res.data], [self.library.id]
+        )
+        self.assertEqual(res.data[0]["wine_count"], 1)
+        # Proxies may reuse the response
+        self.assertIn("public", res["Cache-Control"])
+        self.assertIn("max-age", res["Cache-Control"])
+        # A private library is not found
+        res = self.client.get(
+            get_public_library_details_url(self.private_library.id)
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        # The endpoint is read only
+        res = self.client.post(PUBLIC_LIBRARY_URL, {"name": "New"})
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_public_library_wines(self):
+        """Test that the wines of public libraries are listed."""
+        res = self.client.get(get_public_library_wines_url(self.library.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [wine["id"] for wine in res.data["results"]], [self.wine.id]
+        )
+        self.assertIn("public", res["Cache-Control"])
+        res = self.client.get(
+            get_public_library_wines_url(self.private_library.id)
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cached_responses(self):
+        """Test that repeated requests are answered from the cache."""
+        url = get_public_library_details_url(self.library.id)
+        for request_url in [PUBLIC_LIBRARY_URL, url]:
+            expected = self.client.get(request_url).data
+            with self.assertNumQueries(0):
+                res = self.client.get(request_url)
+            self.assertEqual(res.data, expected)
+
+    def test_cache_invalidation(self):
+        """Test that changes of public libraries invalidate the cache."""
+        self.client.get(PUBLIC_LIBRARY_URL)
+        # Changes of private libraries keep the cache
+        self.private_library.name = "Renamed"
+        self.private_library.save()
+        create_sample_wine(user=self.user).libraries.add(self.private_library)
+        with self.assertNumQueries(0):
+            self.client.get(PUBLIC_LIBRARY_URL)
+        # Added wines are visible
+        wine = create_sample_wine(user=self.user)
+        self.library.wines.add(wine)
+        res = self.client.get(PUBLIC_LIBRARY_URL)
+        self.assertEqual(res.data[0]["wine_count"], 2)
+        # Deleted wines are removed
+        wine.delete()
+        res = self.client.get(PUBLIC_LIBRARY_URL)
+        self.assertEqual(res.data[0]["wine_count"], 1)
+        # Libraries which become private are removed
+        self.library.public = False
+        self.library.save()
+        res = self.client.get(PUBLIC_LIBRARY_URL)
+        self.assertEqual(res.data, [])
+        # Libraries which become public are added
+        self.private_library.public = True
+        self.private_library.save()
+        res = self.client.get(PUBLIC_LIBRARY_URL)
+        self.assertEqual(
+            [library["id"] for library in res.data],
+            [self.private_library.id],
+        )
+
+
 class PrivateLibraryApiTests(PrivateAPITestCase):
     """Test the private library api endpoint."""
 
@@ -197,10 +315,14 @@ class PrivateLibraryApiTests(PrivateAPITestCase):
         res = self.client.get(url)
         # Assert a successful response
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        # Assert that the wines are in the library
-        self.assertIn("wines", res.data)
-        # Assert that the correct wine library is in the response
-        self.assertIn(library.id, res.data["wines"])
+        # Assert that the number of wines is in the library
+        self.assertEqual(res.data["wine_count"], 1)
+        # Assert that the wine is listed by the wines of the library
+        res = self.client.get(get_library_wines_url(library.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["id"] for item in res.data["results"]], [wine.id]
+        )
 
     def test_add_wine_to_library(self):
         """Test to add a wine to library."""
@@ -223,9 +345,122 @@ class PrivateLibraryApiTests(PrivateAPITestCase):
         res = self.client.patch(url, payload, format="json")
         # Assert a successful response
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        # Assert that both wines are in the response
-        self.assertEqual(res.data["wines"], [first_wine.id, second_wine.id])
+        # Assert that both wines are counted in the response
+        self.assertEqual(res.data["wine_count"], 2)
         # Refresh the library instance from the db
         library.refresh_from_db()
         # Assert that the wines are also stored properly in the database
         self.assertEqual([first_wine, second_wine], list(library.wines.all()))
+
+    def test_library_list_query_count(self):
+        """Test that the libraries are listed with their wine count."""
+        for __ in range(3):
+            library = create_sample_library()
+            for __ in range(2):
+                create_sample_wine().libraries.add(library)
+        # One query for the validator of the list and one for the libraries
+        with self.assertNumQueries(2):
+            res = self.client.get(LIBRARY_URL)
+        self.assertEqual(
+            [library["wine_count"] for library in res.data], [2, 2, 2]
+        )
+
+    def test_library_wines(self):
+        """Test the filtered and paginated wines of a library."""
+        library = create_sample_library()
+        wines = [
+            create_sample_wine(name=name, country="Germany")
+            for name in ["Riesling", "Silvaner", "Spätburgunder"]
+        ]
+        library.wines.add(*wines)
+        # Wines of other libraries are not listed
+        create_sample_wine(country="Germany")
+        url = get_library_wines_url(library.id)
+        res = self.client.get(url, {"ordering": "name", "page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [wine["name"] for wine in res.data["results"]],
+            ["Riesling", "Silvaner"],
+        )
+        res = self.client.get(res.data["next"])
+        self.assertEqual(
+            [wine["name"] for wine in res.data["results"]], ["Spätburgunder"]
+        )
+        self.assertIsNone(res.data["next"])
+        # The wine filters are applied, the library filters are not
+        res = self.client.get(url, {"name": "Silvaner", "country": "Germany"})
+        self.assertEqual(
+            [wine["id"] for wine in res.data["results"]], [wines[1].id]
+        )
+        res = self.client.get(url, {"min_price": "cheap"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        # Private libraries of other users are not found
+        other_library = create_sample_library(user=create_user())
+        res = self.client.get(get_library_wines_url(other_library.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_add_and_remove_wines(self):
+        """Test to add and remove single wines of a library."""
+        library = create_sample_library()
+        wines = [create_sample_wine() for __ in range(3)]
+        library.wines.add(wines[0])
+        # Add a new and an already added wine
+        res = self.client.post(
+            get_library_add_wines_url(library.id),
+            {"wines": [wines[0].id, wines[1].id]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["wine_count"], 2)
+        self.assertEqual(set(library.wines.all()), {wines[0], wines[1]})
+        # Remove a wine, the other wines stay
+        res = self.client.post(
+            get_library_remove_wines_url(library.id),
+            {"wines": [wines[0].id, wines[2].id]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["wine_count"], 1)
+        self.assertEqual(list(library.wines.all()), [wines[1]])
+
+    def test_add_wines_query_count(self):
+        """Test that the queries do not depend on the library size."""
+        query_counts = []
+        for size in [1, 20]:
+            library = create_sample_library()
+            library.wines.add(*[create_sample_wine() for __ in range(size)])
+            payload = {"wines": [create_sample_wine().id]}
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.post(
+                    get_library_add_wines_url(library.id),
+                    payload,
+                    format="json",
+                )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data["wine_count"], size + 1)
+            query_counts.append(len(context.captured_queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_add_invalid_wines(self):
+        """Test that only own wines can be added to own libraries."""
+        library = create_sample_library()
+        own_wine = create_sample_wine()
+        foreign_wine = create_sample_wine(user=create_user())
+        url = get_library_add_wines_url(library.id)
+        res = self.client.post(
+            url, {"wines": [own_wine.id, foreign_wine.id, 0]}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data["wines"]), 2)
+        # Nothing has been added
+        self.assertFalse(library.wines.exists())
+        res = self.client.post(url, {"wines": []}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        # Public libraries of other users can not be changed
+        other_library = create_sample_library(public=True, user=create_user())
+        res = self.client.post(
+            get_library_add_wines_url(other_library.id),
+            {"wines": [own_wine.id]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
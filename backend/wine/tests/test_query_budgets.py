@@ -0,0 +1,164 @@
+"""
+Tests for the query budgets of the wine api.
+
+Every endpoint is requested with 1, 10 and 100 related rows and must need
+the same number of queries, at most its budget.
+"""
+from django.urls import reverse
+from django.utils import timezone
+
+from core.test.basetestclasses import QueryBudgetTestCase, create_user
+from wine.models import Review, SimilarWine, WineRecommendation
+from wine.tests.test_wine_api import (
+    create_sample_library,
+    create_sample_tag,
+    create_sample_wine,
+)
+
+
+class TestWineQueryBudgets(QueryBudgetTestCase):
+    """Test the query budgets of the wine, library and tag endpoints."""
+
+    query_budgets = {
+        "wine_list": 5,
+        "wine_page": 5,
+        "wine_detail": 5,
+        "wine_facets": 5,
+        "wine_stats": 8,
+        "top_wines": 4,
+        "similar_wines": 5,
+        "add_review": 14,
+        "bulk_reviews": 12,
+        "library_list": 2,
+        "library_wines": 5,
+        "public_library_list": 1,
+        "tag_list": 2,
+        "recommendations": 4,
+    }
+
+    def create_wines(self, rows, points=90):
+        """Create wines reviewed by the user with a library and a tag."""
+        library = create_sample_library(user=self.user)
+        tag = create_sample_tag(user=self.user)
+        wines = []
+        for __ in range(rows):
+            wine = create_sample_wine(
+                user=self.user, country="Italy", price=15, points=points
+            )
+            wine.libraries.add(library)
+            wine.tags.add(tag)
+            wines.append(wine)
+        return wines
+
+    def setup_wine_list(self, rows):
+        """List all wines."""
+        self.create_wines(rows)
+        return "get", reverse("wine:wine-list"), {}
+
+    def setup_wine_page(self, rows):
+        """List a page of the wines."""
+        self.create_wines(rows)
+        return "get", reverse("wine:wine-list"), {"page_size": 1000}
+
+    def setup_wine_facets(self, rows):
+        """Count the facets of the wines."""
+        self.create_wines(rows)
+        return "get", reverse("wine:wine-facets"), {"country": "Italy"}
+
+    def setup_wine_stats(self, rows):
+        """Describe the prices and points of the wines per country."""
+        self.create_wines(rows)
+        return "get", reverse("wine:wine-stats"), {"group_by": "country"}
+
+    def setup_top_wines(self, rows):
+        """List the top wines of a country."""
+        self.create_wines(rows)
+        return "get", reverse("wine:wine-top"), {"country": "Italy"}
+
+    def setup_similar_wines(self, rows):
+        """List the similar wines of a wine."""
+        wine, *similar = self.create_wines(rows + 1)
+        SimilarWine.objects.bulk_create(
+            SimilarWine(
+                wine=wine,
+                similar=other,
+                rank=rank,
+                score=0.5,
+                computed_at=timezone.now(),
+            )
+            for rank, other in enumerate(similar)
+        )
+        return "get", reverse("wine:wine-similar", args=[wine.id]), {}
+
+    def setup_add_review(self, rows):
+        """Review a wine with reviews of other users."""
+        wine = create_sample_wine(user=self.user)
+        Review.objects.bulk_create(
+            Review(wine=wine, user=create_user(), points=90)
+            for __ in range(rows)
+        )
+        url = reverse("wine:wine-add-review", args=[wine.id])
+        return "post", url, {"points": 88}
+
+    def setup_bulk_reviews(self, rows):
+        """Review all wines with one request."""
+        wines = self.create_wines(rows)
+        data = [{"wine": wine.id, "points": 85} for wine in wines]
+        return "post", reverse("wine:wine-bulk-reviews"), data
+
+    def setup_library_list(self, rows):
+        """List the libraries with their wines."""
+        for __ in range(rows):
+            library = create_sample_library(user=self.user)
+            library.wines.add(create_sample_wine(user=self.user))
+        return "get", reverse("wine:library-list"), {}
+
+    def setup_library_wines(self, rows):
+        """List the wines of a library."""
+        wine = self.create_wines(rows)[0]
+        library = wine.libraries.get()
+        url = reverse("wine:library-wines", args=[library.id])
+        return "get", url, {"page_size": 1000}
+
+    def setup_public_library_list(self, rows):
+        """List the public libraries of other users."""
+        other_user = create_user()
+        for __ in range(rows):
+            library = create_sample_library(user=other_user, public=True)
+            library.wines.add(create_sample_wine(user=other_user))
+        return "get", reverse("wine:public-library-list"), {}
+
+    def setup_tag_list(self, rows):
+        """List the assigned tags by popularity."""
+        wine = create_sample_wine(user=self.user)
+        for __ in range(rows):
+            wine.tags.add(create_sample_tag(user=self.user))
+        params = {"assigned_only": 1, "ordering": "-wine_count"}
+        return "get", reverse("wine:tag-list"), params
+
+    def setup_recommendations(self, rows):
+        """List the recommended wines of the user."""
+        WineRecommendation.objects.bulk_create(
+            WineRecommendation(
+                user=self.user,
+                wine=wine,
+                rank=rank,
+                score=90,
+                computed_at=timezone.now(),
+            )
+            for rank, wine in enumerate(self.create_wines(rows, points=None))
+        )
+        return "get", reverse("user:recommendations"), {}
+
+    def setup_wine_detail(self, rows):
+        """Retrieve a wine with libraries, tags and reviews."""
+        wine = create_sample_wine(user=self.user)
+        for __ in range(rows):
+            library = create_sample_library(user=self.user)
+            library.wines.add(wine, create_sample_wine(user=self.user))
+            wine.tags.add(create_sample_tag(user=self.user))
+        Review.objects.bulk_create(
+            Review(wine=wine, user=create_user(), points=90)
+            for __ in range(rows)
+        )
+        return "get", reverse("wine:wine-detail", args=[wine.id]), {}
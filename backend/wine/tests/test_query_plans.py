@@ -0,0 +1,153 @@
+"""
+Tests for the query plans of the filters and hot paths.
+
+Every supported filter is requested through the api, and the query plan of
+the executed queries must not contain a full scan of the filtered table.
+"""
+import re
+from unittest import skipUnless
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.test.basetestclasses import PrivateAPITestCase
+from wine.filters import WineFilter
+from wine.tests.test_wine_api import create_sample_library, create_sample_wine
+
+# Store the list urls as constant values
+WINES_LIST_URL = reverse("wine:wine-list")
+LIBRARY_URL = reverse("wine:library-list")
+TAGS_URL = reverse("wine:tag-list")
+WINES_TOP_URL = reverse("wine:wine-top")
+
+# Filter params of the wine list with a sample value. There is no exact
+# filter of the description, it is searched with q, which uses the FTS5 index.
+WINE_FILTERS = {
+    "q": "riesling",
+    "name": "Riesling",
+    "price": "10.00",
+    "min_price": "10",
+    "max_price": "20",
+    "designation": "Reserve",
+    "variety": "Riesling",
+    "region_1": "Mosel",
+    "region_2": "Mosel",
+    "province": "Mosel",
+    "country": "Germany",
+    "winery": "Dr. Loosen",
+    "min_point_average": "80",
+    "max_point_average": "90",
+}
+
+
+@skipUnless(connection.vendor == "sqlite", "Query plans of SQLite")
+class TestQueryPlans(PrivateAPITestCase):
+    """Test that the filters do not scan whole tables."""
+
+    def setUp(self):
+        """Create sample data, so the queries are not trivial."""
+        super().setUp()
+        for __ in range(3):
+            create_sample_library()
+            create_sample_wine()
+
+    def test_wine_filters_are_tested(self):
+        """Test that every filter of the wine list has a sample value."""
+        self.assertEqual(set(WineFilter.base_filters), set(WINE_FILTERS))
+
+    def get_full_scans(self, url, params, table):
+        """
+        Request the url and return the full scans of the table.
+
+        The query plan of every executed query which selects from the table
+        is checked.
+        """
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, 200)
+        scan = re.compile(rf"^SCAN (TABLE )?{table}\b")
+        scans = []
+        for query in context.captured_queries:
+            if (
+                not query["sql"].startswith("SELECT")
+                or table not in query["sql"]
+            ):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                details = [row[-1] for row in cursor.fetchall()]
+            scans += [detail for detail in details if scan.match(detail)]
+        return scans
+
+    def test_wine_filters(self):
+        """Test that every wine filter uses an index."""
+        for name, value in WINE_FILTERS.items():
+            with self.subTest(filter=name):
+                self.assertEqual(
+                    self.get_full_scans(
+                        WINES_LIST_URL, {name: value}, "wine_wine"
+                    ),
+                    [],
+                )
+
+    def test_combined_wine_filters(self):
+        """Test combinations of filters which share an index."""
+        for params in [
+            {"country": "Germany", "province": "Mosel"},
+            {"variety": "Riesling", "max_price": "20"},
+            {"q": "riesling", "min_price": "10"},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.get_full_scans(WINES_LIST_URL, params, "wine_wine"),
+                    [],
+                )
+
+    def test_wine_pagination(self):
+        """Test that the pages of the wine list use an index."""
+        for ordering in ["-created_at", "-updated_at", "name"]:
+            res = self.client.get(
+                WINES_LIST_URL, {"page_size": 1, "ordering": ordering}
+            )
+            with self.subTest(ordering=ordering):
+                self.assertEqual(
+                    self.get_full_scans(res.data["next"], {}, "wine_wine"),
+                    [],
+                )
+
+    def test_library_visibility(self):
+        """Test that the visible and own libraries are found by index."""
+        for params in [{}, {"only_mine": 1}, {"name": "Favourites"}]:
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.get_full_scans(LIBRARY_URL, params, "wine_library"),
+                    [],
+                )
+
+    def test_assigned_tags(self):
+        """Test that the assigned tags are joined by index."""
+        self.assertEqual(
+            self.get_full_scans(
+                TAGS_URL, {"assigned_only": 1}, "wine_wine_tags"
+            ),
+            [],
+        )
+        self.assertEqual(
+            self.get_full_scans(TAGS_URL, {"name": "Dry"}, "wine_tag"), []
+        )
+
+    def test_top_wine_segments(self):
+        """Test that the segments of the leaderboard are read by index."""
+        for params in [
+            {"country": "Germany"},
+            {"variety": "Riesling"},
+            {"price_band": "10-20"},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.get_full_scans(
+                        WINES_TOP_URL, params, "wine_wineranking"
+                    ),
+                    [],
+                )
@@ -0,0 +1,179 @@
+"""Tests for the leaderboard of the top wines."""
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.basetestclasses import PrivateAPITestCase, create_user
+from wine.models import Country, RankingTotals, Review, WineRanking
+from wine.tests.test_wine_api import create_sample_wine
+
+# Store the leaderboard url as constant value
+WINES_TOP_URL = reverse("wine:wine-top")
+
+
+def get_names(res):
+    """Return the wine names of the leaderboard response."""
+    return [item["wine"]["name"] for item in res.data]
+
+
+@override_settings(WINE_RANKING_PRIOR_COUNT=2, WINE_RANKING_PRIOR_POINTS="85")
+class TestWineRankingsApi(PrivateAPITestCase):
+    """Test the leaderboard of the wine api."""
+
+    def setUp(self):
+        """Create reviewed wines in different segments."""
+        super().setUp()
+        self.other_user = create_user()
+        # A single perfect review
+        self.lucky = create_sample_wine(
+            name="Lucky", country="Italy", price=8, points=100
+        )
+        # Many very good reviews
+        self.classic = create_sample_wine(
+            name="Classic", country="France", variety="Pinot Noir", price=30
+        )
+        for user in [self.user, self.other_user, create_user()]:
+            Review.objects.create(user=user, wine=self.classic, points=96)
+        self.plain = create_sample_wine(
+            name="Plain", country="France", price=15, points=84
+        )
+        create_sample_wine(name="Unreviewed", country="France")
+
+    def test_bayesian_score(self):
+        """Test that a single review does not dominate the leaderboard."""
+        res = self.client.get(WINES_TOP_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_names(res), ["Classic", "Lucky", "Plain"])
+        # (2 * 85 + 3 * 96) / (2 + 3)
+        self.assertAlmostEqual(res.data[0]["score"], 91.6)
+        self.assertAlmostEqual(res.data[1]["score"], 90.0)
+
+    def test_segments(self):
+        """Test the leaderboards by country, variety and price band."""
+        res = self.client.get(WINES_TOP_URL, {"country": "France"})
+        self.assertEqual(get_names(res), ["Classic", "Plain"])
+        res = self.client.get(WINES_TOP_URL, {"variety": "Pinot Noir"})
+        self.assertEqual(get_names(res), ["Classic"])
+        res = self.client.get(WINES_TOP_URL, {"price_band": "10-20"})
+        self.assertEqual(get_names(res), ["Plain"])
+        res = self.client.get(WINES_TOP_URL, {"country": "Chile"})
+        self.assertEqual(res.data, [])
+        res = self.client.get(WINES_TOP_URL, {"limit": "1"})
+        self.assertEqual(get_names(res), ["Classic"])
+
+    def test_invalid_params(self):
+        """Test that unknown price bands and limits are rejected."""
+        res = self.client.get(WINES_TOP_URL, {"price_band": "cheap"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(WINES_TOP_URL, {"limit": "many"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_incremental_refresh(self):
+        """Test that the rankings follow reviews and wine changes."""
+        Review.objects.create(
+            user=self.other_user, wine=self.lucky, points=100
+        )
+        Review.objects.create(user=create_user(), wine=self.lucky, points=100)
+        res = self.client.get(WINES_TOP_URL)
+        self.assertEqual(get_names(res), ["Lucky", "Classic", "Plain"])
+        # The segment of the wine follows its attributes
+        self.lucky.refresh_from_db()
+        self.lucky.country = Country.objects.get(name="France")
+        self.lucky.save()
+        res = self.client.get(WINES_TOP_URL, {"country": "France"})
+        self.assertEqual(get_names(res), ["Lucky", "Classic", "Plain"])
+        # Wines without reviews leave the leaderboard
+        Review.objects.filter(wine=self.plain).delete()
+        self.assertFalse(WineRanking.objects.filter(wine=self.plain).exists())
+
+    def test_rebuild_command(self):
+        """Test that the command ranks all reviewed wines."""
+        WineRanking.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_wine_rankings", "--batch-size", "2", stdout=out)
+        self.assertIn("Ranked 3 wines with 85.00 points", out.getvalue())
+        res = self.client.get(WINES_TOP_URL)
+        self.assertEqual(get_names(res), ["Classic", "Lucky", "Plain"])
+
+    @override_settings(WINE_RANKING_PRIOR_POINTS=None)
+    def test_catalogue_prior(self):
+        """Test that the average of the catalogue is the default prior."""
+        call_command("rebuild_wine_rankings", stdout=StringIO())
+        # (100 + 3 * 96 + 84) / 5 reviews
+        ranking = WineRanking.objects.get(wine=self.plain)
+        self.assertAlmostEqual(ranking.score, (2 * 94.4 + 84) / 3)
+
+
+class TestCataloguePrior(PrivateAPITestCase):
+    """Test the leaderboard with the average of the catalogue as prior."""
+
+    def test_prior_follows_catalogue(self):
+        """Test that the scores follow the average of new reviews."""
+        users = [create_user() for __ in range(10)]
+        # The first review of the catalogue is a perfect one
+        lucky = create_sample_wine(name="Lucky", points=100)
+        classic = create_sample_wine(name="Classic")
+        for user in users:
+            Review.objects.create(user=user, wine=classic, points=95)
+        for __ in range(5):
+            wine = create_sample_wine()
+            for user in users[:2]:
+                Review.objects.create(user=user, wine=wine, points=85)
+        # The totals of the catalogue follow the reviews
+        totals = RankingTotals.objects.get()
+        self.assertEqual(totals.review_count, 21)
+        self.assertEqual(totals.points_sum, 100 + 10 * 95 + 10 * 85)
+        # The reviews are scored with the prior of the first review...
+        ranking = WineRanking.objects.get(wine=classic)
+        self.assertAlmostEqual(ranking.score, (10 * 100 + 950) / 20)
+        # ... until the periodic refresh rescores all wines
+        out = StringIO()
+        call_command("refresh_wine_ranking_prior", stdout=out)
+        self.assertIn("Rescored the rankings", out.getvalue())
+        res = self.client.get(WINES_TOP_URL, {"limit": "2"})
+        self.assertEqual(get_names(res), ["Classic", "Lucky"])
+        prior_points = (100 + 10 * 95 + 10 * 85) / 21
+        scores = dict(WineRanking.objects.values_list("wine", "score"))
+        self.assertAlmostEqual(
+            scores[lucky.id], (10 * prior_points + 100) / 11
+        )
+        self.assertAlmostEqual(
+            scores[classic.id], (10 * prior_points + 950) / 20
+        )
+        # The scores are kept while the average does not move
+        out = StringIO()
+        call_command("refresh_wine_ranking_prior", stdout=out)
+        self.assertIn("Kept the rankings", out.getvalue())
+
+    def test_review_writes_are_incremental(self):
+        """Test that a review neither aggregates nor rescores all wines."""
+        wine = create_sample_wine(points=90)
+        for __ in range(3):
+            create_sample_wine(points=80)
+        with CaptureQueriesContext(connection) as context:
+            Review.objects.create(user=create_user(), wine=wine, points=100)
+        statements = [query["sql"] for query in context.captured_queries]
+        self.assertFalse([sql for sql in statements if "SUM(" in sql.upper()])
+        ranking_updates = [
+            sql
+            for sql in statements
+            if sql.startswith('UPDATE "wine_wineranking"')
+        ]
+        self.assertFalse(ranking_updates)
+        self.assertEqual(RankingTotals.objects.get().review_count, 5)
+
+    def test_rebuild_counts_totals(self):
+        """Test that drifted totals are counted again by the rebuild."""
+        create_sample_wine(points=90)
+        RankingTotals.objects.update(review_count=7, points_sum=10)
+        call_command("rebuild_wine_rankings", stdout=StringIO())
+        totals = RankingTotals.objects.get()
+        self.assertEqual(
+            (totals.review_count, totals.points_sum, totals.prior_points),
+            (1, 90, 90.0),
+        )
@@ -0,0 +1,75 @@
+"""Tests for the denormalized rating aggregates of wines."""
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+
+from core.test.basetestclasses import PrivateAPITestCase
+from wine.models import Review, Wine
+from wine.tests.test_wine_api import (
+    create_sample_wine,
+    get_wine_add_review_url,
+)
+
+
+class TestRatingAggregates(PrivateAPITestCase):
+    """Test the maintenance of the rating aggregates."""
+
+    def assertAggregates(self, wine, review_count, points_sum, points_avg):
+        """Assert the stored rating aggregates of the wine."""
+        wine.refresh_from_db()
+        self.assertEqual(wine.review_count, review_count)
+        self.assertEqual(wine.points_sum, points_sum)
+        self.assertEqual(wine.points_avg, points_avg)
+
+    def test_add_review_updates_aggregates(self):
+        """Test that adding reviews through the api updates the wine."""
+        # Create sample wine
+        wine = create_sample_wine()
+        url = get_wine_add_review_url(wine.id)
+        # Add two reviews
+        for points in [80, 91]:
+            self.client.post(url, {"points": points}, format="json")
+        # Assert the aggregates
+        self.assertAggregates(wine, 2, 171, Decimal("85.50"))
+        self.assertEqual(wine.point_average, Decimal("85.50"))
+
+    def test_edit_and_delete_review(self):
+        """Test that edited and deleted reviews update the wine."""
+        # Create a wine with one review
+        wine = create_sample_wine(points=80)
+        other_wine = create_sample_wine()
+        review = Review.objects.create(wine=wine, points=90, user=self.user)
+        self.assertAggregates(wine, 2, 170, Decimal("85.00"))
+        # Edit the points of a loaded review
+        review = Review.objects.get(pk=review.pk)
+        review.points = 70
+        review.save()
+        self.assertAggregates(wine, 2, 150, Decimal("75.00"))
+        # Move the review to another wine
+        review.wine = other_wine
+        review.save()
+        self.assertAggregates(wine, 1, 80, Decimal("80.00"))
+        self.assertAggregates(other_wine, 1, 70, Decimal("70.00"))
+        # Delete the review
+        review.delete()
+        self.assertAggregates(other_wine, 0, 0, None)
+        self.assertEqual(other_wine.point_average, Decimal("0"))
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command reports and fixes drift."""
+        # Create wines with reviews
+        wine = create_sample_wine(points=90)
+        create_sample_wine(points=85)
+        # Let the stored aggregates drift
+        Wine.objects.filter(pk=wine.pk).update(review_count=5, points_sum=1)
+        # Report the drift only
+        out = StringIO()
+        call_command("rebuild_wine_ratings", "--dry-run", stdout=out)
+        self.assertIn("Checked 2 wines, found 1 drifted.", out.getvalue())
+        self.assertAggregates(wine, 5, 1, Decimal("90.00"))
+        # Fix the drift
+        out = StringIO()
+        call_command("rebuild_wine_ratings", stdout=out)
+        self.assertIn("Checked 2 wines, fixed 1 drifted.", out.getvalue())
+        self.assertAggregates(wine, 1, 90, Decimal("90.00"))
@@ -0,0 +1,149 @@
+"""Tests for the collaborative filtering recommendations."""
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.basetestclasses import PrivateAPITestCase, create_user
+from wine import factorization
+from wine.models import Review, WineRecommendation
+from wine.tests.test_wine_api import create_sample_wine
+
+# Store the recommendations url as constant value
+RECOMMENDATIONS_URL = reverse("user:recommendations")
+
+
+def compute_recommendations(*args):
+    """Run the command and return its output."""
+    out = StringIO()
+    call_command("compute_wine_recommendations", *args, stdout=out)
+    return out.getvalue()
+
+
+class TestFactorization(TestCase):
+    """Test the factorization of the ratings."""
+
+    def setUp(self):
+        """Create ratings of two groups of users with opposite tastes."""
+        generator = np.random.default_rng(1)
+        self.users = np.repeat(np.arange(40), 6)
+        self.wines = np.concatenate(
+            [generator.choice(10, 6, replace=False) for __ in range(40)]
+        )
+        # The first half of the users likes the first half of the wines
+        likes = (self.users < 20) == (self.wines < 5)
+        self.points = np.where(likes, 95, 82)
+
+    def test_factorize(self):
+        """Test that the factors predict the points."""
+        mean, user_factors, wine_factors = factorization.factorize(
+            self.users, self.wines, self.points, 40, 10, factors=4
+        )
+        self.assertAlmostEqual(mean, self.points.mean())
+        self.assertLess(
+            factorization.get_rmse(
+                self.users,
+                self.wines,
+                self.points,
+                mean,
+                user_factors,
+                wine_factors,
+            ),
+            1.5,
+        )
+
+    def test_top_wines(self):
+        """Test that rated wines are not recommended."""
+        mean, user_factors, wine_factors = factorization.factorize(
+            self.users, self.wines, self.points, 40, 10, factors=4
+        )
+        results = list(
+            factorization.iter_top_wines(
+                self.users,
+                self.wines,
+                mean,
+                user_factors,
+                wine_factors,
+                2,
+                block_size=16,
+            )
+        )
+        self.assertEqual(
+            [len(users) for users, __, __ in results], [16] * 2 + [8]
+        )
+        users = np.concatenate([users for users, __, __ in results])
+        columns = np.concatenate([columns for __, columns, __ in results])
+        scores = np.concatenate([scores for __, __, scores in results])
+        for user, user_columns in zip(users, columns):
+            rated = set(self.wines[self.users == user])
+            self.assertFalse(rated & set(user_columns))
+            # The users get an unrated wine of their group first
+            liked = set(range(5) if user < 20 else range(5, 10))
+            if liked - rated:
+                self.assertIn(user_columns[0], liked)
+        self.assertTrue(np.all(scores[:, 0] >= scores[:, 1]))
+        self.assertEqual(scores.dtype, np.float32)
+
+    def test_block_size(self):
+        """Test that the blocks of scores shrink with the number of wines."""
+        self.assertEqual(factorization.get_block_size(10, budget=25), 2)
+        self.assertEqual(factorization.get_block_size(100, budget=25), 1)
+        # A million wines are scored for four users at once
+        self.assertEqual(factorization.get_block_size(10**6), 4)
+
+
+class TestRecommendationsApi(PrivateAPITestCase):
+    """Test the recommendations of the user api."""
+
+    def setUp(self):
+        """Create wines which are reviewed by users with similar tastes."""
+        super().setUp()
+        self.wines = [create_sample_wine(name=f"Wine {i}") for i in range(4)]
+        self.other_user = create_user()
+        for user, wine, points in [
+            (self.user, 0, 95),
+            (self.user, 1, 80),
+            (self.other_user, 0, 96),
+            (self.other_user, 1, 81),
+            (self.other_user, 2, 97),
+            (self.other_user, 3, 82),
+        ]:
+            Review.objects.create(
+                user=user, wine=self.wines[wine], points=points
+            )
+
+    def test_recommendations(self):
+        """Test that unreviewed wines are recommended in their order."""
+        output = compute_recommendations("--factors", "2")
+        self.assertIn("Computed the recommendations of 2 users.", output)
+        res = self.client.get(RECOMMENDATIONS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["wine"]["name"] for item in res.data], ["Wine 2", "Wine 3"]
+        )
+        self.assertGreater(res.data[0]["score"], res.data[1]["score"])
+        # Wines which have been reviewed since are left out
+        Review.objects.create(user=self.user, wine=self.wines[2], points=90)
+        res = self.client.get(RECOMMENDATIONS_URL)
+        self.assertEqual(
+            [item["wine"]["name"] for item in res.data], ["Wine 3"]
+        )
+
+    def test_removed_reviews(self):
+        """Test that users without reviews have no recommendations."""
+        third_user = create_user()
+        Review.objects.create(user=third_user, wine=self.wines[0], points=90)
+        compute_recommendations()
+        Review.objects.filter(user=self.user).delete()
+        compute_recommendations()
+        self.assertFalse(
+            WineRecommendation.objects.filter(user=self.user).exists()
+        )
+        self.assertTrue(
+            WineRecommendation.objects.filter(user=third_user).exists()
+        )
+        res = self.client.get(RECOMMENDATIONS_URL)
+        self.assertEqual(res.data, [])
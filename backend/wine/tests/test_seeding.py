@@ -0,0 +1,89 @@
+"""Tests for the synthetic catalogue."""
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from wine import search
+from wine.models import Library, Review, Tag, Wine, WineRanking
+
+
+def seed_catalogue(*args):
+    """Run the command and return its output."""
+    out = StringIO()
+    call_command("seed_catalogue", *args, stdout=out)
+    return out.getvalue()
+
+
+class TestSeedCatalogue(TestCase):
+    """Test the generation of the catalogue."""
+
+    def test_seed_catalogue(self):
+        """Test that the rows and their derived data are consistent."""
+        output = seed_catalogue("--wines", "120", "--chunk-size", "50")
+        self.assertIn("Created 120 wines", output)
+        self.assertEqual(Wine.objects.count(), 120)
+        self.assertEqual(Library.objects.count(), 2 * 2)
+        # The stored rating aggregates match the reviews
+        for wine in Wine.objects.all():
+            points = list(wine.reviews.values_list("points", flat=True))
+            self.assertEqual(wine.review_count, len(points))
+            self.assertEqual(wine.points_sum, sum(points))
+        self.assertEqual(
+            WineRanking.objects.count(),
+            Wine.objects.filter(review_count__gt=0).count(),
+        )
+        for tag in Tag.objects.all():
+            self.assertEqual(tag.wine_count, tag.wines.count())
+        if search.is_supported():
+            wine = Wine.objects.first()
+            self.assertIn(
+                wine,
+                search.search_wines(Wine.objects.all(), wine.name),
+            )
+
+    def test_seed_again(self):
+        """Test that a second catalogue is added with new names."""
+        seed_catalogue("--wines", "10")
+        output = seed_catalogue("--wines", "10", "--seed", "0")
+        self.assertIn("Created 10 wines", output)
+        self.assertEqual(Wine.objects.count(), 20)
+        self.assertGreater(Review.objects.count(), 0)
+
+
+class TestBulkInsert(TestCase):
+    """Test the bulk insert of wines with their ids."""
+
+    def insert_wines(self, prefix):
+        """Insert five wines and assert that their ids are set."""
+        user = get_user_model().objects.create(email=f"{prefix}@example.com")
+        wines = Wine.bulk_insert(
+            [
+                Wine(user=user, name=f"{prefix} {number}")
+                for number in range(5)
+            ],
+            chunk_size=2,
+        )
+        self.assertEqual(
+            [wine.id for wine in wines],
+            [
+                Wine.objects.get(name=f"{prefix} {number}").id
+                for number in range(5)
+            ],
+        )
+
+    def test_returned_ids(self):
+        """Test the ids returned by the backend."""
+        self.insert_wines("Returned")
+
+    def test_fetched_ids(self):
+        """Test to find the ids by name in chunks if none are returned."""
+        with mock.patch.object(
+            type(connection.features),
+            "can_return_rows_from_bulk_insert",
+            False,
+        ):
+            self.insert_wines("Fetched")
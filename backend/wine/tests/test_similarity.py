@@ -0,0 +1,198 @@
+"""Tests for the similar wines."""
+from decimal import Decimal
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.basetestclasses import PrivateAPITestCase
+from wine import similarity
+from wine.models import Review, SimilarWine
+from wine.tests.test_wine_api import create_sample_tag, create_sample_wine
+
+
+def get_similar_wines_url(wine_id):
+    """Return the url of the similar wines of a wine."""
+    return reverse("wine:wine-similar", args=[wine_id])
+
+
+def compute_similar_wines(*args):
+    """Run the command and return its output."""
+    out = StringIO()
+    call_command("compute_similar_wines", *args, stdout=out)
+    return out.getvalue()
+
+
+class TestNeighbours(TestCase):
+    """Test the nearest neighbours of a feature matrix."""
+
+    def test_iter_neighbours(self):
+        """Test that the neighbours are ordered by descending score."""
+        matrix = np.array(
+            [[1, 0], [0.8, 0.6], [0, 1], [0.6, 0.8]], dtype=np.float32
+        )
+        results = list(similarity.iter_neighbours(matrix, np.arange(4), 2, 3))
+        # The rows are computed in blocks
+        self.assertEqual([len(block) for block, __, __ in results], [3, 1])
+        neighbours = np.concatenate([rows for __, rows, __ in results])
+        self.assertEqual(neighbours.tolist(), [[1, 3], [3, 0], [3, 1], [1, 2]])
+        scores = np.concatenate([scores for __, __, scores in results])
+        np.testing.assert_allclose(scores[0], [0.8, 0.6], rtol=1e-6)
+
+    def test_single_row(self):
+        """Test that a single wine has no neighbours."""
+        matrix = np.ones((1, 2), dtype=np.float32)
+        ((block, rows, scores),) = similarity.iter_neighbours(
+            matrix, np.arange(1), 5
+        )
+        self.assertEqual(block.tolist(), [0])
+        self.assertEqual(rows.shape, (1, 0))
+        self.assertEqual(scores.shape, (1, 0))
+
+
+class TestSimilarWinesApi(PrivateAPITestCase):
+    """Test the similar wines of the wine api."""
+
+    def setUp(self):
+        """Create wines of two kinds."""
+        super().setUp()
+        self.riesling = create_sample_wine(
+            name="Mosel Riesling",
+            description="Crisp apple and slate minerality with lime.",
+            variety="Riesling",
+            country="Germany",
+            province="Mosel",
+            price=Decimal("18.00"),
+        )
+        self.other_riesling = create_sample_wine(
+            name="Another Mosel Riesling",
+            description="Green apple, lime and slate on a crisp finish.",
+            variety="Riesling",
+            country="Germany",
+            province="Mosel",
+            price=Decimal("22.00"),
+        )
+        self.malbec = create_sample_wine(
+            name="Mendoza Malbec",
+            description="Dark plum, blackberry and smoky oak tannins.",
+            variety="Malbec",
+            country="Argentina",
+            province="Mendoza",
+            price=Decimal("90.00"),
+        )
+
+    def test_similar_wines(self):
+        """Test that the most similar wine is listed first."""
+        output = compute_similar_wines("--all")
+        self.assertIn("Computed the similar wines of 3 wines.", output)
+        res = self.client.get(get_similar_wines_url(self.riesling.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["wine"]["name"] for item in res.data],
+            ["Another Mosel Riesling", "Mendoza Malbec"],
+        )
+        self.assertEqual(res.data[0]["wine"]["variety"], "Riesling")
+        self.assertGreater(res.data[0]["score"], res.data[1]["score"])
+        # The neighbours are stored in their order
+        self.assertEqual(
+            list(
+                SimilarWine.objects.filter(wine=self.riesling)
+                .order_by("rank")
+                .values_list("rank", "similar")
+            ),
+            [(1, self.other_riesling.id), (2, self.malbec.id)],
+        )
+
+    def test_query_count(self):
+        """Test that the neighbours are read with a fixed number of queries."""
+        compute_similar_wines("--all")
+        # The wine, its neighbours and their libraries, tags and reviews
+        with self.assertNumQueries(5):
+            res = self.client.get(get_similar_wines_url(self.riesling.id))
+        self.assertEqual(len(res.data), 2)
+
+    def test_stale_wines(self):
+        """Test that only wines with changed features are computed."""
+        compute_similar_wines("--all")
+        self.assertIn(
+            "Computed the similar wines of 0 wines.", compute_similar_wines()
+        )
+        # Reviews and tags do not change the features
+        Review.objects.create(user=self.user, wine=self.malbec, points=90)
+        self.malbec.tags.add(create_sample_tag())
+        self.assertIn(
+            "Computed the similar wines of 0 wines.", compute_similar_wines()
+        )
+        wine = create_sample_wine(
+            name="Saar Riesling",
+            description="Slate, lime and apple.",
+            variety="Riesling",
+        )
+        self.malbec.description = "Plum and oak."
+        self.malbec.save()
+        # The lists of the other wines are not full, they are computed too
+        self.assertIn(
+            "Computed the similar wines of 4 wines.", compute_similar_wines()
+        )
+        self.assertEqual(SimilarWine.objects.filter(wine=wine).count(), 3)
+        self.assertTrue(
+            SimilarWine.objects.filter(
+                wine=self.riesling, similar=wine
+            ).exists()
+        )
+
+    def test_wines_without_similar_wines(self):
+        """Test that wines without similar wines are not stale again."""
+        # The wine has nothing in common with the other wines
+        wine = create_sample_wine(name="Mystery")
+        self.assertIn(
+            "Computed the similar wines of 4 wines.", compute_similar_wines()
+        )
+        self.assertFalse(SimilarWine.objects.filter(wine=wine).exists())
+        self.assertIn(
+            "Computed the similar wines of 0 wines.", compute_similar_wines()
+        )
+
+    def test_affected_wines(self):
+        """Test that other wines are computed if their neighbours change."""
+        compute_similar_wines("--all", "--neighbours", "1")
+        reserva = create_sample_wine(
+            name="Mendoza Malbec Reserva",
+            description="Dark plum, blackberry and smoky oak tannins.",
+            variety="Malbec",
+            country="Argentina",
+            province="Mendoza",
+            price=Decimal("90.00"),
+        )
+        # The new wine is the best neighbour of the other Malbec only
+        self.assertIn(
+            "Computed the similar wines of 2 wines.",
+            compute_similar_wines("--neighbours", "1"),
+        )
+        self.assertEqual(
+            SimilarWine.objects.get(wine=self.malbec).similar, reserva
+        )
+        self.assertEqual(
+            SimilarWine.objects.get(wine=self.riesling).similar,
+            self.other_riesling,
+        )
+        # Deleted neighbours are replaced
+        self.other_riesling.delete()
+        self.assertIn(
+            "Computed the similar wines of 1 wines.",
+            compute_similar_wines("--neighbours", "1"),
+        )
+        self.assertTrue(
+            SimilarWine.objects.filter(wine=self.riesling).exists()
+        )
+
+    def test_not_computed(self):
+        """Test the similar wines of unknown and not computed wines."""
+        res = self.client.get(get_similar_wines_url(self.riesling.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+        res = self.client.get(get_similar_wines_url(0))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,124 @@
+"""Tests for the catalogue statistics."""
+from decimal import Decimal
+
+import numpy as np
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from core.test.basetestclasses import PrivateAPITestCase, create_user
+from wine.models import Review
+from wine.stats import QUANTILES, get_quantiles
+from wine.tests.test_wine_api import create_sample_wine
+
+# Store the stats url as constant value
+WINES_STATS_URL = reverse("wine:wine-stats")
+
+
+def get_histogram(distribution):
+    """Return the histogram of a distribution as dict."""
+    return {
+        bucket["value"]: bucket["count"]
+        for bucket in distribution["histogram"]
+    }
+
+
+class TestQuantiles(TestCase):
+    """Test the quantiles of grouped values."""
+
+    def test_quantiles(self):
+        """Test that the quantiles of every group match numpy.quantile."""
+        generator = np.random.default_rng(1)
+        groups = generator.integers(0, 4, 200)
+        values = generator.normal(size=200)
+        # The last group has no values
+        groups[groups == 3] = 2
+        quantiles = get_quantiles(groups, values, 4)
+        for group in range(3):
+            np.testing.assert_allclose(
+                quantiles[group],
+                np.quantile(values[groups == group], QUANTILES),
+            )
+        self.assertTrue(np.all(np.isnan(quantiles[3])))
+        # A single value is every quantile
+        np.testing.assert_allclose(
+            get_quantiles(np.zeros(1, dtype=int), np.ones(1), 1)[0], 1
+        )
+
+
+class TestWineStatsApi(PrivateAPITestCase):
+    """Test the statistics of the wine api."""
+
+    def setUp(self):
+        """Create wines in two countries with reviews."""
+        super().setUp()
+        for price, points in [(8, 84), (12, 88), (16, 92)]:
+            create_sample_wine(
+                country="Germany", price=Decimal(price), points=points
+            )
+        wine = create_sample_wine(
+            country="France", variety="Pinot Noir", price=Decimal("120.00")
+        )
+        for points in [95, 99]:
+            Review.objects.create(user=create_user(), wine=wine, points=points)
+        create_sample_wine()
+
+    def test_stats(self):
+        """Test the distributions of all filtered wines."""
+        res = self.client.get(WINES_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        price = res.data["price"]
+        self.assertEqual(price["count"], 4)
+        self.assertAlmostEqual(price["mean"], 39.0)
+        self.assertEqual((price["min"], price["max"]), (8.0, 120.0))
+        self.assertEqual(price["quantiles"]["p50"], 14.0)
+        self.assertEqual(
+            get_histogram(price),
+            {"<10": 1, "10-20": 2, "20-50": 0, "50-100": 0, ">=100": 1},
+        )
+        self.assertEqual(price["groups"], [])
+        points = res.data["points"]
+        self.assertEqual(points["count"], 5)
+        self.assertEqual(points["quantiles"]["p50"], 92.0)
+        self.assertEqual(get_histogram(points)["94-97"], 1)
+        # Assert that the filters are applied
+        res = self.client.get(WINES_STATS_URL, {"max_price": 20})
+        self.assertEqual(res.data["price"]["count"], 3)
+        self.assertEqual(res.data["points"]["max"], 92.0)
+
+    def test_grouped_stats(self):
+        """Test the distributions per country."""
+        res = self.client.get(WINES_STATS_URL, {"group_by": "country"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        groups = res.data["points"]["groups"]
+        self.assertEqual(
+            [group["value"] for group in groups], ["Germany", "France"]
+        )
+        self.assertEqual(groups[0]["quantiles"]["p50"], 88.0)
+        self.assertEqual(groups[1]["quantiles"]["p50"], 97.0)
+        self.assertEqual(groups[1]["count"], 2)
+        # Assert that the number of groups can be limited
+        res = self.client.get(
+            WINES_STATS_URL, {"group_by": "variety", "limit": 1}
+        )
+        self.assertEqual(
+            [group["value"] for group in res.data["price"]["groups"]],
+            ["Pinot Noir"],
+        )
+
+    def test_invalid_group(self):
+        """Test that unknown groups are rejected."""
+        res = self.client.get(WINES_STATS_URL, {"group_by": "winery"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stats_cache_invalidation(self):
+        """Test that cached statistics are invalidated by new reviews."""
+        self.client.get(WINES_STATS_URL, {"country": "France"})
+        # Assert that the cached statistics are returned without queries
+        with self.assertNumQueries(0):
+            res = self.client.get(WINES_STATS_URL, {"country": "France"})
+        self.assertEqual(res.data["points"]["count"], 2)
+        wine = create_sample_wine(country="France")
+        Review.objects.create(user=self.user, wine=wine, points=90)
+        res = self.client.get(WINES_STATS_URL, {"country": "France"})
+        self.assertEqual(res.data["points"]["count"], 3)
@@ -6,6 +6,7 @@ from rest_framework import status
 from core.test.basetestclasses import PublicAPITestCase, PrivateAPITestCase
 from wine.models import Tag, Wine
 from wine.serializers import TagSerializer
+from wine.tests.test_wine_api import create_sample_wine
 
 
 # Store the tags url as a constant value
@@ -89,6 +90,8 @@ class PrivateTagsApiTest(PrivateAPITestCase):
         wine.save()
         # Access tags url and pass the assigned tags only parameter
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
+        # Load the wine count of the first tag
+        tag1.refresh_from_db()
         # Serialize both tags
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
@@ -96,3 +99,80 @@ class PrivateTagsApiTest(PrivateAPITestCase):
         self.assertIn(serializer1.data, res.data)
         # ... and the second not
         self.assertNotIn(serializer2.data, res.data)
+
+    def test_tags_cursor_pagination(self):
+        """Test that paginated tags keep the ordering by name."""
+        # Create 3 tags
+        for name in ["Dry", "Fruity", "Sweet"]:
+            Tag.objects.create(user=self.user, name=name)
+        # Access the first page
+        res = self.client.get(TAGS_URL, {"page_size": 2})
+        self.assertEqual(
+            [tag["name"] for tag in res.data["results"]], ["Sweet", "Fruity"]
+        )
+        # Access the second page
+        res = self.client.get(res.data["next"])
+        self.assertEqual([tag["name"] for tag in res.data["results"]], ["Dry"])
+        self.assertIsNone(res.data["next"])
+
+    def test_tag_wine_counts(self):
+        """Test that the wine counts follow the wines of the tags."""
+        tag1 = Tag.objects.create(user=self.user, name="Fruity")
+        tag2 = Tag.objects.create(user=self.user, name="Dry")
+        wines = [create_sample_wine(name=f"Wine {i}") for i in range(3)]
+        for wine in wines:
+            wine.tags.add(tag1)
+        wines[0].tags.add(tag2)
+        tag2.wines.add(wines[1])
+
+        def get_counts():
+            return dict(Tag.objects.values_list("name", "wine_count"))
+
+        self.assertEqual(get_counts(), {"Fruity": 3, "Dry": 2})
+        # Remove and clear from both sides of the relation
+        wines[0].tags.remove(tag1)
+        self.assertEqual(get_counts(), {"Fruity": 2, "Dry": 2})
+        wines[1].tags.clear()
+        self.assertEqual(get_counts(), {"Fruity": 1, "Dry": 1})
+        tag2.wines.clear()
+        self.assertEqual(get_counts(), {"Fruity": 1, "Dry": 0})
+        # Deleted wines are not counted anymore
+        wines[2].delete()
+        self.assertEqual(get_counts(), {"Fruity": 0, "Dry": 0})
+
+    def test_assigned_tags_distinct(self):
+        """Test that assigned tags are listed once with their wine count."""
+        tag = Tag.objects.create(user=self.user, name="Fruity")
+        Tag.objects.create(user=self.user, name="Dry")
+        for i in range(3):
+            create_sample_wine(name=f"Wine {i}").tags.add(tag)
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(tag["name"], tag["wine_count"]) for tag in res.data],
+            [("Fruity", 3)],
+        )
+
+    def test_popular_tags(self):
+        """Test ordering the tags by their number of wines."""
+        counts = {"Dry": 1, "Fruity": 3, "Sweet": 0, "Oaky": 1}
+        for name, count in counts.items():
+            tag = Tag.objects.create(user=self.user, name=name)
+            for i in range(count):
+                create_sample_wine(name=f"{name} {i}").tags.add(tag)
+        res = self.client.get(TAGS_URL, {"ordering": "-wine_count"})
+        self.assertEqual(
+            [tag["name"] for tag in res.data],
+            ["Fruity", "Dry", "Oaky", "Sweet"],
+        )
+        # The popular tags can be paginated
+        res = self.client.get(
+            TAGS_URL, {"ordering": "-wine_count", "page_size": 2}
+        )
+        self.assertEqual(
+            [tag["wine_count"] for tag in res.data["results"]], [3, 1]
+        )
+        res = self.client.get(res.data["next"])
+        self.assertEqual(
+            [tag["wine_count"] for tag in res.data["results"]], [1, 0]
+        )
@@ -1,17 +1,35 @@
 """Tests for the wine api endpoint."""
+import base64
+import csv
+import json
 import statistics
 import uuid
 from decimal import Decimal
+from io import StringIO
 from statistics import mean
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
 from django.shortcuts import reverse
+from django.test import TestCase
 from rest_framework import status
 from core.test.basetestclasses import (
     PrivateAPITestCase,
     PublicAPITestCase,
     create_user,
 )
-from wine.models import Wine, Library, Tag, Review
+from wine import search
+from wine.cache import CATALOGUE_VERSION_KEY, get_catalogue_version
+from wine.models import (
+    Country,
+    Library,
+    Review,
+    Tag,
+    Variety,
+    Wine,
+    Winery,
+)
 from wine.serializers import (
     WineSerializer,
     LibrarySerializer,
@@ -24,6 +42,22 @@ from wine.serializers import (
 WINES_LIST_URL = reverse("wine:wine-list")
 
 
+# Store the wine facets url as constant value
+WINES_FACETS_URL = reverse("wine:wine-facets")
+
+
+# Store the wine export url as constant value
+WINES_EXPORT_URL = reverse("wine:wine-export")
+
+
+# Store the wine batch url as constant value
+WINES_BATCH_URL = reverse("wine:wine-batch")
+
+
+# Store the bulk reviews url as constant value
+WINES_BULK_REVIEWS_URL = reverse("wine:wine-bulk-reviews")
+
+
 def get_wine_details_url(wine_id):
     """Get the wine detail url."""
     return reverse("wine:wine-detail", args=[wine_id])
@@ -44,11 +78,18 @@ def create_sample_wine(name=None, user=None, **kwargs):
         # Get the first user, if user is not given
         user = get_user_model().objects.first()
     points = kwargs.pop("points", None)
+    # Get or create the lookups of the given names
+    for field in Wine.LOOKUP_FIELDS:
+        if isinstance(kwargs.get(field), str):
+            model = Wine._meta.get_field(field).related_model
+            kwargs[field] = model.objects.get_or_create(name=kwargs[field])[0]
     # Create wine
     wine = Wine.objects.create(name=name, user=user, **kwargs)
     # If points are given, create a review with the given points
     if points:
         Review.objects.create(wine=wine, points=points, user=user)
+        # Load the updated rating aggregates
+        wine.refresh_from_db()
 
     return wine
 
@@ -144,7 +185,11 @@ class TestPrivateWineAPI(PrivateAPITestCase):
         self.assertIsNotNone(wine.created_at)
         # Check all other attributes are created properly
         for key, value in payload.items():
-            self.assertEqual(value, getattr(wine, key))
+            if key in Wine.LOOKUP_FIELDS:
+                # The lookup fields are stored in lookup tables
+                self.assertEqual(value, getattr(wine, key).name)
+            else:
+                self.assertEqual(value, getattr(wine, key))
 
     def test_wine_list(self):
         """Test the wine list representation."""
@@ -176,11 +221,16 @@ class TestPrivateWineAPI(PrivateAPITestCase):
             wine.libraries.add(library)
         for tag in tags:
             wine.tags.add(tag)
+        # The first library contains another wine
+        libraries[0].wines.add(create_sample_wine())
         # Get the specific wine url
         url = get_wine_details_url(wine.id)
         # Access the wine ulr
         res = self.client.get(url)
 
+        # Load the wine counts of the tags
+        for tag in tags:
+            tag.refresh_from_db()
         # Serialize the libraries and tags
         library_serializer = LibrarySerializer(libraries, many=True)
         tags_serializer = TagSerializer(tags, many=True)
@@ -329,6 +379,62 @@ class TestPrivateWineAPI(PrivateAPITestCase):
         # Assert that the correct one is returned
         self.assertEqual(res.data[0]["name"], wine_name)
 
+    def test_lookup_fields(self):
+        """Test that the lookup fields are read and written by name."""
+        # Create two wines of the same country
+        for name in ["Riesling", "Silvaner"]:
+            res = self.client.post(
+                WINES_LIST_URL,
+                {"name": name, "country": "Germany", "variety": name},
+                format="json",
+            )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(res.data["country"], "Germany")
+        # Assert that the country is stored once
+        self.assertEqual(Country.objects.count(), 1)
+        self.assertEqual(Country.objects.get().wines.count(), 2)
+        # Filter by the name of the lookup
+        res = self.client.get(WINES_LIST_URL, {"variety": "Silvaner"})
+        self.assertEqual([wine["name"] for wine in res.data], ["Silvaner"])
+        res = self.client.get(WINES_LIST_URL, {"country": "France"})
+        self.assertEqual(res.data, [])
+        # A blank name removes the lookup of the wine
+        wine = Wine.objects.get(name="Riesling")
+        res = self.client.patch(
+            get_wine_details_url(wine.id), {"country": ""}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("country", res.data)
+        wine.refresh_from_db()
+        self.assertIsNone(wine.country)
+        # A new name of an update is created
+        res = self.client.patch(
+            get_wine_details_url(wine.id),
+            {"country": "Austria"},
+            format="json",
+        )
+        self.assertEqual(res.data["country"], "Austria")
+        wine.refresh_from_db()
+        self.assertEqual(wine.country.name, "Austria")
+
+    def test_lookup_fields_invalid(self):
+        """Test that an invalid wine does not create its lookups."""
+        res = self.client.post(
+            WINES_LIST_URL,
+            {"name": "Riesling", "country": "Germany", "price": 0},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("price", res.data)
+        serializer = WineSerializer(
+            data={"name": "Riesling", "variety": "Riesling", "winery": "Abc"}
+        )
+        self.assertTrue(serializer.is_valid())
+        # Neither the request nor the validation wrote a lookup
+        self.assertFalse(Country.objects.exists())
+        self.assertFalse(Variety.objects.exists())
+        self.assertFalse(Winery.objects.exists())
+
     def test_search_by_price(self):
         """
         Test to search by price which is lower or higher than given value.
@@ -401,3 +507,385 @@ class TestPrivateWineAPI(PrivateAPITestCase):
         serializer = WineSerializer(low_rated_wine)
         # Assert that this structure is visible
         self.assertEqual(serializer.data, res.data[0])
+
+    def test_wine_list_query_count(self):
+        """Test that the wine list uses a fixed number of queries."""
+        # Create wines with reviews, libraries and tags
+        library = create_sample_library()
+        tag = create_sample_tag()
+        for points in [80, 85, 90]:
+            wine = create_sample_wine(points=points)
+            wine.libraries.add(library)
+            wine.tags.add(tag)
+        # One query for the validator of the list, one for the wines and
+        # one per prefetched relation
+        with self.assertNumQueries(5):
+            res = self.client.get(WINES_LIST_URL)
+        # Assert a successful response
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # Assert that the precomputed values match the serialized ones
+        serializer = WineSerializer(Wine.objects.all(), many=True)
+        self.assertEqual(res.data, serializer.data)
+
+    def test_cursor_pagination(self):
+        """Test to page through the wines with a cursor."""
+        # Create 5 wines
+        wines = [create_sample_wine() for __ in range(5)]
+        # Page through the wines ordered by name
+        names = []
+        params = {"page_size": 2, "ordering": "name"}
+        res = self.client.get(WINES_LIST_URL, params)
+        while True:
+            # Assert a successful response with at most 2 wines
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data["results"]), 2)
+            names += [wine["name"] for wine in res.data["results"]]
+            if not res.data["next"]:
+                break
+            # Follow the link to the next page
+            res = self.client.get(res.data["next"])
+        # Assert that all wines have been returned once and in order
+        self.assertEqual(names, sorted(wine.name for wine in wines))
+        # Default ordering is from the newest to the oldest wine
+        res = self.client.get(WINES_LIST_URL, {"page_size": 5})
+        self.assertEqual(
+            [wine["id"] for wine in res.data["results"]],
+            [wine.id for wine in reversed(wines)],
+        )
+        self.assertIsNone(res.data["next"])
+
+    def test_cursor_pagination_invalid(self):
+        """Test invalid cursors and orderings."""
+        # Assert a NOT FOUND response for an invalid cursor
+        res = self.client.get(WINES_LIST_URL, {"cursor": "invalid"})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        # Assert a NOT FOUND response for cursors without a scalar value
+        for value in [None, [1], {"a": 1}, True]:
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(["-created_at", value, 1]).encode()
+            ).decode()
+            with self.subTest(value=value):
+                res = self.client.get(WINES_LIST_URL, {"cursor": cursor})
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        # Assert a BAD REQUEST for an unsupported ordering
+        res = self.client.get(
+            WINES_LIST_URL, {"page_size": 2, "ordering": "price"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_full_text_search(self):
+        """Test the ranked full-text search with prefix matching."""
+        # Create wines with different descriptions
+        best_match = create_sample_wine(
+            name="Riesling Spätlese",
+            description="A fruity riesling with notes of apricot.",
+            variety="Riesling",
+            price=Decimal("20.00"),
+        )
+        other_match = create_sample_wine(
+            name="Cuvée",
+            description="Blend with a touch of riesling.",
+            price=Decimal("9.00"),
+        )
+        create_sample_wine(name="Malbec", variety="Malbec")
+        # Search with a prefix of the word
+        res = self.client.get(WINES_LIST_URL, {"q": "riesl"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # Assert that the better match is listed first
+        self.assertEqual(
+            [wine["id"] for wine in res.data],
+            [best_match.id, other_match.id],
+        )
+        # Combine the search with the price filter
+        res = self.client.get(WINES_LIST_URL, {"q": "riesl", "max_price": 10})
+        self.assertEqual([wine["id"] for wine in res.data], [other_match.id])
+        # Assert that renamed and deleted wines are updated in the index
+        best_match.name = "Spätlese"
+        best_match.save()
+        other_match.delete()
+        res = self.client.get(WINES_LIST_URL, {"q": "spatlese"})
+        self.assertEqual([wine["id"] for wine in res.data], [best_match.id])
+        res = self.client.get(WINES_LIST_URL, {"q": "cuvee"})
+        self.assertFalse(res.data)
+
+    def test_full_text_search_pagination(self):
+        """Test that paginated search results keep the relevance order."""
+        # Create the wines from the best to the worst match
+        wines = [
+            create_sample_wine(description=description)
+            for description in [
+                "Riesling, riesling and riesling.",
+                "Riesling and riesling.",
+                "A riesling with notes of apricot.",
+                "A blend of many grapes with a small touch of riesling.",
+            ]
+        ]
+        # Page through the search results
+        ids = []
+        res = self.client.get(
+            WINES_LIST_URL, {"q": "riesling", "page_size": 1}
+        )
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids += [wine["id"] for wine in res.data["results"]]
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+        # Assert that the pages are ordered by relevance, not by creation
+        self.assertEqual(ids, [wine.id for wine in wines])
+        res = self.client.get(WINES_LIST_URL, {"q": "riesling"})
+        self.assertEqual([wine["id"] for wine in res.data], ids)
+        # Assert a BAD REQUEST for another ordering of the search results
+        res = self.client.get(
+            WINES_LIST_URL,
+            {"q": "riesling", "page_size": 1, "ordering": "name"},
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_search_index(self):
+        """Test to rebuild the search index with the command."""
+        # Create a wine and remove it from the index
+        wine = create_sample_wine(name="Grüner Veltliner")
+        search.remove_wines([wine.id])
+        res = self.client.get(WINES_LIST_URL, {"q": "veltliner"})
+        self.assertFalse(res.data)
+        # Rebuild the index
+        out = StringIO()
+        call_command("rebuild_wine_search_index", stdout=out)
+        self.assertIn("Indexed 1 wines.", out.getvalue())
+        # Assert that the wine can be found again
+        res = self.client.get(WINES_LIST_URL, {"q": "veltliner"})
+        self.assertEqual([wine["id"] for wine in res.data], [wine.id])
+
+    def test_facets(self):
+        """Test the facet counts of the filtered wines."""
+        # Create wines in different countries and price ranges
+        create_sample_wine(country="Germany", price=Decimal("8.00"))
+        create_sample_wine(country="Germany", price=Decimal("15.00"))
+        create_sample_wine(country="France", price=Decimal("120.00"))
+        create_sample_wine(variety="Riesling")
+        # Access the facets url
+        res = self.client.get(WINES_FACETS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 4)
+        # Assert the counts per country, ordered by count
+        self.assertEqual(
+            res.data["facets"]["country"],
+            [
+                {"value": "Germany", "count": 2},
+                {"value": "France", "count": 1},
+            ],
+        )
+        self.assertEqual(
+            res.data["facets"]["variety"], [{"value": "Riesling", "count": 1}]
+        )
+        # Assert the price buckets
+        price_counts = {
+            bucket["value"]: bucket["count"]
+            for bucket in res.data["facets"]["price"]
+        }
+        self.assertEqual(price_counts["<10"], 1)
+        self.assertEqual(price_counts["10-20"], 1)
+        self.assertEqual(price_counts[">=100"], 1)
+        # Assert that the filters are applied
+        res = self.client.get(WINES_FACETS_URL, {"max_price": 20})
+        self.assertEqual(res.data["count"], 2)
+        self.assertEqual(
+            res.data["facets"]["country"], [{"value": "Germany", "count": 2}]
+        )
+        # Assert that the full-text search can be combined
+        res = self.client.get(WINES_FACETS_URL, {"q": "sample"})
+        self.assertEqual(res.data["count"], 4)
+        self.assertEqual(len(res.data["facets"]["country"]), 2)
+
+    def test_facets_cache_invalidation(self):
+        """Test that cached facets are invalidated by new wines."""
+        # Create a wine and cache the facets
+        create_sample_wine(country="Italy")
+        res = self.client.get(WINES_FACETS_URL)
+        self.assertEqual(res.data["count"], 1)
+        # Assert that the cached facets are returned without counting
+        with self.assertNumQueries(0):
+            res = self.client.get(WINES_FACETS_URL)
+        self.assertEqual(res.data["count"], 1)
+        # Create another wine and assert the updated counts
+        create_sample_wine(country="Italy")
+        res = self.client.get(WINES_FACETS_URL)
+        self.assertEqual(
+            res.data["facets"]["country"], [{"value": "Italy", "count": 2}]
+        )
+
+    def test_export_csv(self):
+        """Test to export the filtered wines as CSV."""
+        # Create wines with a review and tags
+        wine = create_sample_wine(price=Decimal("12.50"), points=88)
+        for name in ["Dry", "Fruity"]:
+            wine.tags.add(create_sample_tag(name=name))
+        create_sample_wine(price=Decimal("50.00"))
+        # Export the cheap wines
+        res = self.client.get(WINES_EXPORT_URL, {"max_price": 20})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "text/csv")
+        content = b"".join(res.streaming_content).decode()
+        rows = list(csv.DictReader(content.splitlines()))
+        # Assert that only the filtered wine is exported
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["name"], wine.name)
+        self.assertEqual(rows[0]["price"], "12.50")
+        self.assertEqual(rows[0]["points_avg"], "88.00")
+        self.assertEqual(rows[0]["tags"], "Dry;Fruity")
+
+    def test_export_ndjson(self):
+        """Test to export the wines as newline delimited JSON."""
+        # Create 3 wines
+        wines = [create_sample_wine() for __ in range(3)]
+        res = self.client.get(WINES_EXPORT_URL, {"export_format": "ndjson"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        content = b"".join(res.streaming_content).decode()
+        rows = [json.loads(line) for line in content.splitlines()]
+        # Assert that all wines are exported in order
+        self.assertEqual([row["id"] for row in rows], [w.id for w in wines])
+        self.assertEqual(rows[0]["tags"], [])
+        # Assert a BAD REQUEST for an unknown format
+        res = self.client.get(WINES_EXPORT_URL, {"export_format": "xml"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_create_and_update(self):
+        """Test to create and update wines with one request."""
+        # Create a wine, a library and tags
+        wine = create_sample_wine(price=Decimal("10.00"))
+        library = create_sample_library()
+        tags = [create_sample_tag() for __ in range(2)]
+        wine.tags.add(tags[0])
+        payload = [
+            {
+                "name": "Batch wine",
+                "price": "12.00",
+                "country": "Germany",
+                "tags": [tag.id for tag in tags],
+                "libraries": [library.id],
+            },
+            {"id": wine.id, "price": "11.00", "tags": [tags[1].id]},
+        ]
+        res = self.client.post(WINES_BATCH_URL, payload, format="json")
+        # Assert a successful response with the results of the items
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        new_wine = Wine.objects.get(name="Batch wine")
+        self.assertEqual(
+            res.data,
+            [
+                {"index": 0, "status": "created", "id": new_wine.id},
+                {"index": 1, "status": "updated", "id": wine.id},
+            ],
+        )
+        # Assert the created wine and its relations
+        self.assertEqual(new_wine.user, self.user)
+        self.assertEqual(new_wine.price, Decimal("12.00"))
+        self.assertEqual(new_wine.country.name, "Germany")
+        self.assertEqual(set(new_wine.tags.all()), set(tags))
+        self.assertEqual(list(new_wine.libraries.all()), [library])
+        # Assert the updated wine, its tags have been replaced
+        wine.refresh_from_db()
+        self.assertEqual(wine.price, Decimal("11.00"))
+        self.assertEqual(list(wine.tags.all()), [tags[1]])
+        # The bulk writes update the wine counts of the tags
+        self.assertEqual(
+            [Tag.objects.get(pk=tag.pk).wine_count for tag in tags], [1, 2]
+        )
+
+    def test_batch_invalid_items(self):
+        """Test that invalid items are reported and the others written."""
+        # Create a wine and a library of another user
+        wine = create_sample_wine()
+        other_library = create_sample_library(user=create_user())
+        payload = [
+            {"name": "Valid wine"},
+            {"name": wine.name},
+            {"name": "Valid wine"},
+            {"name": "Foreign library", "libraries": [other_library.id]},
+            {"id": 0, "price": "5.00"},
+            {"name": "Unknown tag", "tags": [0]},
+            {"price": "5.00"},
+        ]
+        res = self.client.post(WINES_BATCH_URL, payload, format="json")
+        # Assert a multi status response
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [result["status"] for result in res.data],
+            ["created"] + ["invalid"] * 6,
+        )
+        self.assertIn("name", res.data[1]["errors"])
+        self.assertIn("name", res.data[2]["errors"])
+        self.assertIn("libraries", res.data[3]["errors"])
+        self.assertIn("id", res.data[4]["errors"])
+        self.assertIn("tags", res.data[5]["errors"])
+        self.assertIn("name", res.data[6]["errors"])
+        # Assert that only the valid wine has been created
+        self.assertEqual(Wine.objects.count(), 2)
+        # Assert a BAD REQUEST if the payload is not a list
+        res = self.client.post(WINES_BATCH_URL, {"name": "x"}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_reviews(self):
+        """Test to add reviews to several wines with one request."""
+        # Create two wines, one has already been reviewed
+        first_wine = create_sample_wine(points=90)
+        second_wine = create_sample_wine()
+        payload = [
+            {"wine": first_wine.id, "points": 80},
+            {"wine": second_wine.id, "points": 70, "comment": "Too sweet."},
+            {"wine": second_wine.id, "points": 75},
+        ]
+        # One query each for the wines, the insert, locking and updating the
+        # wines, the catalogue average, rescoring and replacing the rankings
+        # plus the savepoints of the two transactions
+        with self.assertNumQueries(12):
+            res = self.client.post(
+                WINES_BULK_REVIEWS_URL, payload, format="json"
+            )
+        # Assert a successfully created response
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(Review.objects.count(), 4)
+        self.assertTrue(
+            Review.objects.filter(
+                user=self.user, comment="Too sweet."
+            ).exists()
+        )
+        # Assert that the rating aggregates have been updated
+        first_wine.refresh_from_db()
+        second_wine.refresh_from_db()
+        self.assertEqual(first_wine.point_average, Decimal("85.00"))
+        self.assertEqual(second_wine.review_count, 2)
+        self.assertEqual(second_wine.point_average, Decimal("72.50"))
+
+    def test_bulk_reviews_invalid(self):
+        """Test that no review is created if one is invalid."""
+        wine = create_sample_wine()
+        payload = [
+            {"wine": wine.id, "points": 80},
+            {"wine": wine.id, "points": 101},
+            {"wine": 0, "points": 80},
+        ]
+        res = self.client.post(WINES_BULK_REVIEWS_URL, payload, format="json")
+        # Assert a BAD REQUEST with the errors of every item
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("points", res.data[1])
+        self.assertIn("wine", res.data[2])
+        # Assert that no review has been created
+        self.assertFalse(Review.objects.exists())
+
+
+class TestSharedCache(TestCase):
+    """Test the cache of the settings, which the processes share."""
+
+    def test_version_of_other_connection(self):
+        """Test that a version bumped by another process is seen."""
+        # The memory of a process is not shared with the others
+        self.assertNotIsInstance(caches["default"], LocMemCache)
+        version = get_catalogue_version()
+        other = caches.create_connection("default")
+        self.assertEqual(other.get(CATALOGUE_VERSION_KEY), version)
+        other.incr(CATALOGUE_VERSION_KEY)
+        self.assertEqual(get_catalogue_version(), version + 1)
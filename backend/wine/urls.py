@@ -9,6 +9,12 @@ router = DefaultRouter()
 router.register("wines", viewset=views.WineViewSet)
 # Register the library view set at the router
 router.register("libraries", viewset=views.LibraryViewSet)
+# Register the public library view set at the router
+router.register(
+    "public-libraries",
+    viewset=views.PublicLibraryViewSet,
+    basename="public-library",
+)
 # Register the tags view set at the router
 router.register("tags", viewset=views.TagViewSet)
 
@@ -1,23 +1,162 @@
 """Views for the wine app."""
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
 from rest_framework import viewsets, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.schemas.openapi import AutoSchema
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from wine.cache import (
+    PUBLIC_LIBRARIES_MAX_AGE,
+    PUBLIC_LIBRARIES_VERSION_KEY,
+    get_or_compute,
+    normalize_params,
+)
+from wine.conditional import ConditionalGetMixin
+from wine.batch import (
+    MAX_BATCH_SIZE,
+    create_review_batch,
+    write_wine_batch,
+)
+from wine.exporting import EXPORT_FORMATS, iter_export_rows
+from wine.facets import (
+    DEFAULT_FACET_LIMIT,
+    MAX_FACET_LIMIT,
+    PRICE_BUCKETS,
+    get_facet_counts,
+)
 from wine.filters import WineFilter
-from wine.models import Wine, Library, Tag
-from wine import serializers
+from wine.models import (
+    Country,
+    Library,
+    Review,
+    SimilarWine,
+    Tag,
+    Variety,
+    Wine,
+    WineRanking,
+)
+from wine.pagination import KeysetPagination, RequiredKeysetPagination
+from wine.stats import (
+    DEFAULT_STATS_LIMIT,
+    MAX_STATS_LIMIT,
+    STATS_GROUPS,
+    get_catalogue_stats,
+)
+from wine import autocomplete, serializers
 
 
-class BaseWineAppViewSet(viewsets.ModelViewSet):
-    """Base View set for wine app."""
+# Number of wines of a leaderboard by default and at most
+DEFAULT_TOP_LIMIT = 20
+MAX_TOP_LIMIT = 100
+
+
+def annotate_wine_count(queryset):
+    """
+    Annotate the number of wines of the libraries.
+
+    The wines are counted with a subquery per library, which uses the index
+    of the through table.
+    """
+    through = Wine.libraries.through
+    return queryset.annotate(
+        wine_count=Coalesce(
+            Subquery(
+                through.objects.filter(library_id=OuterRef("pk"))
+                .order_by()
+                .values("library_id")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+
+
+def prefetch_wine_list(queryset):
+    """
+    Load the related data of listed wines in a fixed number of queries.
+
+    The names of the lookup fields are joined, the related ids are loaded
+    with one query per relation.
+    """
+    return queryset.select_related(*Wine.LOOKUP_FIELDS).prefetch_related(
+        "libraries",
+        "tags",
+        "reviews",
+    )
+
+
+def prefetch_wine_detail(queryset):
+    """
+    Load the nested objects of a wine detail in a fixed number of queries.
+
+    The names of the lookup fields are joined. The libraries are loaded
+    with their annotated number of wines, so the nested libraries do not
+    count their wines one by one. The tags and the reviews are loaded with
+    one query each.
+    """
+    return queryset.select_related(*Wine.LOOKUP_FIELDS).prefetch_related(
+        Prefetch(
+            "libraries", queryset=annotate_wine_count(Library.objects.all())
+        ),
+        Prefetch("tags", queryset=Tag.objects.all()),
+        Prefetch("reviews", queryset=Review.objects.all()),
+    )
+
+
+class LibraryWinesMixin:
+    """Action listing the wines of a library page by page."""
+
+    @action(methods=["GET"], detail=True)
+    def wines(self, request, pk=None):
+        """
+        List the wines of the library.
+
+        The wines are filtered like the wine list and always paginated with
+        a cursor.
+        """
+        # Get the visible library, without applying the library filters to
+        # the wine filter params
+        library = get_object_or_404(self.get_queryset(), pk=pk)
+        self.check_object_permissions(request, library)
+        filterset = WineFilter(
+            request.query_params,
+            queryset=prefetch_wine_list(library.wines.all()),
+            request=request,
+        )
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        paginator = RequiredKeysetPagination()
+        page = paginator.paginate_queryset(filterset.qs, request, view=self)
+        serializer = serializers.WineSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+
+class BaseWineAppViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """
+    Base View set for wine app.
+
+    Lists and details are answered conditionally with ETag and
+    Last-Modified validators.
+    """
 
     # Permission Classes
     authentication_classes = (JWTAuthentication,)
     permission_classes = (IsAuthenticated,)
+    # Opt-in cursor pagination
+    pagination_class = KeysetPagination
+    cursor_ordering_fields = ("created_at", "name")
 
     def get_queryset(self):
         """Workaround for django filters UserWarning."""
@@ -30,7 +169,7 @@ class BaseWineAppViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class LibraryViewSet(BaseWineAppViewSet):
+class LibraryViewSet(LibraryWinesMixin, BaseWineAppViewSet):
     """View Set for Library."""
 
     serializer_class = serializers.LibrarySerializer
@@ -58,9 +197,145 @@ class LibraryViewSet(BaseWineAppViewSet):
             # If the param is given, get only my libraries
             queryset = queryset.filter(user=self.request.user)
         else:
-            # If not, get all visible libraries (mine and all other public)
-            queryset = queryset.filter(Q(user=self.request.user) | Q(public=True))
-        return queryset
+            # If not, get all visible libraries (mine and all other public).
+            # public is compared with "in", since a plain boolean condition
+            # can not use the index of the column.
+            queryset = queryset.filter(
+                Q(user=self.request.user) | Q(public__in=[True])
+            )
+        return annotate_wine_count(queryset)
+
+    def get_serializer_class(self):
+        """Get the appropriate serializer class."""
+        if self.action in ("add_wines", "remove_wines"):
+            # The changes of the wines contain the ids of the wines
+            return serializers.LibraryWinesSerializer
+        return self.serializer_class
+
+    def change_wines(self, request, pk, change):
+        """
+        Add or remove wines of an own library.
+
+        The wines have to belong to the user of the library, which is
+        checked with one query for all wines. change is called with the
+        library and the ids of the wines.
+        """
+        # Only own libraries can be changed
+        library = get_object_or_404(Library, pk=pk, user=request.user)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        wine_ids = set(serializer.validated_data["wines"])
+        own_ids = set(
+            Wine.objects.filter(
+                pk__in=wine_ids, user=library.user
+            ).values_list("id", flat=True)
+        )
+        if own_ids != wine_ids:
+            return Response(
+                {
+                    "wines": [
+                        f'Invalid pk "{pk}" - object does not exist.'
+                        for pk in sorted(wine_ids - own_ids)
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with transaction.atomic():
+            # Only the rows of the given wines are inserted or deleted, the
+            # signals of the relation keep the derived data up to date
+            change(library, wine_ids)
+        library = annotate_wine_count(Library.objects.all()).get(pk=pk)
+        return Response(
+            serializers.LibrarySerializer(
+                library, context=self.get_serializer_context()
+            ).data,
+            status=status.HTTP_200_OK,
+        )
+
+    @action(methods=["POST"], detail=True, url_path="add-wines")
+    def add_wines(self, request, pk=None):
+        """Add the given wines to the library."""
+        return self.change_wines(
+            request, pk, lambda library, ids: library.wines.add(*ids)
+        )
+
+    @action(methods=["POST"], detail=True, url_path="remove-wines")
+    def remove_wines(self, request, pk=None):
+        """Remove the given wines from the library."""
+        return self.change_wines(
+            request, pk, lambda library, ids: library.wines.remove(*ids)
+        )
+
+
+class PublicLibraryViewSet(LibraryWinesMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read only View Set for the public libraries.
+
+    The libraries are readable without authentication. The responses of the
+    libraries are cached until a public library or its wines change. All
+    responses may be reused by proxies for a short time.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    serializer_class = serializers.PublicLibrarySerializer
+    # Do not share the operation ids with the library view set
+    schema = AutoSchema(operation_id_base="PublicLibrary")
+    queryset = annotate_wine_count(
+        Library.objects.filter(public__in=[True]).order_by("-created_at")
+    )
+    filterset_fields = ("name",)
+    # Opt-in cursor pagination
+    pagination_class = KeysetPagination
+    cursor_ordering_fields = ("created_at", "name")
+
+    def get_cached_response(self, request, compute):
+        """
+        Return the cached data of the request as response.
+
+        The data is computed with compute if it is not cached, the key is
+        the absolute url of the request, so the links of the pages match.
+        """
+        data = get_or_compute(
+            "public-libraries",
+            [request.build_absolute_uri()],
+            lambda: compute().data,
+            version_key=PUBLIC_LIBRARIES_VERSION_KEY,
+        )
+        return self.set_cache_control(Response(data))
+
+    @staticmethod
+    def set_cache_control(response):
+        """Allow proxies and clients to reuse the response."""
+        patch_cache_control(
+            response, public=True, max_age=PUBLIC_LIBRARIES_MAX_AGE
+        )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """List the public libraries from the cache."""
+        return self.get_cached_response(
+            request, lambda: super(PublicLibraryViewSet, self).list(request)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a public library from the cache."""
+        return self.get_cached_response(
+            request,
+            lambda: super(PublicLibraryViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    @action(methods=["GET"], detail=True)
+    def wines(self, request, pk=None):
+        """
+        List the wines of the public library.
+
+        The wines are not cached on the server, since they change with
+        every review.
+        """
+        return self.set_cache_control(super().wines(request, pk=pk))
 
 
 class TagViewSet(BaseWineAppViewSet):
@@ -69,12 +344,15 @@ class TagViewSet(BaseWineAppViewSet):
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all().order_by("-name")
     filterset_fields = ("name",)
+    cursor_ordering_fields = ("created_at", "name", "wine_count")
+    cursor_default_ordering = "-name"
 
     def get_queryset(self):
         """
         Return the queryset.
 
-        User can filter if he just wants to receive the assigned tags.
+        User can filter if he just wants to receive the assigned tags and
+        order the tags by their number of wines with ordering=-wine_count.
         """
         if self.request is None:
             # Workaround for django filter user warning
@@ -82,10 +360,17 @@ class TagViewSet(BaseWineAppViewSet):
 
         queryset = super().get_queryset()
         # Check for the assigned only param
-        assigned_only = bool(int(self.request.query_params.get("assigned_only", 0)))
+        assigned_only = bool(
+            int(self.request.query_params.get("assigned_only", 0))
+        )
         if assigned_only:
-            # If the param is given, filter for only assigned tags
-            queryset = queryset.filter(wines__isnull=False)
+            # If the param is given, filter for only assigned tags. The
+            # stored wine count lists every tag once without joining wines.
+            queryset = queryset.filter(wine_count__gt=0)
+        ordering = self.request.query_params.get("ordering")
+        if ordering in ("wine_count", "-wine_count"):
+            # Order by popularity, tags with the same count by name
+            queryset = queryset.order_by(ordering, "name")
 
         return queryset
 
@@ -97,6 +382,32 @@ class WineViewSet(BaseWineAppViewSet):
     queryset = Wine.objects.all()
 
     filterset_class = WineFilter
+    cursor_ordering_fields = ("created_at", "updated_at", "name")
+    # Search results are paginated by their relevance
+    cursor_relevance_field = "search_rank"
+    # The detail representation contains these related objects
+    conditional_related_fields = ("libraries", "tags", "reviews")
+
+    def get_queryset(self):
+        """
+        Return the queryset.
+
+        The names of the lookup fields are joined. For the list action the
+        related ids of the whole page, and for the retrieve action the
+        nested objects, are loaded in a fixed number of queries instead of
+        several queries per serialized wine or library.
+        """
+        queryset = super().get_queryset()
+        if queryset is not None and self.action == "list":
+            # Load the related data with a fixed number of queries
+            queryset = prefetch_wine_list(queryset)
+        elif queryset is not None and self.action == "retrieve":
+            # Load the nested objects with a fixed number of queries
+            queryset = prefetch_wine_detail(queryset)
+        elif queryset is not None:
+            # Join the lookup tables, their names are serialized
+            queryset = queryset.select_related(*Wine.LOOKUP_FIELDS)
+        return queryset
 
     def get_serializer_class(self):
         """Get the appropriate serializer class."""
@@ -106,6 +417,18 @@ class WineViewSet(BaseWineAppViewSet):
         elif self.action == "add_review":
             # If the action is "add_review", use the Review serializer
             return serializers.ReviewSerializer
+        elif self.action == "batch":
+            # If the action is "batch", use the batch item serializer
+            return serializers.WineBatchItemSerializer
+        elif self.action == "bulk_reviews":
+            # If the action is "bulk_reviews", use the bulk item serializer
+            return serializers.ReviewBulkItemSerializer
+        elif self.action == "similar":
+            # If the action is "similar", use the similar wine serializer
+            return serializers.SimilarWineSerializer
+        elif self.action == "top":
+            # If the action is "top", use the ranking serializer
+            return serializers.WineRankingSerializer
         # If nothing of those actions are done, use the default serializer
         return self.serializer_class
 
@@ -121,9 +444,278 @@ class WineViewSet(BaseWineAppViewSet):
         # Add to the serializer
         serializer = self.get_serializer(data=query_dict)
         if serializer.is_valid():
-            # If the serializer is valid, save it and link the current user
-            serializer.save(user=self.request.user)
+            # If the serializer is valid, save it and link the current user.
+            # The rating aggregates of the wine are updated in the same
+            # transaction.
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
             # Return a successful response and the data
             return Response(serializer.data, status=status.HTTP_200_OK)
         # If the serializer is not valid, return the error and BAD REQUEST
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=["GET"], detail=True)
+    def similar(self, request, pk=None):
+        """
+        List the wines which are most similar to the wine.
+
+        The neighbours are precomputed by the compute_similar_wines command
+        and read in their order from the unique index of the wine and rank.
+        """
+        wine = self.get_object()
+        neighbours = (
+            SimilarWine.objects.filter(wine=wine)
+            .order_by("rank")
+            .select_related(
+                *[f"similar__{field}" for field in Wine.LOOKUP_FIELDS]
+            )
+            .prefetch_related(
+                "similar__libraries", "similar__tags", "similar__reviews"
+            )
+        )
+        serializer = serializers.SimilarWineSerializer(neighbours, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=["GET"], detail=False)
+    def top(self, request):
+        """
+        List the wines with the best Bayesian scores.
+
+        The leaderboard can be segmented by country, variety or price_band
+        (a label of the price facet) and is read from the index of the
+        segment in the ranking table.
+        """
+        rankings = WineRanking.objects.all()
+        for field, model in [("country", Country), ("variety", Variety)]:
+            name = request.query_params.get(field)
+            if name:
+                # Compare with the id of the name, so the index is used
+                rankings = rankings.filter(
+                    **{
+                        field: Subquery(
+                            model.objects.filter(name=name).values("id")[:1]
+                        )
+                    }
+                )
+        price_band = request.query_params.get("price_band")
+        if price_band:
+            labels = [label for label, __, __ in PRICE_BUCKETS]
+            if price_band not in labels:
+                return Response(
+                    {"price_band": f"Use one of {labels}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rankings = rankings.filter(price_band=labels.index(price_band))
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_TOP_LIMIT))
+        except ValueError:
+            return Response(
+                {"limit": "A valid integer is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, MAX_TOP_LIMIT))
+        rankings = (
+            rankings.order_by("-score", "-wine")
+            .select_related(
+                *[f"wine__{field}" for field in Wine.LOOKUP_FIELDS]
+            )
+            .prefetch_related("wine__libraries", "wine__tags", "wine__reviews")
+        )[:limit]
+        serializer = serializers.WineRankingSerializer(rankings, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=["GET"], detail=False)
+    def facets(self, request):
+        """
+        Count the filtered wines per country, province, variety, winery and
+        price bucket.
+
+        The counts are cached per normalized filter selection.
+        """
+        # Apply the filters, invalid filters raise an error here
+        queryset = self.filter_queryset(self.get_queryset())
+        # Get the number of values per facet
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_FACET_LIMIT))
+        except ValueError:
+            return Response(
+                {"limit": "A valid integer is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, MAX_FACET_LIMIT))
+        # Build the cache key from the filter parameters
+        params = normalize_params(
+            request.query_params, WineFilter.base_filters
+        )
+        data = get_or_compute(
+            "facets",
+            [params, limit],
+            lambda: get_facet_counts(queryset, limit),
+        )
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(methods=["GET"], detail=False)
+    def stats(self, request):
+        """
+        Describe the prices and review points of the filtered wines.
+
+        Every distribution has a histogram, quantiles and the mean, overall
+        and per country or variety (group_by). The statistics are cached
+        per normalized filter selection.
+        """
+        # Apply the filters, invalid filters raise an error here
+        queryset = self.filter_queryset(self.get_queryset())
+        group_by = request.query_params.get("group_by") or None
+        if group_by is not None and group_by not in STATS_GROUPS:
+            return Response(
+                {"group_by": f"Use one of {list(STATS_GROUPS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Get the number of groups
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_STATS_LIMIT))
+        except ValueError:
+            return Response(
+                {"limit": "A valid integer is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, MAX_STATS_LIMIT))
+        # Build the cache key from the filter parameters
+        params = normalize_params(
+            request.query_params, WineFilter.base_filters
+        )
+        data = get_or_compute(
+            "stats",
+            [params, group_by, limit],
+            lambda: get_catalogue_stats(queryset, group_by, limit),
+        )
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(methods=["GET"], detail=False)
+    def export(self, request):
+        """
+        Export the filtered wines as CSV or newline delimited JSON.
+
+        The format is chosen with the export_format param. The response is
+        streamed from a chunked query, so the memory usage does not grow
+        with the number of wines.
+        """
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"export_format": f"Use one of {sorted(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Apply the filters, invalid filters raise an error here
+        queryset = self.filter_queryset(self.get_queryset())
+        content_type, iter_lines = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            iter_lines(iter_export_rows(queryset)), content_type=content_type
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="wines.{export_format}"'
+        return response
+
+    @action(methods=["GET"], detail=False)
+    def autocomplete(self, request):
+        """
+        Suggest wine, winery, variety and tag names starting with q.
+
+        The names are looked up in the in-process prefix index, without
+        querying the wines. The suggestions can be restricted to kinds with
+        the type param.
+        """
+        prefix = request.query_params.get("q", "").strip()
+        if not prefix:
+            return Response(
+                {"q": "A prefix is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        kinds = request.query_params.getlist("type")
+        unknown_kinds = set(kinds) - set(autocomplete.SOURCES)
+        if unknown_kinds:
+            return Response(
+                {"type": f"Use one of {sorted(autocomplete.SOURCES)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = int(
+                request.query_params.get("limit", autocomplete.DEFAULT_LIMIT)
+            )
+        except ValueError:
+            return Response(
+                {"limit": "A valid integer is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, autocomplete.MAX_LIMIT))
+        suggestions = autocomplete.index.search(prefix, limit, kinds)
+        return Response(
+            [{"type": kind, "name": name} for kind, name in suggestions],
+            status=status.HTTP_200_OK,
+        )
+
+    @staticmethod
+    def validate_batch_payload(data, name):
+        """
+        Validate that the payload is a list of at most MAX_BATCH_SIZE items.
+
+        Return the response with the error or None.
+        """
+        if not isinstance(data, list):
+            return Response(
+                {"non_field_errors": [f"Expected a list of {name}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(data) > MAX_BATCH_SIZE:
+            return Response(
+                {
+                    "non_field_errors": [
+                        f"A batch can contain at most {MAX_BATCH_SIZE} "
+                        f"{name}."
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return None
+
+    @action(methods=["POST"], detail=False)
+    def batch(self, request):
+        """
+        Create and update a list of wines.
+
+        Items with an id update the wine, the others create a new one. The
+        valid items are written with bulk queries, the response contains
+        the result of every item.
+        """
+        error_response = self.validate_batch_payload(request.data, "wines")
+        if error_response:
+            return error_response
+        results = write_wine_batch(request.data, request.user)
+        # Report a multi status if not all items have been written
+        if any(result["status"] == "invalid" for result in results):
+            return Response(results, status=status.HTTP_207_MULTI_STATUS)
+        return Response(results, status=status.HTTP_200_OK)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="reviews/bulk",
+        url_name="bulk-reviews",
+    )
+    def bulk_reviews(self, request):
+        """
+        Add a list of reviews to wines.
+
+        All wines are looked up with one query and the reviews are inserted
+        in one transaction, together with the rating aggregates of the
+        wines. If any review is invalid, none is created.
+        """
+        error_response = self.validate_batch_payload(request.data, "reviews")
+        if error_response:
+            return error_response
+        reviews, errors = create_review_batch(request.data, request.user)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = serializers.ReviewSerializer(reviews, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Only used if SERVER_TIMING is enabled
+    "core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -118,7 +120,8 @@ REST_FRAMEWORK = {
         "rest_framework.parsers.JSONParser",
     ],
     "DEFAULT_THROTTLE_CLASSES": ["rest_framework.throttling.UserRateThrottle"],
-    "DEFAULT_THROTTLE_RATES": {"user": "50/sec"},
+    # The rate can be raised for load tests and benchmarks
+    "DEFAULT_THROTTLE_RATES": {"user": os.getenv("USER_THROTTLE_RATE", "50/sec")},
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
 }
 
@@ -144,7 +147,53 @@ SWAGGER_SETTINGS = {
     },
 }
 
+# Cache
+# The cached facets, statistics and public libraries are invalidated by
+# bumping version keys in the cache, so all server processes and management
+# commands have to share it. The database cache needs no further services,
+# its table is created with `python manage.py createcachetable`. Redis or
+# Memcached can be configured with CACHE_BACKEND and CACHE_LOCATION, e.g.
+# django.core.cache.backends.redis.RedisCache and redis://127.0.0.1:6379.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "wine_cache"),
+    }
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Ranking of the top wines
+# The scores are Bayesian averages, which pull the average points of a wine
+# towards the prior points by the weight of the prior count of reviews. The
+# prior points default to the average points of the catalogue.
+
+WINE_RANKING_PRIOR_COUNT = int(os.getenv("WINE_RANKING_PRIOR_COUNT", "10"))
+WINE_RANKING_PRIOR_POINTS = os.getenv("WINE_RANKING_PRIOR_POINTS")
+
+# Server timing
+# Report the SQL, serializer and render time of every request in a
+# Server-Timing header and a log line. Disabled requests are not instrumented.
+
+SERVER_TIMING = os.getenv("SERVER_TIMING") == "1"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core.middleware": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}